@@ -0,0 +1,64 @@
+import os
+import json
+import uuid
+import random
+
+MOCKUP_DATA = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "tests", "mockup_data"
+)
+
+
+def template(name):
+    with open(os.path.join(MOCKUP_DATA, f"{name}.json"), "r") as f:
+        return json.loads(f.read())["response"][0]
+
+
+def backups(count, seed=0, now=1700000000.0):
+    """
+    Synthetic /backup catalog, {count} backups shaped like tests/mockup_data/list.json
+    (backup_services, versions...) one per ~day, newest last
+    """
+    return {"version": "1.4.0", "response": list(iter_backups(count, seed, now))}
+
+
+def iter_backups(count, seed=0, now=1700000000.0):
+    """ backups() one at a time (large catalogs) """
+    rnd = random.Random(seed)
+    base = template("list")
+    for i in range(count):
+        backup = json.loads(json.dumps(base))
+        backup_id = str(uuid.UUID(int=rnd.getrandbits(128)))
+        end = now - (count - i) * 86400 + rnd.randint(0, 3600)
+        backup["backup_id"] = backup_id
+        backup["description"] = f"backup-{i}"
+        backup["start_timestamp"] = end - rnd.randint(600, 3600)
+        backup["end_timestamp"] = end
+        backup["backup_size"] = rnd.randint(10**8, 2 * 10**10)
+        backup["compatible"] = "TRUE" if rnd.random() > 0.2 else "FALSE"
+        for service in backup["backup_services"]:
+            service["backup_id"] = backup_id
+        yield backup
+
+
+def history(count, seed=0, now=1700000000.0):
+    """
+    Synthetic /backup/history, shaped like tests/mockup_data/history.json
+    """
+    return {"version": "1.4.0", "response": list(iter_history(count, seed, now))}
+
+
+def iter_history(count, seed=0, now=1700000000.0, status=None):
+    """ history() one at a time, {status} overrides the task status """
+    rnd = random.Random(seed)
+    base = template("history")
+    for i in range(count):
+        task = json.loads(json.dumps(base))
+        task_id = str(uuid.UUID(int=rnd.getrandbits(128)))
+        task["backup_id"] = task["id"] = task_id
+        task["description"] = f"backup-{i}"
+        task["start_timestamp"] = now - (count - i) * 86400
+        task["end_timestamp"] = task["start_timestamp"] + rnd.randint(600, 3600)
+        task["status"] = "SUCCESS" if rnd.random() > 0.1 else "FAILURE"
+        if status is not None:
+            task["status"] = status
+        yield task
@@ -0,0 +1,89 @@
+"""
+Rendering time of list: previous per-row Format (columns and strftime/size
+for every cell, tabulate) vs the schema based table and the streamed
+json/ndjson/csv outputs, written to /dev/null
+
+python benchmarks/format.py [--backups 10000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import rich
+from hurry.filesize import size
+from tabulate import tabulate
+from ciscodnacbackupctl import Api, Format
+from ciscodnacbackupctl.records import BackupRecord
+from catalog import backups
+
+
+def previous(data, file):
+    """ Format._default/__list before the schema (one pass per row/cell) """
+    table = []
+    columns = []
+    for d in data["response"]:
+        columns = []
+        rows = []
+        for k, v in d.items():
+            if k not in Format.LIST_EXCLUDED_COLUMNS:
+                columns.append(k.upper())
+                if "time" in k:
+                    v = str(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(v)))
+                if "size" in k:
+                    v = str(size(v))
+                if "percentage" in k:
+                    v = "{}%".format(int(v))
+                if "_version" in k:
+                    v = str(v)
+                rows.append(v)
+        table.append(rows)
+    rich.get_console().print(
+        tabulate(
+            table, columns, tablefmt="plain", stralign="left", disable_numparse=True
+        ),
+        soft_wrap=True,
+    )
+
+
+def measure(name, render, rows, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        samples.append(time.perf_counter() - start)
+    best = min(samples)
+    print(
+        "{:<10} {:8.1f} ms  {:9.0f} rows/s".format(name, best * 1000, rows / best)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backups", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    """ Rows as the list command receives them (projected records) """
+    rows = [
+        {k: v for k, v in row.items() if k not in Api.LIST_EXCLUDED}
+        for row in backups(args.backups)["response"]
+    ]
+    data = Api.records({"response": rows}, BackupRecord)
+    devnull = open(os.devnull, "w")
+    rich.reconfigure(file=devnull)
+
+    measure("previous", lambda: previous(data, devnull), args.backups, args.repeat)
+    for style in ("table", "json", "ndjson", "csv"):
+        measure(
+            style,
+            lambda: Format.cli(style=style, data=data, source="list", file=devnull),
+            args.backups,
+            args.repeat,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+CLI startup time: wall time of fresh processes for --version, whoami and
+list (against the local maglev stand-in), with a budget per command, and
+the slowest imports of each (python -X importtime)
+
+python benchmarks/importtime.py [--runs 10] [--backups 10] [--top 10] [--no-budget]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.dirname(BENCHMARKS))
+sys.path.append(BENCHMARKS)
+
+""" Median wall time budgets (ms), the interpreter alone is ~20 ms """
+BUDGETS = {
+    "--version": 150,
+    "whoami": 600,
+    "list": 800,
+}
+""" Must not be imported by --version """
+HEAVY = ["requests", "rich", "tabulate", "daemonocle", "sqlite3"]
+
+
+def command(args, importtime=False):
+    return (
+        [sys.executable]
+        + (["-X", "importtime"] if importtime else [])
+        + ["-m", "ciscodnacbackupctl.cli"]
+        + args
+    )
+
+
+def run(args, env, importtime=False):
+    start = time.perf_counter()
+    process = subprocess.run(
+        command(args, importtime), env=env, capture_output=True, text=True
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if process.returncode != 0:
+        raise Exception(
+            "{} failed\n{}".format(" ".join(args), process.stderr[-2000:])
+        )
+    return elapsed, process.stderr
+
+
+def imports(stderr, top):
+    """ Slowest (self time) imports from -X importtime output """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        rows.append((int(own), int(cumulative), name.strip()))
+    loaded = set(row[2] for row in rows)
+    return sorted(rows, reverse=True)[:top], loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--backups", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--no-budget", dest="budget", action="store_false")
+    args = parser.parse_args()
+
+    from stub import Maglev, MaglevHandler, StubServer
+
+    env = dict(os.environ)
+    env.update(
+        {
+            "DNA_CENTER_USERNAME": "bench",
+            "DNA_CENTER_PASSWORD": "bench",
+            "DNA_CENTER_VERIFY": "False",
+            "DNA_CENTER_TOKEN_CACHE": "False",
+            "DNA_CENTER_JOURNAL": "False",
+            "DNA_CENTER_CATALOG": "False",
+            "PYTHONWARNINGS": "ignore",
+            "COLUMNS": "200",
+        }
+    )
+    env.pop("DNAC_PROFILE", None)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(BENCHMARKS)] + env.get("PYTHONPATH", "").split(os.pathsep)
+    ).rstrip(os.pathsep)
+
+    failed = []
+    maglev = Maglev(backups=args.backups, latency=0.0)
+    with StubServer(MaglevHandler.serving(maglev)) as hostname:
+        env["DNA_CENTER_BASE_URL"] = hostname
+        for name, budget in BUDGETS.items():
+            cli_args = name.split()
+            run(cli_args, env)
+            samples = [run(cli_args, env)[0] for _ in range(args.runs)]
+            median = statistics.median(samples)
+            status = "ok" if median <= budget else "OVER"
+            print(
+                "{:<10} p50 {:7.1f} ms  min {:7.1f} ms  budget {:5d} ms  {}".format(
+                    name, median, min(samples), budget, status
+                )
+            )
+            rows, loaded = imports(run(cli_args, env, importtime=True)[1], args.top)
+            for own, cumulative, module in rows:
+                print(
+                    "    {:<40} self {:7.1f} ms  cumulative {:7.1f} ms".format(
+                        module, own / 1000, cumulative / 1000
+                    )
+                )
+            if median > budget:
+                failed.append(name)
+            if name == "--version":
+                heavy = [module for module in HEAVY if module in loaded]
+                if len(heavy) > 0:
+                    print("    --version imports {}".format(", ".join(heavy)))
+                    failed.append(name)
+
+    if args.budget and len(failed) > 0:
+        print("Over budget: {}".format(", ".join(sorted(set(failed)))))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Memory per row and construction time:
+OrderedDict(sorted(backup.items())) (previous remove_columns) vs BackupRecord
+
+python benchmarks/records.py [--backups 10000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+from ciscodnacbackupctl import Api
+from ciscodnacbackupctl.records import BackupRecord, REMOVED_COLUMNS
+from catalog import backups
+
+
+def ordered_dict(row):
+    for k in list(row):
+        if k in REMOVED_COLUMNS:
+            del row[k]
+    return OrderedDict(sorted(row.items()))
+
+
+def measure(name, rows, build):
+    copies = [dict(row) for row in rows]
+    start = time.perf_counter()
+    result = [build(row) for row in copies]
+    elapsed = time.perf_counter() - start
+    del result
+
+    copies = [dict(row) for row in rows]
+    tracemalloc.start()
+    result = [build(row) for row in copies]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(
+        "{:<12} {:8.1f} ms  {:6.2f} us/row  {:5d} bytes/row".format(
+            name,
+            elapsed * 1000,
+            elapsed / len(rows) * 1e6,
+            int(size / len(rows)),
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backups", type=int, default=10000)
+    args = parser.parse_args()
+
+    """ Rows as the list command receives them (projected) """
+    rows = [
+        {k: v for k, v in row.items() if k not in Api.LIST_EXCLUDED}
+        for row in backups(args.backups)["response"]
+    ]
+    for row in rows:
+        row.update({"tenantId": "t", "_id": "i", "_version": 1})
+
+    measure("OrderedDict", rows, ordered_dict)
+    measure("BackupRecord", rows, BackupRecord.from_dict)
+
+
+if __name__ == "__main__":
+    main()
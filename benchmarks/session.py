@@ -0,0 +1,65 @@
+"""
+Per-request latency: one-shot requests.request() vs pooled Api.session
+
+python benchmarks/session.py [--requests 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import requests
+import urllib3
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import ciscodnacbackupctl
+from stub import StubServer
+
+
+def timed(func, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        "{:<12} mean {:7.2f} ms  p50 {:7.2f} ms  p95 {:7.2f} ms".format(
+            name, statistics.mean(samples), statistics.median(samples), p95
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    urllib3.disable_warnings()
+
+    with StubServer() as hostname:
+        os.environ["DNA_CENTER_BASE_URL"] = hostname
+        os.environ["DNA_CENTER_USERNAME"] = "bench"
+        os.environ["DNA_CENTER_PASSWORD"] = "bench"
+        os.environ["DNA_CENTER_VERIFY"] = "False"
+        os.environ["DNA_CENTER_TOKEN_CACHE"] = "False"
+        os.environ["DNA_CENTER_JOURNAL"] = "False"
+        url = "https://{}/api/system/v1/maglev/backup".format(hostname)
+
+        one_shot = timed(
+            lambda: requests.request("GET", url, verify=False).json(), args.requests
+        )
+        api = ciscodnacbackupctl.Api()
+        pooled = timed(lambda: api._request(type="get", url=url), args.requests)
+
+    report("one-shot", one_shot)
+    report("pooled", pooled)
+
+
+if __name__ == "__main__":
+    main()
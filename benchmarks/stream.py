@@ -0,0 +1,63 @@
+"""
+Parse time and peak memory of the backup list response:
+json.loads() + records vs streamed projection (StreamParser)
+
+python benchmarks/stream.py [--backups 1000]
+"""
+import argparse
+import os
+import sys
+import json
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import ciscodnacbackupctl
+from ciscodnacbackupctl.stream import StreamParser, CHUNK_SIZE
+from catalog import backups
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    data = func()
+    elapsed = time.perf_counter() - start
+    del data
+    tracemalloc.start()
+    data = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        "{:<10} {:8.1f} ms  peak {:8.1f} MB  ({} backups)".format(
+            name, elapsed * 1000, peak / 2**20, len(data["response"])
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backups", type=int, default=1000)
+    args = parser.parse_args()
+
+    body = json.dumps(backups(args.backups)).encode("utf-8")
+    print("Response body {:.1f} MB".format(len(body) / 2**20))
+
+    def chunks():
+        for i in range(0, len(body), CHUNK_SIZE):
+            yield body[i : i + CHUNK_SIZE]
+
+    def full():
+        """ requests' response.json() sees the whole body """
+        text = b"".join(chunks()).decode("utf-8")
+        return ciscodnacbackupctl.Api.records(json.loads(text))
+
+    def streamed():
+        data = StreamParser.parse(chunks(), exclude=ciscodnacbackupctl.Api.LIST_EXCLUDED)
+        return ciscodnacbackupctl.Api.records(data)
+
+    measure("json", full)
+    measure("streamed", streamed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from catalog import iter_backups, iter_history, template
+
+BACKUP = "/api/system/v1/maglev/backup"
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Minimal Cisco DNA Center stand-in (keep-alive, HTTP/1.1)"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        return
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+        if self.path.startswith("/dna/system/api/v1/auth/token"):
+            return self._reply(200, {"Token": "stub-token"})
+        return self._reply(200, {"response": "stub-backup-id"})
+
+    def do_GET(self):
+        return self._reply(200, {"version": "stub", "response": []})
+
+
+class Maglev:
+    """
+    Synthetic maglev backup inventory served by MaglevHandler
+    Rows are kept serialized (the 10k catalog is ~460 MB of JSON), a
+    DELETE drops the row until reset(). Created backups run for
+    {duration} seconds then land in history and the backup list.
+    More than {max_inflight} concurrent requests are answered 429
+    """
+
+    def __init__(
+        self,
+        backups=10,
+        history=None,
+        progress=5,
+        latency=0.0,
+        seed=0,
+        duration=3.0,
+        max_inflight=None,
+    ):
+        self.latency = latency
+        self.duration = duration
+        self.max_inflight = max_inflight
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.inflight = 0
+        self.throttled = 0
+        self.running = OrderedDict()
+        self.load(backups, history, progress, seed)
+
+    @staticmethod
+    def _dump(row):
+        return json.dumps(row).encode("utf-8")
+
+    def load(self, backups, history=None, progress=5, seed=0):
+        history = backups if history is None else history
+        pristine = OrderedDict(
+            (b["backup_id"], self._dump(b)) for b in iter_backups(backups, seed)
+        )
+        with self.lock:
+            self._pristine = pristine
+            self.history = [self._dump(t) for t in iter_history(history, seed)]
+            self.progress = [
+                self._dump(t)
+                for t in iter_history(progress, seed + 1, status="IN_PROGRESS")
+            ]
+            self.backups = OrderedDict(pristine)
+        return
+
+    def reset(self):
+        """ Undo deletes (purge/delete iterations) """
+        with self.lock:
+            self.backups = OrderedDict(self._pristine)
+        return
+
+    def ids(self):
+        with self.lock:
+            return list(self.backups)
+
+    def delete(self, backup_id):
+        with self.lock:
+            return self.backups.pop(backup_id, None) is not None
+
+    def create(self, description, status="SUCCESS"):
+        """ New backup task, ends with {status} after {duration} seconds """
+        backup_id = str(uuid.uuid4())
+        with self.lock:
+            self.running[backup_id] = (time.time(), description, status)
+        return backup_id
+
+    def advance(self):
+        """
+        Progress rows of the created tasks, finished ones move to history
+        (and the backup list when successful)
+        """
+        rows = []
+        now = time.time()
+        with self.lock:
+            for backup_id, (start, description, status) in list(
+                self.running.items()
+            ):
+                task = template("history")
+                task.update(
+                    backup_id=backup_id,
+                    id=backup_id,
+                    description=description,
+                    start_timestamp=start,
+                    status="IN_PROGRESS",
+                    progress_in_percentage=min(
+                        100.0 * (now - start) / self.duration, 100.0
+                    ),
+                )
+                if now - start < self.duration:
+                    rows.append(self._dump(task))
+                    continue
+                del self.running[backup_id]
+                task.update(status=status, end_timestamp=now)
+                self.history.append(self._dump(task))
+                if status == "SUCCESS":
+                    backup = template("list")
+                    backup.update(
+                        backup_id=backup_id,
+                        description=description,
+                        start_timestamp=start,
+                        end_timestamp=now,
+                        status=status,
+                    )
+                    self.backups[backup_id] = self._dump(backup)
+        return rows
+
+
+class MaglevHandler(Handler):
+    """
+    Maglev backup endpoints: GET backup, history, progress, POST (create)
+    and DELETE backup. POST /stub/reset restores deleted backups.
+    Every request waits {maglev.latency} seconds first
+    """
+
+    maglev = None
+
+    @classmethod
+    def serving(cls, maglev):
+        return type("MaglevHandler", (cls,), {"maglev": maglev})
+
+    def handle_one_request(self):
+        """ Requests being answered (not idle keep-alive connections) """
+        self.counted = False
+        try:
+            return super().handle_one_request()
+        finally:
+            if self.counted:
+                with self.maglev.lock:
+                    self.maglev.inflight -= 1
+
+    def _wait(self):
+        """ False when throttled (429 sent) """
+        with self.maglev.lock:
+            self.maglev.requests += 1
+            self.maglev.inflight += 1
+            self.counted = True
+            limit = self.maglev.max_inflight
+            throttled = limit is not None and self.maglev.inflight > limit
+            self.maglev.throttled += int(throttled)
+        if self.maglev.latency:
+            time.sleep(self.maglev.latency)
+        if throttled:
+            body = b'{"response": {"error": "Too Many Requests"}}'
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        return not throttled
+
+    def _stream(self, rows):
+        """ {"version", "response": [rows]} without joining the rows """
+        head = b'{"version": "1.4.0", "response": ['
+        length = len(head) + 2 + sum(len(r) for r in rows) + max(len(rows) - 1, 0)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        self.wfile.write(head)
+        for i, row in enumerate(rows):
+            self.wfile.write(b"," + row if i else row)
+        self.wfile.write(b"]}")
+
+    def do_POST(self):
+        if self.path == "/stub/reset":
+            self.maglev.reset()
+            return self._reply(200, {"response": "reset"})
+        if not self._wait():
+            return
+        if self.path.rstrip("/") == BACKUP:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            backup_id = self.maglev.create(body.get("description", ""))
+            return self._reply(200, {"version": "1.4.0", "response": backup_id})
+        return super().do_POST()
+
+    def do_GET(self):
+        if not self._wait():
+            return
+        path = self.path.split("?")[0].rstrip("/")
+        running = self.maglev.advance()
+        if path == BACKUP:
+            with self.maglev.lock:
+                rows = list(self.maglev.backups.values())
+            return self._stream(rows)
+        if path == BACKUP + "/history":
+            return self._stream(self.maglev.history)
+        if path == BACKUP + "/progress":
+            return self._stream(self.maglev.progress + running)
+        return self._reply(404, {"response": {"error": "Not found"}})
+
+    def do_DELETE(self):
+        if not self._wait():
+            return
+        backup_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+        if self.maglev.delete(backup_id):
+            message = f"Deleted backup (backup_id='{backup_id}')"
+            return self._reply(200, {"response": {"message": message, "status": "ok"}})
+        return self._reply(404, {"response": {"error": f"{backup_id} not found"}})
+
+
+class StubServer:
+    """
+    Local HTTPS server with a throwaway self-signed certificate (openssl)
+    Usage: with StubServer() as hostname: ...
+    """
+
+    def __init__(self, handler=Handler, tls=True):
+        self.handler = handler
+        self.tls = tls
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def _certificate(self):
+        cert = os.path.join(self.tmpdir.name, "cert.pem")
+        key = os.path.join(self.tmpdir.name, "key.pem")
+        subprocess.run(
+            [
+                "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=localhost",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        return cert, key
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.daemon_threads = True
+        if self.tls:
+            cert, key = self._certificate()
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, key)
+            self.server.socket = context.wrap_socket(
+                self.server.socket, server_side=True
+            )
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return "127.0.0.1:{}".format(self.server.server_address[1])
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+        return False
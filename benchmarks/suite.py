@@ -0,0 +1,263 @@
+"""
+End to end benchmark suite against a local maglev stand-in (stub.py)
+
+list, history, progress, purge --force and delete run through Api.CLI
+(auth, pooled HTTPS, streamed parsing, formatting) against synthetic
+catalogs, each scenario in its own process so peak RSS is per scenario.
+Results (latency percentiles, throughput, peak RSS) are written to a JSON
+file that --compare diffs against a previous run.
+
+python benchmarks/suite.py [--sizes 10,1000,10000] [--latency 5] [--iterations 3]
+                           [--concurrency 4] [--out results.json] [--compare old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BENCHMARKS = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.dirname(BENCHMARKS))
+sys.path.append(BENCHMARKS)
+
+SCENARIOS = ["list", "history", "progress", "purge", "delete"]
+""" Backups kept by the purge scenario, deleted by the delete scenario """
+PURGE_KEEP = 3
+DELETE_BATCH = 10
+
+
+def percentile(samples, pct):
+    """ Nearest-rank percentile """
+    samples = sorted(samples)
+    rank = max(1, int(round(pct / 100.0 * len(samples) + 0.5)))
+    return samples[min(rank, len(samples)) - 1]
+
+
+def worker(args):
+    """
+    One scenario in this process, prints the JSON result on stdout
+    """
+    out = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    import ciscodnacbackupctl
+
+    cli = ciscodnacbackupctl.Api.CLI()
+    url = "https://{}".format(args.hostname)
+
+    def reset():
+        cli.api.session.post(url + "/stub/reset", verify=False).raise_for_status()
+
+    ids = []
+    if args.worker == "delete":
+        data = cli.api.get(fields=["backup_id", "end_timestamp"])
+        ids = [b.backup_id for b in data["response"]][:DELETE_BATCH]
+
+    scenarios = {
+        "list": (lambda: cli.list(False), args.size),
+        "history": (lambda: cli.history(), args.size),
+        "progress": (lambda: cli.progress(), args.progress),
+        "purge": (
+            lambda: cli.purge(
+                keep=PURGE_KEEP,
+                incompatible=False,
+                force=True,
+                concurrency=args.concurrency,
+            ),
+            max(args.size - PURGE_KEEP, 0),
+        ),
+        "delete": (lambda: cli.delete(ids, concurrency=args.concurrency), len(ids)),
+    }
+    run, rows = scenarios[args.worker]
+
+    samples = []
+    for _ in range(args.iterations):
+        if args.worker in ("purge", "delete"):
+            reset()
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+
+    total = sum(samples)
+    result = {
+        "scenario": args.worker,
+        "size": args.size,
+        "iterations": len(samples),
+        "mean_ms": total / len(samples) * 1000,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "min_ms": min(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+        "ops_per_s": len(samples) / total if total else 0,
+        "rows_per_s": rows * len(samples) / total if total else 0,
+        # ru_maxrss is KB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    out.write(json.dumps(result) + "\n")
+    return
+
+
+def scenario(args, hostname, name, size):
+    env = dict(os.environ)
+    env.update(
+        {
+            "DNA_CENTER_BASE_URL": hostname,
+            "DNA_CENTER_USERNAME": "bench",
+            "DNA_CENTER_PASSWORD": "bench",
+            "DNA_CENTER_VERIFY": "False",
+            "DNA_CENTER_TOKEN_CACHE": "False",
+            "DNA_CENTER_JOURNAL": "False",
+            # measure the client, not the token bucket
+            "DNA_CENTER_RATE_LIMIT": "0",
+        }
+    )
+    env.pop("DNAC_PROFILE", None)
+    command = [
+        sys.executable,
+        os.path.realpath(__file__),
+        "--worker",
+        name,
+        "--hostname",
+        hostname,
+        "--size",
+        str(size),
+        "--iterations",
+        str(args.iterations),
+        "--concurrency",
+        str(args.concurrency),
+        "--progress",
+        str(args.progress),
+    ]
+    process = subprocess.run(command, env=env, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise Exception(
+            "Scenario {} ({}) failed\n{}".format(name, size, process.stderr)
+        )
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCHMARKS,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def report(results, previous=None):
+    from tabulate import tabulate
+
+    before = {}
+    if previous is not None:
+        before = {(r["scenario"], r["size"]): r for r in previous["results"]}
+    columns = ["SCENARIO", "SIZE", "P50 MS", "P95 MS", "P99 MS", "ROWS/S", "RSS MB"]
+    if previous is not None:
+        columns += ["P50 VS", "RSS VS"]
+    table = []
+    for r in results:
+        row = [
+            r["scenario"],
+            r["size"],
+            "{:.1f}".format(r["p50_ms"]),
+            "{:.1f}".format(r["p95_ms"]),
+            "{:.1f}".format(r["p99_ms"]),
+            "{:.0f}".format(r["rows_per_s"]),
+            "{:.1f}".format(r["peak_rss_mb"]),
+        ]
+        if previous is not None:
+            old = before.get((r["scenario"], r["size"]))
+            for key in ("p50_ms", "peak_rss_mb"):
+                if old is None or not old[key]:
+                    row.append("-")
+                else:
+                    row.append("{:+.0%}".format(r[key] / old[key] - 1))
+        table.append(row)
+    print(tabulate(table, columns, tablefmt="plain", disable_numparse=True))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,1000,10000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=5, help="ms per request")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--progress", type=int, default=5, help="tasks in progress")
+    parser.add_argument("--out", default=None, help="results file (JSON)")
+    parser.add_argument("--compare", default=None, help="previous results file")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--hostname", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    import urllib3
+
+    urllib3.disable_warnings()
+    if args.worker is not None:
+        return worker(args)
+
+    import ciscodnacbackupctl
+    from stub import Maglev, MaglevHandler, StubServer
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    scenarios = args.scenarios.split(",")
+    maglev = Maglev(backups=0, progress=args.progress, latency=args.latency / 1000)
+    results = []
+    with StubServer(MaglevHandler.serving(maglev)) as hostname:
+        for size in sizes:
+            start = time.perf_counter()
+            maglev.load(size, progress=args.progress)
+            print(
+                "Catalog of {} backups ({:.1f}s)".format(
+                    size, time.perf_counter() - start
+                ),
+                file=sys.stderr,
+            )
+            for name in scenarios:
+                requests = maglev.requests
+                result = scenario(args, hostname, name, size)
+                result["requests"] = maglev.requests - requests
+                results.append(result)
+                maglev.reset()
+                print(
+                    "  {:<9} p50 {:9.1f} ms".format(name, result["p50_ms"]),
+                    file=sys.stderr,
+                )
+
+    data = {
+        "version": ciscodnacbackupctl.version,
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "latency_ms": args.latency,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    out = args.out or os.path.join(
+        BENCHMARKS,
+        "results",
+        "{}-{}.json".format(data["version"], datetime.now().strftime("%Y%m%d-%H%M%S")),
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        f.write(json.dumps(data, indent=4))
+
+    previous = None
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            previous = json.loads(f.read())
+    report(results, previous)
+    print("Results: {}".format(out))
+
+
+if __name__ == "__main__":
+    main()
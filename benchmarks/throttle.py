@@ -0,0 +1,61 @@
+"""
+Bulk delete against a stub that answers 429 (Retry-After: 1) above
+{max_inflight} concurrent requests: duration, 429s received and the
+concurrency the rate limiter settled on
+
+python benchmarks/throttle.py [--backups 200] [--concurrency 16] [--max-inflight 4]
+"""
+import argparse
+import os
+import sys
+import time
+import urllib3
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import ciscodnacbackupctl
+from stub import Maglev, MaglevHandler, StubServer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backups", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-inflight", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--rate-limit", default="0")
+    args = parser.parse_args()
+    urllib3.disable_warnings()
+
+    maglev = Maglev(
+        backups=args.backups,
+        progress=0,
+        latency=args.latency,
+        max_inflight=args.max_inflight,
+    )
+    with StubServer(MaglevHandler.serving(maglev)) as hostname:
+        os.environ["DNA_CENTER_BASE_URL"] = hostname
+        os.environ["DNA_CENTER_USERNAME"] = "bench"
+        os.environ["DNA_CENTER_PASSWORD"] = "bench"
+        os.environ["DNA_CENTER_VERIFY"] = "False"
+        os.environ["DNA_CENTER_TOKEN_CACHE"] = "False"
+        os.environ["DNA_CENTER_JOURNAL"] = "False"
+        os.environ["DNA_CENTER_POOL_SIZE"] = str(args.concurrency)
+        os.environ["DNA_CENTER_RATE_LIMIT"] = args.rate_limit
+        sys.stdout = open(os.devnull, "w")
+        cli = ciscodnacbackupctl.Api.CLI()
+        start = time.perf_counter()
+        cli.delete(maglev.ids(), concurrency=args.concurrency)
+        elapsed = time.perf_counter() - start
+        sys.stdout = sys.__stdout__
+
+    failed = sum(1 for v in cli.results.values() if not v["ok"])
+    print(
+        "{} deletes in {:.2f}s, {} failed, {} x 429, concurrency limit {}".format(
+            len(cli.results), elapsed, failed, maglev.throttled, cli.api.limiter.limit
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
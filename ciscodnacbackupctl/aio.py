@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+from ciscodnacbackupctl import Api
+from ciscodnacbackupctl.config import Config
+from ciscodnacbackupctl.debug import Debug
+from ciscodnacbackupctl.records import BackupRecord, HistoryRecord, ProgressRecord
+from ciscodnacbackupctl.tokencache import TokenCache
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+""" Default cap on in-flight requests per AsyncApi """
+DNAC_MAX_CONCURRENCY = 10
+
+
+class AsyncApi:
+    """
+    asyncio client for Cisco DNA Center backups (requires aiohttp)
+
+    async with AsyncApi() as api:
+        data = await api.get()
+    """
+
+    def __init__(self, settings=None, pool_size=None, max_concurrency=None):
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncApi requires aiohttp (pip install ciscodnacbackupctl[async])"
+            )
+        if settings is None:
+            _client = Config()
+            if _client.config[0] is False:
+                raise Exception(_client.config[1])
+            settings = _client.config[1]
+        self.settings = settings
+        self.pool_size = int(
+            pool_size or self.settings["dnac"].get("pool_size", 0) or 10
+        )
+        self.max_concurrency = int(max_concurrency or DNAC_MAX_CONCURRENCY)
+        self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+        return False
+
+    async def open(self):
+        """
+        Create connection pool and authenticate (cached token if valid)
+        """
+        if self.session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            ssl=None if self.settings["dnac"]["secure"] else False,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        cached = TokenCache.read(self.settings)
+        if cached[0] is True:
+            self.settings["dnac"]["token"] = cached[1]
+        else:
+            await self._auth()
+        return
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        return
+
+    def _url(self, path):
+        return "https://{}{}".format(self.settings["dnac"]["hostname"], path)
+
+    async def _auth(self):
+        """Cisco DNA Center Auth"""
+        url = self._url("/dna/system/api/v1/auth/token")
+        logging.info("Cisco DNA Center Authentication ({})".format(url))
+        data = await self._request(type="auth", url=url)
+        self.settings["dnac"]["token"] = data["Token"]
+        TokenCache.write(self.settings, data["Token"])
+        return
+
+    async def _request(self, **kwargs):
+        """
+        HTTP Requests (same semantics as Api._request)
+        """
+        method = kwargs["type"].lower()
+        async with self._semaphore:
+            if method == "auth":
+                auth = aiohttp.BasicAuth(
+                    self.settings["dnac"]["username"],
+                    self.settings["dnac"]["password"],
+                )
+                async with self.session.post(kwargs["url"], auth=auth) as response:
+                    text = await response.text()
+                    Debug.payload(text)
+                    if response.ok:
+                        return json.loads(text)
+                    if response.status == 429:
+                        raise Exception(
+                            "Can't login to Cisco DNA Center - Too Many Requests - Please try later"
+                        )
+                    raise Exception("Can't login to Cisco DNA Center ({})".format(text))
+
+            headers = {"X-Auth-Token": self.settings["dnac"]["token"]}
+            async with self.session.request(
+                method.upper(),
+                kwargs["url"],
+                headers=headers,
+                data=kwargs.get("payload"),
+            ) as response:
+                text = await response.text()
+                status = response.status
+        Debug.payload(text)
+
+        if status == 401 and not kwargs.get("reauth"):
+            TokenCache.clear(self.settings)
+            await self._auth()
+            return await self._request(**kwargs, reauth=True)
+
+        if 200 <= status < 300 or (method == "post" and status == 409):
+            return json.loads(text)
+        if status == 404:
+            raise Exception(f"Error: Not found ({text})")
+        try:
+            error = json.loads(text)["response"].get("error", "Not Available")
+        except Exception:
+            error = text
+        raise Exception("Error: ({})".format(error))
+
+    async def get(self, reverse=False):
+        """
+        Get Cisco DNA Center Backups
+        """
+        data = await self._request(
+            type="get", url=self._url("/api/system/v1/maglev/backup")
+        )
+        data = Api.records(data, BackupRecord)
+        data["response"] = sorted(
+            data["response"], key=lambda k: k.end_timestamp, reverse=reverse
+        )
+        return data
+
+    async def get_history(self):
+        data = await self._request(
+            type="get", url=self._url("/api/system/v1/maglev/backup/history")
+        )
+        return Api.records(data, HistoryRecord)
+
+    async def get_progress(self):
+        data = await self._request(
+            type="get", url=self._url("/api/system/v1/maglev/backup/progress")
+        )
+        return Api.records(data, ProgressRecord)
+
+    async def create(self, name):
+        """
+        Create backup, returns the new backup id
+        """
+        data = await self._request(
+            type="post",
+            url=self._url("/api/system/v1/maglev/backup"),
+            payload=json.dumps({"description": name}),
+        )
+        if isinstance(data["response"], str):
+            return data["response"]
+        raise Exception("Error: {}".format(data["response"]["error"]))
+
+    async def delete(self, backup_id):
+        """
+        Delete one backup (str) or many (list/tuple) concurrently
+        Many returns {backup_id: response or Exception}
+        """
+        if isinstance(backup_id, str):
+            if len(backup_id) != 36:
+                raise ValueError(f"Invalid Backup ID - {backup_id}")
+            return await self._request(
+                type="delete",
+                url=self._url("/api/system/v1/maglev/backup/{}".format(backup_id)),
+            )
+        if not isinstance(backup_id, (list, tuple)):
+            raise TypeError(f"Incorrect type for backup_id - {type(backup_id)}")
+        for id in backup_id:
+            if len(id) != 36:
+                raise ValueError(f"Invalid Backup ID - {id}")
+        results = await asyncio.gather(
+            *[self.delete(id) for id in backup_id], return_exceptions=True
+        )
+        return dict(zip(backup_id, results))
+
+    async def get_schedule(self):
+        data = await self._request(
+            type="get", url=self._url("/api/system/v1/maglev/schedule/backup")
+        )
+        return data["response"]
+
+    async def create_schedule(self, name, day=("everyday",), time="23:00"):
+        return await self._request(
+            type="post",
+            url=self._url("/api/system/v1/maglev/schedule/backup/{}".format(name)),
+            payload=Api.schedule_payload(name=name, day=list(day), time=time),
+        )
+
+    async def delete_schedule(self, name):
+        return await self._request(
+            type="delete",
+            url=self._url("/api/system/v1/maglev/schedule/backup/{}".format(name)),
+        )
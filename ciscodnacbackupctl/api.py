@@ -0,0 +1,1217 @@
+import logging
+from datetime import datetime
+from collections import OrderedDict
+import json
+import threading
+import time
+import requests
+from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+import urllib3
+from rich.console import Console
+import click
+from hurry.filesize import size
+from ciscodnacbackupctl.format import Format
+from ciscodnacbackupctl.config import Config
+from ciscodnacbackupctl.debug import Debug
+from ciscodnacbackupctl.tokencache import TokenCache, DNAC_TOKEN_TTL, DNAC_TOKEN_MARGIN
+from ciscodnacbackupctl.pipeline import Pipeline
+from ciscodnacbackupctl.retry import (
+    Retry,
+    CircuitBreaker,
+    CircuitOpen,
+    TRANSIENT,
+    IDEMPOTENT,
+    DNAC_RETRIES,
+)
+from ciscodnacbackupctl.ratelimit import (
+    RateLimiter,
+    THROTTLED,
+    DNAC_RATE_LIMIT,
+    DNAC_RATE_BURST,
+)
+from ciscodnacbackupctl.retention import Retention
+from ciscodnacbackupctl.plan import Plan, PLAN_FIELDS
+from ciscodnacbackupctl.journal import Journal
+from ciscodnacbackupctl.catalog import Catalog, DNAC_CATALOG_MAX_AGE
+from ciscodnacbackupctl.metrics import Metrics
+from ciscodnacbackupctl.timings import Timings
+from ciscodnacbackupctl.trace import Trace
+from ciscodnacbackupctl.stream import StreamParser, CHUNK_SIZE
+from ciscodnacbackupctl.watch import Watch, Wait
+from ciscodnacbackupctl.records import (
+    REMOVED_COLUMNS,
+    BackupRecord,
+    HistoryRecord,
+    ProgressRecord,
+)
+
+""" Default size of the HTTP connection pool towards Cisco DNA Center """
+DNAC_POOL_SIZE = 10
+""" Retries of a request throttled by Cisco DNA Center (429/503) """
+DNAC_THROTTLE_RETRIES = 3
+""" Seconds to connect and between two reads of a response (timeout) """
+DNAC_CONNECT_TIMEOUT = 10
+DNAC_READ_TIMEOUT = 300
+
+
+class Api:
+    """ Backup fields skipped while parsing when listing backups """
+    LIST_EXCLUDED = Format.LIST_EXCLUDED_COLUMNS + list(REMOVED_COLUMNS)
+
+    """ Pooled HTTP sessions shared by every Api() towards the same cluster """
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+    """ One re-authentication per cluster at a time when parallel requests get a 401 """
+    _auth_locks = {}
+
+    def __init__(self, config=False, profile=None):
+        """
+        Create client session
+        Checking config (env/local file), optionally a named profile
+        """
+        with Timings.phase("config"):
+            _client = Config(profile=profile)
+        if _client.config[0] is False:
+            if profile:
+                raise Exception(_client.config[1])
+            return
+        """
+        Authenticate towards Cisco DNA Center
+        """
+        self.config_source = _client.source
+        self.config_generation = Config.generation
+        if config is False:
+            self.settings = _client.config[1]
+            self.token_expires = 0
+            self.session = self._session()
+            self.limiter = self._limiter()
+            self.breaker = CircuitBreaker.get(self.settings["dnac"]["hostname"])
+            self.retry = Retry(
+                retries=self.settings["dnac"].get("retries", DNAC_RETRIES)
+            )
+            self.timeout = (
+                DNAC_CONNECT_TIMEOUT,
+                self.settings["dnac"].get("timeout", DNAC_READ_TIMEOUT),
+            )
+            self._login()
+        return
+
+    def _login(self):
+        """
+        Reuse cached token (until close to expiry), otherwise authenticate
+        """
+        with Timings.phase("token cache"):
+            cached = TokenCache.read(self.settings)
+        if cached[0] is True:
+            logging.info("Cisco DNA Center Authentication (cached token)")
+            self.settings["dnac"]["token"] = cached[1]
+            self.token_expires = TokenCache.expires(self.settings)
+            return
+        self._auth()
+        return
+
+    def refresh_token(self, margin=DNAC_TOKEN_MARGIN):
+        """
+        Authenticate again when the token has less than {margin} seconds
+        left (long-lived clients), instead of waiting for a 401
+        """
+        if time.time() < self.token_expires - margin:
+            return False
+        logging.info("Cisco DNA Center token expiring, re-authenticating")
+        self._auth()
+        return True
+
+    def _session(self):
+        """
+        Long-lived HTTP session (keep-alive) towards Cisco DNA Center
+        Connections (and their TLS handshake) are reused between requests,
+        CLI commands in the same process and the daemon jobs
+        """
+        key = self._session_key()
+        pool_size = self.pool_size
+        with Api._sessions_lock:
+            if key not in Api._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=pool_size, pool_block=False
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.hooks["response"].append(Metrics.response_hook)
+                session.hooks["response"].append(Timings.response_hook)
+                session.hooks["response"].append(Trace.response_hook)
+                session.verify = self.settings["dnac"]["secure"]
+                session.headers.update(
+                    {
+                        "Content-Type": "application/json",
+                        "Accept": "application/json",
+                        "Connection": "keep-alive",
+                    }
+                )
+                Api._sessions[key] = session
+            return Api._sessions[key]
+
+    def _session_key(self):
+        pool_size = int(self.settings["dnac"].get("pool_size", DNAC_POOL_SIZE))
+        self.pool_size = pool_size
+        return (
+            self.settings["dnac"]["hostname"],
+            self.settings["dnac"]["secure"],
+            pool_size,
+        )
+
+    def _limiter(self):
+        """
+        Rate limiter shared by every Api towards the cluster, at most
+        {pool_size} requests in flight
+        """
+        return RateLimiter.get(
+            self.settings["dnac"]["hostname"],
+            rate=self.settings["dnac"].get("rate_limit", DNAC_RATE_LIMIT),
+            burst=self.settings["dnac"].get("rate_burst", DNAC_RATE_BURST),
+            max_concurrency=self.pool_size,
+        )
+
+    def reset_session(self):
+        """
+        Drop the pooled session of this cluster (stale or broken
+        connections) and open a new one
+        """
+        with Api._sessions_lock:
+            session = Api._sessions.pop(self._session_key(), None)
+        if session is not None:
+            session.close()
+        self.session = self._session()
+        return
+
+    @classmethod
+    def close(cls):
+        """ Close all pooled sessions (and their connections) """
+        with cls._sessions_lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+        return
+
+    @classmethod
+    def config(cls, hostname, username, password, secure, **kwargs):
+        """
+        if "read" in kwargs["operation"]:
+            return Config.read()
+        """
+        if "write" in kwargs["operation"]:
+            return Config.write(hostname, username, password, secure, **kwargs)
+
+        return
+
+    def _auth(self):
+        """Cisco DNA Center Auth"""
+        url = "https://{}/dna/system/api/v1/auth/token".format(
+            self.settings["dnac"]["hostname"]
+        )
+        logging.info("Cisco DNA Center Authentication ({})".format(url))
+        with Timings.phase("auth"):
+            data = self._request(type="auth", url=url)
+        Metrics.inc("dnac_auth_total")
+        self.settings["dnac"]["token"] = data["Token"]
+        self.token_expires = time.time() + DNAC_TOKEN_TTL
+        TokenCache.write(self.settings, data["Token"])
+        return
+
+    def _unauthorized(self, response, kwargs, token):
+        """
+        Token expired or revoked (401) - authenticate again, once
+        Parallel requests rejected with the same {token} wait for the
+        first one to authenticate and are sent again with its new token
+        """
+        if response.status_code != 401 or kwargs.get("reauth"):
+            return False
+        with Api._sessions_lock:
+            lock = Api._auth_locks.setdefault(
+                self.settings["dnac"]["hostname"], threading.Lock()
+            )
+        with lock:
+            if self.settings["dnac"].get("token") != token:
+                return True
+            logging.info("Cisco DNA Center token rejected, re-authenticating")
+            TokenCache.clear(self.settings)
+            self._auth()
+        return True
+
+    def get(self, reverse=False, fields=None, exclude=None):
+        """
+        Get Cisco DNA Center Backups
+        {fields}/{exclude} project each backup while the response is streamed
+        """
+        url = "https://{}{}".format(
+            self.settings["dnac"]["hostname"], "/api/system/v1/maglev/backup"
+        )
+
+        data = self._request(type="get", url=url, fields=fields, exclude=exclude)
+        data = self.records(data, BackupRecord)
+        with Timings.phase("sort", f"{len(data['response'])} backups"):
+            data["response"] = sorted(
+                data["response"], key=lambda k: k.end_timestamp, reverse=reverse
+            )
+
+        return data
+
+    @staticmethod
+    def records(data, record=BackupRecord):
+        """
+        Response rows as compact records (BackupRecord, HistoryRecord...)
+        Records are read-only Mappings, record["key"] works as before
+        """
+        with Timings.phase("records", f"{len(data['response'])} {record.__name__}"):
+            data["response"] = [record.from_dict(row) for row in data["response"]]
+        return data
+
+    def get_history(self, fields=None):
+        url = "https://{}{}".format(
+            self.settings["dnac"]["hostname"], "/api/system/v1/maglev/backup/history"
+        )
+        data = self._request(type="get", url=url, fields=fields)
+        data = self.records(data, HistoryRecord)
+        return data
+
+    def get_progress(self, fields=None):
+        url = "https://{}{}".format(
+            self.settings["dnac"]["hostname"], "/api/system/v1/maglev/backup/progress"
+        )
+        data = self._request(type="get", url=url, fields=fields)
+        data = self.records(data, ProgressRecord)
+        return data
+
+    @staticmethod
+    def schedule_payload(**kwargs):
+        """
+        Payload for a scheduled backup (name, day list, time HH:MM)
+        Create list of number 0-6 representing each weekday. This is needed for the DNAC payload.
+        """
+        weekdays = [
+            "sunday",
+            "monday",
+            "tuesday",
+            "wednesday",
+            "thursday",
+            "friday",
+            "saturday",
+        ]
+
+        day_list = kwargs["day"]
+        if len(day_list) >= 1:
+            if day_list[0].lower() == "everyday":
+                _list = []
+                for day in weekdays:
+                    _list.append(str(weekdays.index(day)))
+                interval = ",".join(_list)
+
+            else:
+                days = list(day_list)
+                _list = []
+
+                for day in days:
+                    day = day.lower()
+                    _list.append(str(weekdays.index(day)))
+                interval = ",".join(_list)
+        else:
+            raise Exception("Error in day argument when using schedule_backup()")
+
+        time = kwargs["time"]
+        time_list = time.split(":")
+        time_list[0] = int(time_list[0]) - 1
+        """
+        Payload for the POST request
+        """
+        payload = {
+            "schedule": "{} {} * * {}".format(time_list[1], time_list[0], interval),
+            "json_payload": {
+                "description": kwargs["name"],
+                "appstacks": {"ndp": {}},
+            },
+            "env": {},
+            "url": "http://glusterfs-brick.maglev-system.svc.cluster.local:8080/api/v1/sidecar/backup/1234",
+        }
+        return json.dumps(payload)
+
+    def _send(self, method, url, **kwargs):
+        """
+        session.request() through the cluster CircuitBreaker and
+        RateLimiter: throttled requests (429/503) are sent again after
+        Retry-After, GET/DELETE after transient failures (connection,
+        timeout, 500/502/504) with jittered backoff
+        {response.retries} is the number of those retries
+        """
+        retries = self.retry.retries if method in IDEMPOTENT else 0
+        failures = throttled = 0
+        while True:
+            self.breaker.check()
+            sent = self.limiter.acquire()
+            try:
+                response = self._send_once(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self.limiter.release(sent=sent)
+                self.breaker.failure()
+                if failures >= retries:
+                    raise
+                failures += 1
+                self._backoff(method, url, failures, type(error).__name__)
+                continue
+            except Exception:
+                self.limiter.release(sent=sent)
+                self.breaker.failure()
+                raise
+            pause = self.limiter.release(
+                response.status_code,
+                response.elapsed.total_seconds(),
+                response.headers.get("Retry-After"),
+                sent=sent,
+            )
+            response.retries = failures
+            if response.status_code in THROTTLED:
+                self.breaker.throttled()
+                Metrics.inc(
+                    "dnac_throttled_total",
+                    endpoint=Metrics.endpoint(url),
+                    code=str(response.status_code),
+                )
+                if throttled == DNAC_THROTTLE_RETRIES:
+                    return response
+                throttled += 1
+                logging.warning(
+                    "Cisco DNA Center throttled {} {} ({}), retrying in {:g}s".format(
+                        method, Metrics.endpoint(url), response.status_code, pause
+                    )
+                )
+                response.close()
+                continue
+            if response.status_code in TRANSIENT:
+                self.breaker.failure()
+                if failures >= retries:
+                    return response
+                failures += 1
+                response.close()
+                self._backoff(method, url, failures, response.status_code)
+                continue
+            self.breaker.success()
+            return response
+
+    def _backoff(self, method, url, attempt, reason):
+        delay = self.retry.delay(attempt)
+        Metrics.inc(
+            "dnac_retries_total",
+            endpoint=Metrics.endpoint(url),
+            method=method,
+            reason=str(reason),
+        )
+        logging.warning(
+            "Cisco DNA Center {} {} failed ({}), retry {}/{} in {:.1f}s".format(
+                method,
+                Metrics.endpoint(url),
+                reason,
+                attempt,
+                self.retry.retries,
+                delay,
+            )
+        )
+        self.retry.sleep(delay)
+        return
+
+    def _send_once(self, method, url, **kwargs):
+        """
+        session.request(), with the body download timed (--timings)
+        requests reads non-streamed bodies after the response headers
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if not Timings.enabled:
+            return self.session.request(method, url, **kwargs)
+        start = time.perf_counter()
+        response = self.session.request(method, url, **kwargs)
+        if not kwargs.get("stream"):
+            body = time.perf_counter() - start - response.elapsed.total_seconds()
+            Timings.add("body", max(body, 0.0), Timings.request(method, url))
+        return response
+
+    @staticmethod
+    def _json(response):
+        detail = Timings.request(response.request.method, response.url)
+        with Timings.phase("json decode", detail):
+            return response.json()
+
+    def _request(self, **kwargs):
+        urllib3.disable_warnings()
+        """
+        HTTP Requests
+        """
+
+        if "auth" in kwargs["type"].lower():
+            url = kwargs["url"]
+            headers = {
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            }
+            response = self._send(
+                "POST",
+                url,
+                auth=HTTPBasicAuth(
+                    self.settings["dnac"]["username"],
+                    self.settings["dnac"]["password"],
+                ),
+                headers=headers,
+                verify=self.settings["dnac"]["secure"],
+            )
+
+            Debug.response(response)
+
+            if response.ok:
+                data = self._json(response)
+            else:
+                if response.status_code == 429:
+                    raise Exception(
+                        "Can't login to Cisco DNA Center - Too Many Requests - Please try later"
+                    )
+                raise Exception(
+                    "Can't login to Cisco DNA Center ({})".format(response.json())
+                )
+            return data
+
+        if "get" in kwargs["type"].lower():
+            """
+            HTTP Method GET
+            """
+            url = kwargs["url"]
+            headers = {
+                "X-Auth-Token": self.settings["dnac"]["token"],
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            }
+            """
+            Projection ({fields}/{exclude}) streams and parses the body
+            incrementally, skipping the values that aren't needed
+            """
+            stream = (
+                kwargs.get("fields") is not None or kwargs.get("exclude") is not None
+            )
+            response = self._send(
+                "GET",
+                url,
+                headers=headers,
+                verify=self.settings["dnac"]["secure"],
+                stream=stream,
+            )
+
+            if self._unauthorized(response, kwargs, headers["X-Auth-Token"]):
+                response.close()
+                return self._request(**kwargs, reauth=True)
+
+            if stream and response.ok:
+                with Timings.phase("stream parse", Timings.request("GET", url)):
+                    data = StreamParser.parse(
+                        response.iter_content(CHUNK_SIZE),
+                        fields=kwargs.get("fields"),
+                        exclude=kwargs.get("exclude"),
+                    )
+                Debug.payload(f"Streamed response ({url})")
+                return data
+
+            Debug.response(response)
+
+            response.raise_for_status()
+            if response.ok:
+                data = self._json(response)
+            else:
+                if response.status_code == 404:
+                    raise Exception("Error: Not found")
+                data = response.json()
+                print(
+                    "Error: ({})".format(data["response"].get("error", "Not Available"))
+                )
+            return data
+        if "delete" in kwargs["type"].lower():
+            """
+            HTTP Method DELETE
+            """
+            url = kwargs["url"]
+            headers = {
+                "X-Auth-Token": self.settings["dnac"]["token"],
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            }
+            response = self._send(
+                "DELETE",
+                url,
+                headers=headers,
+                verify=self.settings["dnac"]["secure"],
+            )
+
+            Debug.response(response)
+
+            if self._unauthorized(response, kwargs, headers["X-Auth-Token"]):
+                return self._request(**kwargs, reauth=True)
+
+            if response.ok:
+                data = self._json(response)
+            elif response.status_code == 404 and response.retries > 0:
+                """ Sent again after a transient failure, the first one deleted it """
+                backup_id = url.rstrip("/").rsplit("/", 1)[-1]
+                data = {
+                    "response": {
+                        "status": "ok",
+                        "message": f"Deleted backup (backup_id='{backup_id}')",
+                    }
+                }
+            else:
+                if response.status_code == 404:
+                    if "response" in response.json():
+                        raise Exception(
+                            f"Error: Not found ({response.json()['response']})"
+                        )
+                    raise Exception(f"Error: Not found ({response.text})")
+                data = response.json()
+                raise Exception(
+                    "Error: ({})".format(data["response"].get("error", "Not Available"))
+                )
+            return data
+
+        if "post" in kwargs["type"].lower():
+            url = kwargs["url"]
+            headers = {
+                "X-Auth-Token": self.settings["dnac"]["token"],
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            }
+            response = self._send(
+                "POST",
+                url,
+                headers=headers,
+                verify=self.settings["dnac"]["secure"],
+                data=kwargs["payload"],
+            )
+            
+
+            Debug.response(response)
+
+            if self._unauthorized(response, kwargs, headers["X-Auth-Token"]):
+                return self._request(**kwargs, reauth=True)
+
+            if response.ok:
+                data = self._json(response)
+            elif response.status_code == 409:
+                data = response.json()
+            else:
+                if response.status_code == 404:
+                    if "response" in response.json():
+                        raise Exception(
+                            f"Error: Not found ({response.json()['response']})"
+                        )
+                    raise Exception(f"Error: Not found ({response.text})")
+                data = response.json()
+                raise Exception(
+                    "Error: ({})".format(data["response"].get("error", "Not Available"))
+                )
+            return data
+
+    class CLI:
+        def __init__(
+            self,
+            debug=False,
+            profile=None,
+            cached=False,
+            max_age=DNAC_CATALOG_MAX_AGE,
+            output="table",
+            api=None,
+        ):
+            """
+            {cached} answers reads from the local catalog if synced less
+            than {max_age} seconds ago, otherwise fetches and syncs it
+            {output} is the Format style of whoami/list/history/progress
+            {api} reuses an authenticated Api (daemon), instead of a new one
+            """
+            if debug:
+                Debug()
+            self.api = api if api is not None else Api(profile=profile)
+            self.max_age = max_age
+            self.output = output
+            self.catalog = None
+            self.results = {}
+            self.sizes = {}
+            self.purge_plan = None
+            self.journal = None
+            if Journal.enabled(self.api.settings):
+                self.journal = Journal(self.api.settings["dnac"]["hostname"])
+            if cached and Catalog.enabled(self.api.settings):
+                self.catalog = Catalog(self.api.settings["dnac"]["hostname"])
+
+        def fetch_backups(self, reverse=False, cached=True):
+            """
+            Backups (list projection), from the catalog when fresh enough
+            """
+            if self.catalog is not None and cached:
+                catalog = self.catalog.read("backup", max_age=self.max_age)
+                if catalog[0] is True:
+                    data = Api.records(catalog[1], BackupRecord)
+                    if reverse:
+                        data["response"].reverse()
+                    return data
+            data = self.api.get(reverse=reverse, exclude=Api.LIST_EXCLUDED)
+            if self.catalog is not None:
+                self.catalog.sync("backup", data["response"])
+            Metrics.set("dnac_backups", len(data["response"]))
+            Metrics.set(
+                "dnac_backups_bytes",
+                sum(b.get("backup_size") or 0 for b in data["response"]),
+            )
+            return data
+
+        def fetch_history(self, cached=True):
+            if self.catalog is not None and cached:
+                catalog = self.catalog.read("history", max_age=self.max_age)
+                if catalog[0] is True:
+                    return Api.records(catalog[1], HistoryRecord)
+            data = self.api.get_history(fields=Format.HISTORY_COLUMNS)
+            if self.catalog is not None:
+                self.catalog.sync("history", data["response"])
+            return data
+
+        def refresh(self):
+            """
+            Sync the local catalog (daemon refresh job), --cached reads
+            stay fresh without hitting Cisco DNA Center
+            """
+            if self.catalog is None:
+                raise Exception("Error: Local catalog is disabled")
+            backups = self.fetch_backups(cached=False)
+            history = self.fetch_history(cached=False)
+            Console().log(
+                "Catalog refreshed ({} backups, {} history)".format(
+                    len(backups["response"]), len(history["response"])
+                )
+            )
+            return True
+
+        def whoami(self, **kwargs):
+            self.api.settings["dnac"]["method"] = self.api.config_source
+            Format.cli(
+                style=self.output,
+                data=self.api.settings["dnac"],
+                source="dict",
+            )
+            return True
+
+        def list(self, reverse):
+            data = self.fetch_backups(reverse=reverse)
+            Format.cli(style=self.output, data=data, source="list")
+            return True
+
+        def history(self):
+            data = self.fetch_history()
+            Format.cli(style=self.output, data=data, source="history")
+            return True
+
+        def create(self, name):
+            console = Console()
+            url = "https://{}{}".format(
+                self.api.settings["dnac"]["hostname"], "/api/system/v1/maglev/backup"
+            )
+            payload = {"description": name}
+            payload = json.dumps(payload)
+
+            data = self.api._request(type="post", url=url, payload=payload)
+
+            """ Backup id of the new backup (create --wait) """
+            self.created = None
+            if type(data["response"]) == str:
+                message = data["response"]
+                self.created = message
+                console.log(f"Creating backup with id: {message}")
+            else:
+                message = data["response"]["error"]
+                console.log(f"Error: {message}")
+
+            return True
+
+        def wait(self, backup_id, **kwargs):
+            """
+            Block until {backup_id} finished (create --wait), returns the
+            exit code (Wait)
+            """
+            return Wait(self, backup_id, **kwargs).run()
+
+        def progress(self):
+            """
+            Cisco DNA Center Backups in Progress
+            """
+            data = self.api.get_progress(fields=Format.HISTORY_COLUMNS)
+            Format.cli(style=self.output, data=data, source="progress")
+            return True
+
+        def watch(self, source="progress", **kwargs):
+            """
+            Live progress/history (--watch) on this session, returns the
+            exit code (Watch)
+            """
+            return Watch(self, source=source, output=self.output, **kwargs).run()
+
+        def delete(self, backup_id, concurrency=1, missing_ok=False, journal=None):
+            console = Console()
+            """
+            Task to delete backups, either from str or list
+            Up to {concurrency} deletes run in parallel
+            {missing_ok} counts a backup not found as deleted (resumed purge)
+            {journal} records every result (Journal)
+            """
+            if isinstance(backup_id, str):
+                backup_ids = [backup_id]
+            elif isinstance(backup_id, (list, tuple)):
+                backup_ids = list(backup_id)
+            else:
+                raise TypeError(f"Incorrect type for backup_id - {type(backup_id)}")
+
+            for id in backup_ids:
+                if len(id) != 36:
+                    raise ValueError(f"Invalid Backup ID - {id}")
+
+            def task(id):
+                url = "https://{}{}{}".format(
+                    self.api.settings["dnac"]["hostname"],
+                    "/api/system/v1/maglev/backup/",
+                    id,
+                )
+                try:
+                    data = self.api._request(type="delete", url=url)
+                except Exception as error_msg:
+                    if missing_ok and str(error_msg).startswith("Error: Not found"):
+                        return True, f"Backup {id} already deleted"
+                    raise
+
+                if "status" in data["response"]:
+                    if data["response"]["status"] == "ok":
+                        return True, data["response"]["message"]
+                return False, "{}".format(data["response"])
+
+            def progress(done, total, id, result):
+                if journal is not None:
+                    journal.deleted(id, result)
+                prefix = f"[{done}/{total}] " if total > 1 else ""
+                if result["ok"]:
+                    console.log(f"{prefix}{result['message']}")
+                else:
+                    console.log(f"{prefix}Error: {id} - {result['message']}", style="red")
+
+            if int(concurrency) > self.api.pool_size:
+                logging.warning(
+                    "Concurrency ({}) is larger than the connection pool".format(
+                        concurrency
+                    )
+                )
+            pipeline = Pipeline(task, concurrency=concurrency, progress=progress)
+            results = pipeline.run(backup_ids)
+            """ {self.results} of every delete of the purge (resumed, planned) """
+            self.results.update(results)
+            deleted = sum(1 for v in results.values() if v["ok"])
+            Metrics.inc("dnac_backups_deleted_total", deleted)
+            Metrics.inc("dnac_backup_delete_failures_total", len(backup_ids) - deleted)
+            if self.catalog is not None:
+                self.catalog.remove(
+                    "backup", [k for k, v in results.items() if v["ok"]]
+                )
+
+            errors = pipeline.errors
+            if len(errors) != 0:
+                console.log(
+                    f"Error: {len(errors)} of {len(results)} backups not deleted",
+                    style="red",
+                )
+                return False
+            return True
+
+        def schedule_backup(self, **kwargs):
+            name = kwargs["name"]
+            url = "https://{}{}".format(
+                self.api.settings["dnac"]["hostname"],
+                "/api/system/v1/maglev/schedule/backup",
+            )
+            url_post = url + f"/{name}"
+            existing_data = self.api._request(type="get", url=url)
+
+            if not existing_data["response"]:
+
+                if kwargs["action"] == "create":
+                    payload = Api.schedule_payload(
+                        name=kwargs["name"], day=kwargs["day"], time=kwargs["time"]
+                    )
+
+                    data = self.api._request(type="post", url=url_post, payload=payload)
+                    message = "There is now a scheduled backup"
+                    data = [message, name, None]
+                else:
+                    message = "There is no scheduled backup available to delete"
+                    data = [message]
+
+            else:
+                if kwargs["action"] == "create":
+                    message = "There already exists a scheduled backup"
+                    name = existing_data["response"][0]["name"]
+                    ts = int(existing_data["response"][0]["upcoming_run"])
+                    upcoming_time = datetime.utcfromtimestamp(ts).strftime(
+                        "%Y-%m-%d %H:%M"
+                    )
+                    data = [message, name, upcoming_time]
+                else:
+                    if existing_data["response"][0]["name"] == name:
+                        data = self.api._request(type="delete", url=url_post)
+                        message = f"Backup with the name '{name}' has been deleted"
+                        data = [message]
+                    else:
+                        message = f"No backup with the name '{name}' exists."
+                        data = [message]
+
+            return data
+
+        def backups_to_delete(self, **kwargs):
+            """
+            Purge (delete) Cisco DNA Center Backups
+            """
+
+            """
+            The catalog may answer a preview, never a forced purge
+            """
+            data = self.fetch_backups(reverse=True, cached=kwargs["force"] is not True)
+
+            """
+            {self.kept} lists the backups kept and why (policies)
+            {self.purge_plan} the snapshot the candidates come from (Plan)
+            """
+            policy = dict(
+                keep=kwargs["keep"],
+                incompatible=kwargs["incompatible"],
+                daily=kwargs.get("daily", 0),
+                weekly=kwargs.get("weekly", 0),
+                monthly=kwargs.get("monthly", 0),
+                min_keep=kwargs.get("min_keep", 0),
+                max_total_size=kwargs.get("max_total_size"),
+                free_at_least=kwargs.get("free_at_least"),
+            )
+            retention = Retention(**policy)
+            backups = data["response"]
+            with Timings.phase("retention", f"{len(backups)} backups"):
+                kept, data["response"] = retention.apply(backups)
+            if retention.capacity:
+                self.capacity(retention, len(data["response"]))
+            self.sizes.update({b.backup_id: b.get("backup_size") or 0 for b in backups})
+            self.purge_plan = Plan.snapshot(
+                self.api.settings["dnac"]["hostname"],
+                backups,
+                data["response"],
+                policy=policy,
+            )
+            self.kept = {
+                "response": [
+                    OrderedDict(
+                        [
+                            ("backup_id", b.backup_id),
+                            ("description", b.description),
+                            ("end_timestamp", b.end_timestamp),
+                            ("keep", ", ".join(kept[b.backup_id])),
+                        ]
+                    )
+                    for b in backups
+                    if b.backup_id in kept
+                ]
+            }
+            return data
+
+        @staticmethod
+        def capacity(retention, count):
+            """ Capacity policy report (backups_to_delete) """
+            console = Console()
+            console.log(
+                "Capacity: {} used, {} to reclaim, deleting {} backups ({})".format(
+                    size(retention.total),
+                    size(max(retention.needed, 0)),
+                    count,
+                    size(retention.reclaimed),
+                )
+            )
+            if retention.reclaimed < retention.needed:
+                console.log(
+                    "Warning: Budget not met, {} short (other policies keep "
+                    "the remaining backups)".format(
+                        size(retention.needed - retention.reclaimed)
+                    ),
+                    style="red",
+                )
+            return
+
+        def purge(self, *args, **kwargs):
+            """
+            Purge (delete) Cisco DNA Center Backups, see _purge()
+            """
+            return self._measured(self._purge, *args, **kwargs)
+
+        def apply(self, path, force=False, concurrency=1):
+            """
+            Purge the backups of a saved plan (purge --plan), see _apply()
+            """
+            return self._measured(
+                self._apply, path, force=force, concurrency=concurrency
+            )
+
+        def _measured(self, purge, *args, **kwargs):
+            """
+            Duration, bytes reclaimed and failures are recorded (Metrics)
+            """
+            start = time.perf_counter()
+            self.results = {}
+            try:
+                result = purge(*args, **kwargs)
+            except Exception:
+                Metrics.inc("dnac_purge_failures_total")
+                raise
+            Metrics.observe("dnac_purge_duration_seconds", time.perf_counter() - start)
+            deleted = [k for k, v in self.results.items() if v["ok"]]
+            reclaimed = sum(self.sizes.get(k, 0) for k in deleted)
+            Metrics.inc("dnac_bytes_reclaimed_total", reclaimed)
+            Metrics.inc("dnac_backups", -len(deleted))
+            Metrics.inc("dnac_backups_bytes", -reclaimed)
+            if len(deleted) != len(self.results):
+                Metrics.inc("dnac_purge_failures_total")
+            else:
+                Metrics.set("dnac_purge_last_success_timestamp_seconds", time.time())
+            return result
+
+        def _purge(
+            self,
+            keep,
+            incompatible,
+            force,
+            concurrency=1,
+            explain=False,
+            plan=None,
+            **policy,
+        ):
+            """
+            {policy} daily/weekly/monthly/min_keep (Retention)
+            {plan} saves the purge plan to this file instead of purging
+            """
+            console = Console()
+            if plan is None:
+                """ Failed resumed deletes are reported with the new plan """
+                self._resume(force, concurrency)
+            data = self.backups_to_delete(
+                incompatible=incompatible,
+                keep=keep,
+                force=force or plan is not None,
+                **policy,
+            )  # backups_to_delete
+            if explain:
+                console.log("Kept backups (retention policy)")
+                Format.cli(style="standard", data=self.kept, source="list")
+
+            if len(data["response"]) == 0:
+                console.log("No backup to delete")
+                return self._resumed(force)
+
+            """
+            Display candidates to be deleted
+            """
+            Format.cli(style="standard", data=data, source="list")
+            if plan is not None:
+                self.purge_plan.save(plan)
+                console.log(
+                    f"Purge plan ({len(data['response'])} backups) saved to {plan}"
+                )
+                return True
+            """
+            Forced, the snapshot was just listed: nothing to validate
+            """
+            return self._execute(
+                self.purge_plan, force, concurrency, validate=force is not True
+            )
+
+        def _apply(self, path, force=False, concurrency=1):
+            """
+            Purge plan saved by purge --plan {path}
+            """
+            console = Console()
+            self._resume(force, concurrency)
+            plan = Plan.load(path)
+            if plan[0] is False:
+                raise Exception(f"Error: {plan[1]}")
+            self.purge_plan = plan[1]
+            if len(self.purge_plan.delete) == 0:
+                console.log("No backup to delete")
+                return self._resumed(force)
+            console.log(
+                "Purge plan of {} ({})".format(
+                    self.purge_plan.hostname,
+                    datetime.fromtimestamp(self.purge_plan.created).strftime(
+                        "%Y-%m-%d %H:%M:%S"
+                    ),
+                )
+            )
+            data = {"response": self.purge_plan.delete}
+            Format.cli(style="standard", data=data, source="list")
+            return self._execute(self.purge_plan, force, concurrency, validate=True)
+
+        def _execute(self, plan, force, concurrency, validate=True):
+            """
+            Delete the backups of {plan} (confirmed unless {force})
+            {validate} lists only {PLAN_FIELDS} first, the backups must
+            not have changed since the snapshot
+            """
+            console = Console()
+            if force is not True:
+                """
+                Confirm action to delete
+                """
+                confirm = click.prompt(
+                    click.style(
+                        "Warning: Confirm if you want to delete these backups (y/n)",
+                        fg="red",
+                    ),
+                    type=bool,
+                )
+                if not confirm:
+                    console.log("Warning: Purge aborted", style="red")
+                    return True
+                console.log(
+                    f"Deleting... ({concurrency} parallel API calls)",
+                    style="red",
+                )
+
+            if validate:
+                current = self.api.get(fields=PLAN_FIELDS)["response"]
+                check = plan.check(self.api.settings["dnac"]["hostname"], current)
+                if check[0] is False:
+                    raise Exception(f"Error: {check[1]}")
+
+            for b in plan.delete:
+                self.sizes.setdefault(b["backup_id"], b.get("backup_size") or 0)
+            result = self._journaled(
+                plan.ids,
+                concurrency,
+                fingerprint=plan.fingerprint,
+                user=self.api.settings["dnac"]["username"],
+                policy=plan.policy,
+            )
+            if result is False or self._failed():
+                return self._incomplete(force)
+            reclaimed = sum(self.sizes.get(i, 0) for i in plan.ids)
+            console.log(
+                "Success: Backups ({}) deleted, {} reclaimed".format(
+                    len(plan.ids), size(reclaimed)
+                ),
+                style="green",
+            )
+            return True
+
+        def _resume(self, force, concurrency):
+            """
+            Finish the interrupted purges of the cluster (Journal) before
+            planning a new one, None when there is nothing to resume
+            False when deletes failed (the run stays open, retried until
+            the journal gives them up)
+            """
+            if self.journal is None:
+                return None
+            pending = self.journal.pending()
+            if pending is None:
+                return None
+            runs, sizes = pending
+            console = Console()
+            for backup_id, failures in self.journal.given_up.items():
+                console.log(
+                    f"Warning: {backup_id} not resumed ({failures} failed deletes)",
+                    style="red",
+                )
+            if len(sizes) == 0:
+                self.journal.done({}, runs=runs)
+                return None
+            console.log(
+                "Interrupted purge ({}): {} backups left to delete".format(
+                    ", ".join(runs), len(sizes)
+                )
+            )
+            if force is not True:
+                confirm = click.prompt(
+                    click.style(
+                        "Warning: Confirm if you want to resume this purge (y/n)",
+                        fg="red",
+                    ),
+                    type=bool,
+                )
+                if not confirm:
+                    self.journal.done({}, runs=runs, abandoned=True)
+                    console.log("Warning: Interrupted purge abandoned", style="red")
+                    return None
+            self.sizes.update(sizes)
+            result = self._journaled(list(sizes), concurrency, runs=runs)
+            if result is False:
+                console.log("Error: Interrupted purge incomplete", style="red")
+                return False
+            console.log(f"Success: Backups ({len(sizes)}) deleted", style="green")
+            return True
+
+        def _failed(self):
+            return any(not v["ok"] for v in self.results.values())
+
+        def _resumed(self, force):
+            """
+            Nothing planned: True when an interrupted purge was finished,
+            False when there was nothing to do at all
+            """
+            if self._failed():
+                return self._incomplete(force)
+            return len(self.results) != 0
+
+        def _incomplete(self, force):
+            """
+            Some deletes failed: forced purges (daemon) raise, so the job
+            is retried early (not before the circuit lets a trial through)
+            """
+            Console().log("Error: Purge incomplete", style="red")
+            if force is not True:
+                return True
+            errors = [v["error"] for v in self.results.values() if not v["ok"]]
+            message = "Error: Purge incomplete ({} of {} backups not deleted)".format(
+                len(errors), len(self.results)
+            )
+            circuit = [e for e in errors if isinstance(e, CircuitOpen)]
+            if len(circuit) != 0:
+                raise CircuitOpen(
+                    f"{message} - {circuit[0]}",
+                    max(e.retry_after for e in circuit),
+                )
+            raise Exception(message)
+
+        def _journaled(self, ids, concurrency, runs=None, **plan):
+            """
+            delete() recorded in the journal, as a new run or resuming the
+            interrupted {runs} (their backups may be deleted already)
+            An exception or failed deletes leave the run open, the next
+            purge resumes what wasn't deleted
+            """
+            if self.journal is None:
+                return self.delete(ids, concurrency=concurrency)
+            if runs is None:
+                self.journal.plan(ids, sizes=self.sizes, **plan)
+            else:
+                self.journal.resume(runs)
+            try:
+                result = self.delete(
+                    ids,
+                    concurrency=concurrency,
+                    missing_ok=runs is not None,
+                    journal=self.journal,
+                )
+            except BaseException:
+                self.journal.close()
+                raise
+            if result is False:
+                self.journal.close()
+                self.journal.run = None
+                return result
+            self.journal.done({i: self.results[i] for i in ids}, runs=runs)
+            return result
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+from ciscodnacbackupctl import config
+
+""" Default staleness (seconds) accepted by --cached reads """
+DNAC_CATALOG_MAX_AGE = 300
+
+""" kind: (key column, columns compared to detect a changed row) """
+KINDS = {
+    "backup": ("backup_id", ("end_timestamp", "status", "compatible", "backup_size")),
+    "history": (
+        "id",
+        ("end_timestamp", "status", "progress_in_percentage", "backup_size"),
+    ),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    cluster TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    stamp TEXT NOT NULL,
+    end_timestamp REAL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (cluster, kind, id)
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    cluster TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    synced REAL NOT NULL,
+    PRIMARY KEY (cluster, kind)
+);
+"""
+
+
+class Catalog:
+    """
+    Local SQLite catalog of Cisco DNA Center backups/history
+    (~/.ciscodnac/catalog.db), rows are keyed by cluster and id
+
+    sync() only writes the rows whose id or timestamps/status/size changed
+    since the last sync, read() answers from the catalog as long as the
+    last sync is younger than {max_age}
+    """
+
+    def __init__(self, cluster, path=None):
+        self.cluster = cluster
+        self.path = path or config.DNAC_FULL_CATALOG_PATH
+        self._db = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def enabled(settings):
+        return settings["dnac"].get("catalog", True) is not False
+
+    @property
+    def db(self):
+        """
+        Opened on first use, WAL so fleet workers can read while one writes
+        The connection is used from other threads (fleet plans and deletes
+        in different workers), serialized by {self._lock}
+        """
+        if self._db is None:
+            folder = os.path.dirname(self.path)
+            if folder and os.path.exists(folder) is False:
+                os.makedirs(folder, mode=0o700)
+            import sqlite3
+
+            self._db = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        return
+
+    def age(self, kind):
+        """
+        Seconds since the last sync of {kind}, None if never synced
+        """
+        with self._lock:
+            row = self.db.execute(
+                "SELECT synced FROM syncs WHERE cluster = ? AND kind = ?",
+                (self.cluster, kind),
+            ).fetchone()
+        if row is None:
+            return None
+        return max(0.0, time.time() - row[0])
+
+    def read(self, kind, max_age=DNAC_CATALOG_MAX_AGE):
+        """
+        (True, {"response": [rows]}) oldest first, (False, msg) if stale
+        """
+        age = self.age(kind)
+        if age is None:
+            return False, f"No {kind} catalog for {self.cluster}"
+        if max_age is not None and age > max_age:
+            return False, f"Catalog {kind} is stale ({int(age)}s)"
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT data FROM rows WHERE cluster = ? AND kind = ? "
+                "ORDER BY end_timestamp",
+                (self.cluster, kind),
+            ).fetchall()
+        return True, {"response": [json.loads(data) for (data,) in rows]}
+
+    def sync(self, kind, rows):
+        """
+        Incremental sync of a full listing: diff ids and stamps against
+        the catalog, write new/changed rows and drop the ones gone
+        Returns (changed, removed)
+        """
+        key, stamps = KINDS[kind]
+        with self._lock, self.db as db:
+            held = dict(
+                db.execute(
+                    "SELECT id, stamp FROM rows WHERE cluster = ? AND kind = ?",
+                    (self.cluster, kind),
+                )
+            )
+            changed = []
+            for row in rows:
+                id = row[key]
+                stamp = json.dumps([row.get(k) for k in stamps])
+                if held.pop(id, None) != stamp:
+                    changed.append(
+                        (
+                            self.cluster,
+                            kind,
+                            id,
+                            stamp,
+                            row.get("end_timestamp"),
+                            json.dumps(dict(row)),
+                        )
+                    )
+            db.executemany(
+                "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?)", changed
+            )
+            db.executemany(
+                "DELETE FROM rows WHERE cluster = ? AND kind = ? AND id = ?",
+                [(self.cluster, kind, id) for id in held],
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)",
+                (self.cluster, kind, time.time()),
+            )
+        return len(changed), len(held)
+
+    def remove(self, kind, ids):
+        """ Drop rows deleted through this client (purge/delete) """
+        with self._lock, self.db as db:
+            db.executemany(
+                "DELETE FROM rows WHERE cluster = ? AND kind = ? AND id = ?",
+                [(self.cluster, kind, id) for id in ids],
+            )
+        return
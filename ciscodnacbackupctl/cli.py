@@ -1,79 +1,361 @@
 import time
 import click
 import ciscodnacbackupctl
-import rich
-from rich.console import Console
-import daemonocle
-import schedule
-from ciscodnacbackupctl import Format
-from ciscodnacbackupctl import Config
+from ciscodnacbackupctl.config import Config
+from ciscodnacbackupctl.catalog import DNAC_CATALOG_MAX_AGE
+from ciscodnacbackupctl.format import OUTPUTS
+from ciscodnacbackupctl.retention import parse_size
+
+"""
+Heavy modules (requests, rich, tabulate, daemonocle, schedule) are
+imported by the commands using them, --version/config --env stay light
+"""
+
+""" daemonocle.Daemon.list_actions() """
+DAEMON_ACTIONS = ["start", "stop", "restart", "status"]
+
+""" Job name of a scheduled backup (strftime) """
+DNAC_BACKUP_NAME = "ciscodnacbackupctl-%Y%m%d-%H%M"
+
+
+def size_option(ctx, param, value):
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def retention_options(f):
+    """ GFS and capacity retention options (purge, schedule_purge, daemon) """
+    options = [
+        click.option(
+            "--daily", type=int, default=0, help="Keep newest backup of X days"
+        ),
+        click.option(
+            "--weekly", type=int, default=0, help="Keep newest backup of Y weeks"
+        ),
+        click.option(
+            "--monthly", type=int, default=0, help="Keep newest backup of Z months"
+        ),
+        click.option(
+            "--min-keep",
+            type=int,
+            default=0,
+            help="Always keep at least N backups (floor)",
+        ),
+        click.option(
+            "--max-total-size",
+            default=None,
+            metavar="SIZE",
+            callback=size_option,
+            help="Delete the oldest backups until they use at most SIZE (500GB)",
+        ),
+        click.option(
+            "--free-at-least",
+            default=None,
+            metavar="SIZE",
+            callback=size_option,
+            help="Delete the oldest backups until SIZE is reclaimed (200GB)",
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def catalog_options(f):
+    """ Local catalog options (list, history, purge, fleet) """
+    f = click.option(
+        "--max-age",
+        type=int,
+        default=DNAC_CATALOG_MAX_AGE,
+        help=f"Max catalog age in seconds with --cached (default {DNAC_CATALOG_MAX_AGE})",
+    )(f)
+    f = click.option(
+        "--cached", is_flag=True, help="Answer from the local catalog when fresh"
+    )(f)
+    return f
+
+
+def watch_options(f):
+    """ --watch (progress, history) """
+    options = [
+        click.option(
+            "--watch", is_flag=True, help="Live view until the tracked backup ends"
+        ),
+        click.option(
+            "--backup-id",
+            default=None,
+            help="Backup to track (default the backups running when first seen)",
+        ),
+        click.option(
+            "--interval",
+            type=float,
+            default=2,
+            help="Poll interval while a backup runs (default 2s)",
+        ),
+        click.option(
+            "--max-interval",
+            type=float,
+            default=60,
+            help="Poll interval backs off up to this when idle (default 60s)",
+        ),
+        click.option(
+            "--timeout", type=float, default=None, help="Give up after N seconds"
+        ),
+    ]
+    for option in reversed(options):
+        f = option(f)
+    return f
+
+
+def run_watch(ctx, cli, source, output, **kwargs):
+    """ Exit codes: 0 SUCCESS, 1 FAILURE, 2 timeout """
+    if output not in ("table", "ndjson"):
+        raise click.BadParameter(
+            "--watch supports table and ndjson", param_hint="--output"
+        )
+    ctx.exit(cli.watch(source=source, **kwargs))
 
-# Need to pass the KEEP variable to daemon worker
-KEEP = 3
 
+def output_options(f):
+    """ Output format (whoami, list, history, progress, fleet) """
+    return click.option(
+        "--output",
+        "-o",
+        type=click.Choice(OUTPUTS, case_sensitive=False),
+        default="table",
+        envvar="DNAC_OUTPUT",
+        help="table (default), json, ndjson or csv (streamed, raw values)",
+    )(f)
 
-def app_daemon(
-    interval="daily", incompatible=False, keep=KEEP, day="monday", hour="23:00"
-):
-    global KEEP
-    ctl = ciscodnacbackupctl.Api()
-    interval = interval.lower()
-    _day = day.lower()
-    _time = hour.lower()
+
+def daemon_job(job, cli, **options):
+    """ One scheduled job: backup (create), purge or refresh (catalog) """
+    if job == "backup":
+        return cli.create(time.strftime(options.get("name") or DNAC_BACKUP_NAME))
+    if job == "purge":
+        return cli.purge(force=True, **options)
+    if job == "refresh":
+        return cli.refresh()
+    raise Exception(f"Unknown job {job}")
+
+
+def scheduler(jobs, profile=None, debug=False, jitter=0, status=None):
     """
-    job() function makes sure to purge the backups when called upon
+    Scheduler of [(name, cron, options)] jobs, sharing one long-lived
+    client (config, auth, connections) between the runs
     """
+    from functools import partial
+    from ciscodnacbackupctl.client import Client
+    from ciscodnacbackupctl.scheduler import Scheduler
+
+    client = Client(profile=profile, debug=debug, status=status)
+    scheduler = Scheduler()
+    for name, cron, options in jobs:
+        scheduler.add(
+            name,
+            cron,
+            partial(
+                client.run,
+                name,
+                partial(daemon_job, name, **options),
+                cached=name == "refresh",
+            ),
+            jitter=jitter,
+        )
+    return scheduler
 
-    def job():
-        console = Console()
-        ctl = ciscodnacbackupctl.Api()
-        cli = ctl.CLI()
-        force = True
-        try:
-            purge = cli.purge(keep=KEEP, incompatible=incompatible, force=force)
-        except Exception as error_msg:
-            console.log(
-                "Cisco DNA Center isn't available - {}".format(error_msg), style="green"
-            )
-            pass
-
-    schedule_function = ctl.schedule_interval(
-        interval=interval, day=_day, time=_time
-    ).do(job)
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+
+def app_daemon(jobs, profile=None, jitter=0, metrics=None):
+    """
+    Daemon worker (daemonocle), sleeps until the next job is due
+    SIGTERM stops after the running job, SIGUSR1 runs every job now
+    """
+    if metrics is not None:
+        """ /metrics is served from the daemon process (after detach) """
+        from ciscodnacbackupctl.metrics import Metrics
+
+        Metrics.serve(metrics["port"], address=metrics["address"])
+    from ciscodnacbackupctl.client import DNAC_DAEMON_STATUS
+
+    daemon_scheduler = scheduler(
+        jobs, profile=profile, jitter=jitter, status=DNAC_DAEMON_STATUS
+    )
+    daemon_scheduler.signals()
+    daemon_scheduler.run()
     return
 
+
 @click.group()
 @click.option('--debug/--no-debug', default=False)
-@click.version_option()
+@click.option(
+    "--profile", envvar="DNAC_PROFILE", help="Named Cisco DNA Center cluster (config)"
+)
+@click.option(
+    "--timings", is_flag=True, help="Print a per-phase timing breakdown (stderr)"
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Write a cProfile profile of the command (pstats/snakeviz)",
+)
+@click.option(
+    "--trace",
+    type=click.Path(dir_okay=False, writable=True),
+    envvar="DNAC_TRACE",
+    default=None,
+    help="Write every HTTP exchange as NDJSON (redacted, capped bodies)",
+)
+@click.version_option(version=ciscodnacbackupctl.version)
 @click.pass_context
-def cli(ctx, debug):
+def cli(ctx, debug, profile, timings, profile_output, trace):
     ctx.obj["DEBUG"] = debug
+    ctx.obj["PROFILE"] = profile
     if debug:
         print("Debug mode: {}".format(debug))
+    if trace:
+        from ciscodnacbackupctl.trace import Trace
+
+        Trace.enable(trace)
+        ctx.call_on_close(Trace.disable)
+    if timings:
+        from ciscodnacbackupctl.timings import Timings
+
+        Timings.enable()
+        ctx.call_on_close(Timings.report)
+    if profile_output:
+        import cProfile
+
+        profiler = cProfile.Profile()
+
+        def dump():
+            profiler.disable()
+            profiler.dump_stats(profile_output)
+            click.echo(f"Profile written to {profile_output}", err=True)
+
+        ctx.call_on_close(dump)
+        profiler.enable()
     pass
 
-@cli.command("daemon", help="{}".format(daemonocle.Daemon.list_actions()))
+@cli.command("daemon", help="{}".format(DAEMON_ACTIONS))
 @click.option("--detach/--debug", default=True, help="Attach and debug")
 @click.option(
     "--keep", type=str, default=3, help="Amount of backups to keep (default 3)"
 )
+@click.option(
+    "--concurrency", type=int, default=1, help="Parallel delete API calls (default 1)"
+)
+@retention_options
+@click.option(
+    "--purge-cron",
+    default="0 23 * * *",
+    help="Purge schedule, cron expression (default daily 23:00)",
+)
+@click.option(
+    "--backup-cron", default=None, help="Create a backup on this cron schedule"
+)
+@click.option(
+    "--backup-name",
+    default=DNAC_BACKUP_NAME,
+    help=f"Scheduled backup name, strftime (default {DNAC_BACKUP_NAME})",
+)
+@click.option(
+    "--refresh-cron",
+    default=None,
+    help="Refresh the local catalog on this cron schedule",
+)
+@click.option(
+    "--jitter",
+    type=int,
+    default=0,
+    help="Delay every job run by a random 0-N seconds (spread fleets)",
+)
+@click.option(
+    "--metrics-port",
+    type=int,
+    default=None,
+    envvar="DNAC_METRICS_PORT",
+    help="Serve Prometheus metrics on http://<address>:<port>/metrics",
+)
+@click.option(
+    "--metrics-address",
+    default="127.0.0.1",
+    help="Metrics listen address (default 127.0.0.1)",
+)
 @click.argument("command", nargs=1)
 @click.pass_context
-def daemon(ctx, detach, keep, command):
-    global KEEP
-    KEEP = keep
+def daemon(
+    ctx,
+    detach,
+    keep,
+    concurrency,
+    daily,
+    weekly,
+    monthly,
+    min_keep,
+    max_total_size,
+    free_at_least,
+    purge_cron,
+    backup_cron,
+    backup_name,
+    refresh_cron,
+    jitter,
+    metrics_port,
+    metrics_address,
+    command,
+):
+    from functools import partial
+    from ciscodnacbackupctl.scheduler import Cron
+
+    purge = dict(
+        keep=keep,
+        incompatible=False,
+        concurrency=concurrency,
+        daily=daily,
+        weekly=weekly,
+        monthly=monthly,
+        min_keep=min_keep,
+        max_total_size=max_total_size,
+        free_at_least=free_at_least,
+    )
+    jobs = [("purge", Cron(purge_cron), purge)]
+    if backup_cron:
+        jobs.insert(0, ("backup", Cron(backup_cron), dict(name=backup_name)))
+    if refresh_cron:
+        jobs.append(("refresh", Cron(refresh_cron), {}))
+    metrics = None
+    if metrics_port is not None:
+        metrics = {"port": metrics_port, "address": metrics_address}
+    import daemonocle
+    from ciscodnacbackupctl.format import Format
+
     daemon = daemonocle.Daemon(
-        worker=app_daemon,
+        worker=partial(
+            app_daemon,
+            jobs,
+            profile=ctx.obj["PROFILE"],
+            jitter=jitter,
+            metrics=metrics,
+        ),
         pid_file="/tmp/ciscodnacbackupctl.pid",
         detach=detach,
     )
-    if command.lower() in daemonocle.Daemon.list_actions():
+    if command.lower() in DAEMON_ACTIONS:
         if command.lower() == "status":
+            from ciscodnacbackupctl.client import Client
+
             data = daemon.get_status()
             output = Format.cli(style="standard", data=data, source="dict")
+            status = Client.read()
+            if status[0] is True and status[1].get("pid") == data.get("pid"):
+                """ Setup (client, token) vs work time of the job runs """
+                Format.cli(
+                    style="standard",
+                    data={"response": status[1]["jobs"]},
+                    source="list",
+                )
             return
         daemon.do_action(command)
         return
@@ -83,9 +365,12 @@ def daemon(ctx, detach, keep, command):
 
 @cli.command("whoami")
 @click.option("--cfg", is_flag=True, help="Read local cfg")
+@output_options
 @click.pass_context
-def whoami(ctx, cfg):
-    cli = ciscodnacbackupctl.Api.CLI(debug=ctx.obj["DEBUG"])
+def whoami(ctx, cfg, output):
+    cli = ciscodnacbackupctl.Api.CLI(
+        debug=ctx.obj["DEBUG"], profile=ctx.obj["PROFILE"], output=output.lower()
+    )
     cli.whoami(cfg=cfg)
     return
 
@@ -106,7 +391,8 @@ def whoami(ctx, cfg):
 )
 @click.pass_context
 def config(ctx, env, hostname, username, password, secure, overwrite, encode):
-    ctl = ciscodnacbackupctl.Api(config=True)
+    from rich.console import Console
+
     console = Console()
     if env:
         if encode:
@@ -142,6 +428,7 @@ def config(ctx, env, hostname, username, password, secure, overwrite, encode):
             password=password,
             secure=secure,
             operation="write",
+            profile=ctx.obj["PROFILE"],
         )
 
         if "Config already exist" in str(config[1]) and config[0] is False:
@@ -165,6 +452,7 @@ def config(ctx, env, hostname, username, password, secure, overwrite, encode):
                     password=password,
                     secure=secure,
                     operation="overwrite",
+                    profile=ctx.obj["PROFILE"],
                 )
         console.print(
             "Success: Config created ({})".format(
@@ -177,35 +465,87 @@ def config(ctx, env, hostname, username, password, secure, overwrite, encode):
 
 @cli.command("list")
 @click.option("--reverse/--no-reverse", default=False)
+@catalog_options
+@output_options
 @click.pass_context
-def list(ctx, reverse):
-    cli = ciscodnacbackupctl.Api.CLI(debug=ctx.obj["DEBUG"])
+def list(ctx, reverse, cached, max_age, output):
+    cli = ciscodnacbackupctl.Api.CLI(
+        debug=ctx.obj["DEBUG"],
+        profile=ctx.obj["PROFILE"],
+        cached=cached,
+        max_age=max_age,
+        output=output.lower(),
+    )
     cli.list(reverse)
     return
 
 
 @cli.command("progress")
+@output_options
+@watch_options
 @click.pass_context
-def progress(ctx):
-    cli = ciscodnacbackupctl.Api.CLI(debug=ctx.obj["DEBUG"])
+def progress(ctx, output, watch, **kwargs):
+    output = output.lower()
+    cli = ciscodnacbackupctl.Api.CLI(
+        debug=ctx.obj["DEBUG"], profile=ctx.obj["PROFILE"], output=output
+    )
+    if watch:
+        run_watch(ctx, cli, "progress", output, **kwargs)
     cli.progress()
     return
 
 
 @cli.command("history")
+@catalog_options
+@output_options
+@watch_options
 @click.pass_context
-def history(ctx):
-    cli = ciscodnacbackupctl.Api.CLI(debug=ctx.obj["DEBUG"])
+def history(ctx, cached, max_age, output, watch, **kwargs):
+    output = output.lower()
+    cli = ciscodnacbackupctl.Api.CLI(
+        debug=ctx.obj["DEBUG"],
+        profile=ctx.obj["PROFILE"],
+        cached=cached,
+        max_age=max_age,
+        output=output,
+    )
+    if watch:
+        run_watch(ctx, cli, "history", output, **kwargs)
     cli.history()
     return
 
 
 @cli.command("create")
 @click.option("--name", required=True, help="Name of backup")
+@click.option("--wait", is_flag=True, help="Wait until the backup completes")
+@click.option(
+    "--interval",
+    type=float,
+    default=2,
+    help="First poll interval with --wait, doubles up to --max-interval",
+)
+@click.option(
+    "--max-interval", type=float, default=60, help="Max poll interval (default 60s)"
+)
+@click.option("--timeout", type=float, default=None, help="Give up after N seconds")
 @click.pass_context
-def create(ctx, name):
-    cli = ciscodnacbackupctl.Api.CLI(debug=ctx.obj["DEBUG"])
+def create(ctx, name, wait, interval, max_interval, timeout):
+    """ Exit codes with --wait: 0 SUCCESS, 1 FAILURE, 2 timeout """
+    cli = ciscodnacbackupctl.Api.CLI(
+        debug=ctx.obj["DEBUG"], profile=ctx.obj["PROFILE"]
+    )
     cli.create(name)
+    if wait:
+        if cli.created is None:
+            ctx.exit(1)
+        ctx.exit(
+            cli.wait(
+                cli.created,
+                interval=interval,
+                max_interval=max_interval,
+                timeout=timeout,
+            )
+        )
     return
 
 
@@ -213,10 +553,16 @@ def create(ctx, name):
 @click.option("--backup_id", required=True, is_flag=True)
 @click.argument('id', nargs=-1)
 #@click.argument("--backup_id", required=True, nargs=-1)
+@click.option(
+    "--concurrency", type=int, default=1, help="Parallel delete API calls (default 1)"
+)
 @click.pass_context
-def delete(ctx, backup_id, id):
-    cli = ciscodnacbackupctl.Api.CLI(debug=ctx.obj["DEBUG"])
-    cli.delete(id)
+def delete(ctx, backup_id, id, concurrency):
+    cli = ciscodnacbackupctl.Api.CLI(
+        debug=ctx.obj["DEBUG"], profile=ctx.obj["PROFILE"]
+    )
+    if cli.delete(id, concurrency=concurrency) is False:
+        ctx.exit(1)
     return
 
 
@@ -253,7 +599,11 @@ def delete(ctx, backup_id, id):
 @click.pass_context
 def schedule_backup(ctx, action, name, day, hour):
     action = action.lower()
-    cli = ciscodnacbackupctl.Api().CLI(debug=ctx.obj["DEBUG"])
+    cli = ciscodnacbackupctl.Api.CLI(
+        debug=ctx.obj["DEBUG"], profile=ctx.obj["PROFILE"]
+    )
+    import rich
+
     console = rich.get_console()
     data = cli.schedule_backup(name=name, day=day, time=hour, action=action)
     print(data)
@@ -277,15 +627,82 @@ def schedule_backup(ctx, action, name, day, hour):
 )
 @click.option("--incompatible", is_flag=True, help="Remove incompatible backups")
 @click.option("--force", is_flag=True, help="No interactive prompt to confirm purge")
+@click.option(
+    "--concurrency", type=int, default=1, help="Parallel delete API calls (default 1)"
+)
+@retention_options
+@click.option("--explain", is_flag=True, help="Show kept backups and why")
+@click.option(
+    "--plan",
+    "plan",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Save the backups to delete to FILE, delete nothing",
+)
+@click.option(
+    "--apply",
+    "apply",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Delete the backups of a saved plan (unless they changed since)",
+)
+@catalog_options
 @click.pass_context
-def purge(ctx, keep, incompatible, force):
-    cli = ciscodnacbackupctl.Api().CLI(debug=ctx.obj["DEBUG"])
-    purge = cli.purge(keep=keep, incompatible=incompatible, force=force)
+def purge(
+    ctx,
+    keep,
+    incompatible,
+    force,
+    concurrency,
+    daily,
+    weekly,
+    monthly,
+    min_keep,
+    max_total_size,
+    free_at_least,
+    explain,
+    plan,
+    apply,
+    cached,
+    max_age,
+):
+    if plan is not None and apply is not None:
+        raise click.UsageError("--plan and --apply are mutually exclusive")
+    cli = ciscodnacbackupctl.Api.CLI(
+        debug=ctx.obj["DEBUG"],
+        profile=ctx.obj["PROFILE"],
+        cached=cached,
+        max_age=max_age,
+    )
+    if apply is not None:
+        cli.apply(apply, force=force, concurrency=concurrency)
+    else:
+        cli.purge(
+            keep=keep,
+            incompatible=incompatible,
+            force=force,
+            concurrency=concurrency,
+            explain=explain,
+            plan=plan,
+            daily=daily,
+            weekly=weekly,
+            monthly=monthly,
+            min_keep=min_keep,
+            max_total_size=max_total_size,
+            free_at_least=free_at_least,
+        )
+    """ Failed deletes (forced purges raise) """
+    if any(not v["ok"] for v in cli.results.values()):
+        ctx.exit(1)
+    return
 
 
 @cli.command("schedule_purge")
 @click.option(
-    "--interval", "-i", required=True, help=" " "daily" " or " "weekly" " ", type=str
+    "--interval",
+    "-i",
+    required=False,
+    default=None,
+    help=" " "daily" " or " "weekly" " (required without --cron)",
+    type=str,
 )
 @click.option("--incompatible", is_flag=True, help="Remove incompatible backups")
 @click.option(
@@ -312,54 +729,180 @@ def purge(ctx, keep, incompatible, force):
     type=str,
     help="Time to delete backups HH:MM, default is 23:00",
 )
+@click.option(
+    "--concurrency", type=int, default=1, help="Parallel delete API calls (default 1)"
+)
+@retention_options
+@click.option(
+    "--cron",
+    default=None,
+    help="Cron expression instead of --interval/--day/--hour",
+)
+@click.option(
+    "--jitter", type=int, default=0, help="Delay each run by a random 0-N seconds"
+)
 @click.pass_context
-def schedule_purge(ctx, interval, incompatible, keep, day, hour):
-    ctl = ciscodnacbackupctl.Api()
-    cli = ctl.CLI(debug=ctx.obj["DEBUG"])
-    console = rich.get_console()
-
-    interval = interval.lower()
-    _day = day.lower()
-    _time = hour.lower()
-
-    """
-    job() function makes sure to purge the backups when called upon
-    """
-
-    def job():
-        force = True
-        ctl = ciscodnacbackupctl.Api() 
-        cli = ctl.CLI(debug=ctx.obj["DEBUG"]) 
-        try:
-            purge = cli.purge(keep=keep, incompatible=incompatible, force=force)
-        except Exception as error_msg:
-            console.log(
-                "Cisco DNA Center isn't available - {}".format(error_msg), style="green"
-            )
-            pass
+def schedule_purge(
+    ctx,
+    interval,
+    incompatible,
+    keep,
+    day,
+    hour,
+    concurrency,
+    daily,
+    weekly,
+    monthly,
+    min_keep,
+    max_total_size,
+    free_at_least,
+    cron,
+    jitter,
+):
+    from ciscodnacbackupctl.scheduler import Cron
+
+    if cron is None and interval is None:
+        raise click.UsageError("Missing option '--interval' (or --cron)")
+    """ Fails early on a broken config or credentials """
+    ciscodnacbackupctl.Api(profile=ctx.obj["PROFILE"])
+    if cron is None:
+        schedule = Cron.interval(interval, day=day, time=hour)
+    else:
+        schedule = Cron(cron)
+    purge = dict(
+        keep=keep,
+        incompatible=incompatible,
+        concurrency=concurrency,
+        daily=daily,
+        weekly=weekly,
+        monthly=monthly,
+        min_keep=min_keep,
+        max_total_size=max_total_size,
+        free_at_least=free_at_least,
+    )
+    purge_scheduler = scheduler(
+        [("purge", schedule, purge)],
+        profile=ctx.obj["PROFILE"],
+        debug=ctx.obj["DEBUG"],
+        jitter=jitter,
+    )
 
     """
     Print out confirmation that the backup is scheduled
     """
-    # TODO move this part to class CLI
-    if interval.lower() == "daily":
-        click.echo(
-            click.style(f"\nYour backups will be deleted daily at {_time}", fg="green")
-        )
+    if cron is not None:
+        message = f"\nYour backups will be deleted at '{cron}'"
+    elif interval.lower() == "daily":
+        message = f"\nYour backups will be deleted daily at {hour}"
     else:
-        click.echo(
-            click.style(
-                f"\nYour backups will be deleted {_day}s at {_time}", fg="green"
-            )
-        )
+        message = f"\nYour backups will be deleted {day.lower()}s at {hour}"
+    click.echo(click.style(message, fg="green"))
+    purge_scheduler.signals()
+    purge_scheduler.run()
+
+
+@cli.group("fleet", help="Run commands on many Cisco DNA Center clusters")
+@click.option(
+    "--cluster",
+    "-c",
+    multiple=True,
+    help="Named cluster (config profile), default is all clusters",
+)
+@click.option(
+    "--parallel", type=int, default=None, help="Clusters in parallel (default all)"
+)
+@catalog_options
+@output_options
+@click.pass_context
+def fleet(ctx, cluster, parallel, cached, max_age, output):
+    from ciscodnacbackupctl.fleet import Fleet
+
+    ctx.obj["FLEET"] = Fleet(
+        clusters=cluster,
+        concurrency=parallel,
+        debug=ctx.obj["DEBUG"],
+        cached=cached,
+        max_age=max_age,
+        output=output.lower(),
+    )
+    return
+
+
+@fleet.command("clusters")
+@click.pass_context
+def fleet_clusters(ctx):
+    for name in ctx.obj["FLEET"].clusters:
+        click.echo(name)
+    return
+
+
+@fleet.command("list")
+@click.option("--reverse/--no-reverse", default=False)
+@click.pass_context
+def fleet_list(ctx, reverse):
+    if ctx.obj["FLEET"].list(reverse) is False:
+        ctx.exit(1)
+    return
+
+
+@fleet.command("history")
+@click.pass_context
+def fleet_history(ctx):
+    if ctx.obj["FLEET"].history() is False:
+        ctx.exit(1)
+    return
+
 
-    schedule_function = ctl.schedule_interval(
-        interval=interval, day=_day, time=_time
-    ).do(job)
+@fleet.command("progress")
+@click.pass_context
+def fleet_progress(ctx):
+    if ctx.obj["FLEET"].progress() is False:
+        ctx.exit(1)
+    return
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+
+@fleet.command("purge")
+@click.option(
+    "--keep", type=str, default=3, help="Amount of backups to keep (default 3)"
+)
+@click.option("--incompatible", is_flag=True, help="Remove incompatible backups")
+@click.option("--force", is_flag=True, help="No interactive prompt to confirm purge")
+@click.option(
+    "--concurrency",
+    type=int,
+    default=1,
+    help="Parallel delete API calls per cluster (default 1)",
+)
+@retention_options
+@click.pass_context
+def fleet_purge(
+    ctx,
+    keep,
+    incompatible,
+    force,
+    concurrency,
+    daily,
+    weekly,
+    monthly,
+    min_keep,
+    max_total_size,
+    free_at_least,
+):
+    purged = ctx.obj["FLEET"].purge(
+        keep=keep,
+        incompatible=incompatible,
+        force=force,
+        concurrency=concurrency,
+        daily=daily,
+        weekly=weekly,
+        monthly=monthly,
+        min_keep=min_keep,
+        max_total_size=max_total_size,
+        free_at_least=free_at_least,
+    )
+    if purged is False:
+        ctx.exit(1)
+    return
 
 
 if __name__ == "__main__":
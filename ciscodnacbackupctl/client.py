@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import time
+from ciscodnacbackupctl.api import Api
+from ciscodnacbackupctl.config import Config
+from ciscodnacbackupctl.metrics import Metrics
+from ciscodnacbackupctl.tokencache import DNAC_TOKEN_MARGIN
+
+""" Daemon status (jobs setup/work time), next to the pid file """
+DNAC_DAEMON_STATUS = "/tmp/ciscodnacbackupctl.status.json"
+""" Failed runs in a row before the connection pool is rebuilt """
+DNAC_CLIENT_MAX_FAILURES = 3
+""" Per job status (daemon status) """
+STATUS_COLUMNS = (
+    "job",
+    "runs",
+    "result",
+    "last_run_timestamp",
+    "setup_seconds",
+    "work_seconds",
+    "setup_total",
+    "work_total",
+    "error",
+)
+
+
+class Client:
+    """
+    Long-lived Api of the daemon, shared by every job run: config read
+    and authenticated once (again when the config changed), token
+    refreshed {margin} seconds before it expires, connection pool rebuilt
+    after {max_failures} failed runs in a row. Each run is split into
+    setup (client, token) and work time, written to the {status} file
+    (daemon status)
+    """
+
+    def __init__(
+        self,
+        profile=None,
+        debug=False,
+        status=DNAC_DAEMON_STATUS,
+        margin=DNAC_TOKEN_MARGIN,
+        max_failures=DNAC_CLIENT_MAX_FAILURES,
+    ):
+        self.profile = profile
+        self.debug = debug
+        self.status = status
+        self.margin = margin
+        self.max_failures = max_failures
+        self.api = None
+        self.failures = 0
+        self.rebuilds = 0
+        self.jobs = {}
+        self.started = time.time()
+        self.clock = time.perf_counter
+
+    def prepare(self):
+        """
+        Warm Api: created on first use or after a config change, pool
+        rebuilt, token refreshed
+        """
+        if self.api is not None:
+            """ Cached cfg, only a stat() of the file unless it changed """
+            Config(profile=self.profile)
+            if Config.generation != self.api.config_generation:
+                logging.info("Cisco DNA Center config changed, new client")
+                self.api = None
+        if self.api is None:
+            self.api = Api(profile=self.profile)
+            return self.api
+        if self.failures >= self.max_failures:
+            self.api.reset_session()
+            self.failures = 0
+            self.rebuilds += 1
+            Metrics.inc("dnac_client_rebuilds_total")
+        self.api.refresh_token(margin=self.margin)
+        return self.api
+
+    def run(self, name, func, cached=False):
+        """ func(cli) with a CLI on the shared Api, timed """
+        start = self.clock()
+        work = None
+        try:
+            cli = Api.CLI(debug=self.debug, api=self.prepare(), cached=cached)
+            work = self.clock()
+            result = func(cli)
+        except Exception as error_msg:
+            self.failures += 1
+            self.record(name, start, work, error=str(error_msg))
+            raise
+        self.failures = 0
+        self.record(name, start, work)
+        return result
+
+    def record(self, name, start, work, error=None):
+        end = self.clock()
+        setup = (work or end) - start
+        job = self.jobs.setdefault(name, dict.fromkeys(STATUS_COLUMNS))
+        job["job"] = name
+        job["runs"] = (job["runs"] or 0) + 1
+        job["result"] = "failure" if error is not None else "success"
+        job["last_run_timestamp"] = time.time()
+        job["setup_seconds"] = round(setup, 3)
+        job["work_seconds"] = round(end - (work or end), 3)
+        job["setup_total"] = round((job["setup_total"] or 0) + setup, 3)
+        job["work_total"] = round((job["work_total"] or 0) + end - (work or end), 3)
+        job["error"] = error
+        Metrics.observe("dnac_job_setup_seconds", setup, job=name)
+        self.write()
+        return
+
+    def write(self):
+        """ Status file, replaced atomically """
+        if self.status is None:
+            return False
+        data = {
+            "pid": os.getpid(),
+            "started": self.started,
+            "token_expires": getattr(self.api, "token_expires", 0),
+            "failures": self.failures,
+            "rebuilds": self.rebuilds,
+            "config": Config.describe(),
+            "jobs": list(self.jobs.values()),
+        }
+        tmp = "{}.{}.tmp".format(self.status, os.getpid())
+        try:
+            with open(tmp, "w") as f:
+                f.write(json.dumps(data, indent=4))
+            os.replace(tmp, self.status)
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def read(status=DNAC_DAEMON_STATUS):
+        try:
+            with open(status, "r") as f:
+                return True, json.loads(f.read())
+        except Exception as e:
+            return False, f"No daemon status ({e})"
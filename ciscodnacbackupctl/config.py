@@ -1,40 +1,206 @@
 from pathlib import Path
 import os
+import copy
 import json
+import logging
 import base64
+import binascii
+import threading
+import time
 
 DNAC_CONFIG = "config.json"
 DNAC_CONFIG_PATH = "/.ciscodnac/"
 DNAC_FULL_CONFIG_PATH = "{}{}{}".format(Path.home(), DNAC_CONFIG_PATH, DNAC_CONFIG)
+DNAC_TOKEN_CACHE = "token.json"
+DNAC_FULL_TOKEN_CACHE_PATH = "{}{}{}".format(
+    Path.home(), DNAC_CONFIG_PATH, DNAC_TOKEN_CACHE
+)
+DNAC_CATALOG = "catalog.db"
+DNAC_FULL_CATALOG_PATH = "{}{}{}".format(Path.home(), DNAC_CONFIG_PATH, DNAC_CATALOG)
+DNAC_JOURNAL = "purge.journal"
+DNAC_FULL_JOURNAL_PATH = "{}{}{}".format(Path.home(), DNAC_CONFIG_PATH, DNAC_JOURNAL)
+""" Environment variables read by the cfg (a change reloads it) """
+DNAC_ENV_PREFIX = "DNA_CENTER_"
+DNAC_ENV_ENCODED = "DNAC_CONFIG"
 
 
 class Config:
-    def __init__(self):
+    """
+    Parsed cfg (environment or file) is cached for the process and reused
+    until the relevant environment variables or the file (inode, mtime,
+    size) change, so long-running processes pick up edits without parsing
+    the file on every Api()
+    """
+
+    _cache = {}
+    _lock = threading.Lock()
+    """ Incremented whenever a reload changed the cfg """
+    generation = 0
+    stats = {"loads": 0, "hits": 0}
+
+    def __init__(self, profile=None):
+        self.profile = profile or os.environ.get("DNAC_PROFILE")
+        self.source = None
         self.config = self._check_settings()
         pass
 
+    @classmethod
+    def _cached(cls, source, key, load):
+        """
+        {load}() result of {source}, parsed again only when {key} changed
+        Callers get their own copy (Api stores the token in it)
+        """
+        with cls._lock:
+            entry = cls._cache.get(source)
+            if entry is not None and entry["key"] == key:
+                cls.stats["hits"] += 1
+                return copy.deepcopy(entry["result"])
+        result = load()
+        with cls._lock:
+            if entry is not None and entry["result"] != result:
+                cls.generation += 1
+            cls._cache[source] = {"key": key, "result": result, "loaded": time.time()}
+            cls.stats["loads"] += 1
+        logging.info(
+            "Cisco DNA Center config {} from {} ({})".format(
+                "loaded" if entry is None else "reloaded",
+                source,
+                "ok" if result[0] is True else result[1],
+            )
+        )
+        return copy.deepcopy(result)
+
+    @classmethod
+    def describe(cls):
+        """ What was loaded, from where and when (daemon status) """
+        with cls._lock:
+            return {
+                "generation": cls.generation,
+                "loads": cls.stats["loads"],
+                "hits": cls.stats["hits"],
+                "sources": {
+                    source: {"loaded": entry["loaded"], "ok": entry["result"][0]}
+                    for source, entry in cls._cache.items()
+                },
+            }
+
+    @staticmethod
+    def env_source():
+        if DNAC_ENV_ENCODED in os.environ:
+            return "environment (encoded)"
+        if f"{DNAC_ENV_PREFIX}BASE_URL" in os.environ:
+            return "environment"
+        return None
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._cache.clear()
+        return
+
     def _check_settings(self):
         """
+        Named profile (multi cluster cfg)
+        """
+        if self.profile:
+            clusters = self.clusters()
+            if clusters[0] is False:
+                return clusters
+            if self.profile not in clusters[1]:
+                return False, f"Unknown Cisco DNA Center profile ({self.profile})"
+            profiles = self._profiles()
+            self.source = "file"
+            if profiles[0] is True and self.profile in profiles[1]:
+                self.source = profiles[1][self.profile][0]
+            return True, clusters[1][self.profile]
+        """
         Check Environment cfg
         """
         env_cfg = self.read_env()
         if env_cfg[0] is True:
-            return env_cfg[0], env_cfg[1]
+            self.source = self.env_source()
+            return self._single(env_cfg[1])
         """
         Check local file cfg
         """
         file_cfg = self.read_file()
         if file_cfg[0] is True:
-            return file_cfg[0], file_cfg[1]
+            self.source = "file"
+            return self._single(file_cfg[1])
 
         return False, "Can't find Cisco DNA Center Config"
 
+    @staticmethod
+    def _single(data):
+        """
+        Single cluster cfg, a multi cluster cfg needs a profile
+        """
+        if "dnac" in data:
+            return True, data
+        if len(data.get("clusters", {})) == 1:
+            return True, {"dnac": list(data["clusters"].values())[0]}
+        return False, "Multiple Cisco DNA Center clusters configured, select a profile"
+
+    @classmethod
+    def clusters(cls):
+        """
+        Named Cisco DNA Center clusters {name: {"dnac": {...}}}
+        from the local cfg file and the environment (DNA_CENTER_*,
+        DNAC_CONFIG), see _profiles()
+        """
+        profiles = cls._profiles()
+        if profiles[0] is False:
+            return profiles
+        return True, {name: cfg for name, (source, cfg) in profiles[1].items()}
+
+    @classmethod
+    def _profiles(cls):
+        """
+        {name: (source, {"dnac": {...}})} of the local cfg file and the
+        environment merged, the environment wins for the same name
+        A single cluster cfg ("dnac" block) is profile "default"
+        """
+        found = False
+        profiles = {}
+        for source, cfg in (
+            ("file", cls.read_file()),
+            (cls.env_source(), cls.read_env()),
+        ):
+            if cfg[0] is False:
+                continue
+            found = True
+            data = cfg[1]
+            if "dnac" in data:
+                profiles["default"] = (source, {"dnac": data["dnac"]})
+            for name, dnac in data.get("clusters", {}).items():
+                profiles[name] = (source, {"dnac": dict(dnac)})
+        if found is False:
+            return False, "Can't find Cisco DNA Center Config"
+        if len(profiles) == 0:
+            return False, "No Cisco DNA Center clusters in config"
+        return True, profiles
+
     @classmethod
     def read_env(cls):
+        """
+        Environment cfg, cached until a DNA_CENTER_*/DNAC_CONFIG variable
+        changes
+        """
+        key = tuple(
+            sorted(
+                (k, v)
+                for k, v in os.environ.items()
+                if k.startswith(DNAC_ENV_PREFIX) or k == DNAC_ENV_ENCODED
+            )
+        )
+        return cls._cached("environment", key, cls._read_env)
+
+    @classmethod
+    def _read_env(cls):
         """
         Mandatory Environment variables if using Base64
         """
-        enviroment_cfg_base64 = "DNAC_CONFIG"
+        enviroment_cfg_base64 = DNAC_ENV_ENCODED
         if enviroment_cfg_base64 in os.environ:
             """ Validate cfg as base64 string """
             data = cls.base64_cfg(operation="decode", data=os.environ["DNAC_CONFIG"])
@@ -74,6 +240,29 @@ class Config:
                     "secure": secure,
                 }
             }
+            """
+            Optional Environment variables
+            """
+            if "DNA_CENTER_POOL_SIZE" in os.environ:
+                data["dnac"]["pool_size"] = int(os.environ["DNA_CENTER_POOL_SIZE"])
+            if "DNA_CENTER_RATE_LIMIT" in os.environ:
+                data["dnac"]["rate_limit"] = float(os.environ["DNA_CENTER_RATE_LIMIT"])
+            if "DNA_CENTER_RETRIES" in os.environ:
+                data["dnac"]["retries"] = int(os.environ["DNA_CENTER_RETRIES"])
+            if "DNA_CENTER_TIMEOUT" in os.environ:
+                data["dnac"]["timeout"] = float(os.environ["DNA_CENTER_TIMEOUT"])
+            if "DNA_CENTER_TOKEN_CACHE" in os.environ:
+                data["dnac"]["token_cache"] = (
+                    "true" in os.environ["DNA_CENTER_TOKEN_CACHE"].lower()
+                )
+            if "DNA_CENTER_CATALOG" in os.environ:
+                data["dnac"]["catalog"] = (
+                    "true" in os.environ["DNA_CENTER_CATALOG"].lower()
+                )
+            if "DNA_CENTER_JOURNAL" in os.environ:
+                data["dnac"]["journal"] = (
+                    "true" in os.environ["DNA_CENTER_JOURNAL"].lower()
+                )
             return True, data
 
         return False, "Environment variables missing"
@@ -90,7 +279,6 @@ class Config:
             """ Decode base64 str to json cfg """
             data = kwargs["data"]
             try:
-                data == base64.b64encode(base64.b64decode(data)).decode("utf-8")
                 data = json.loads(base64.b64decode(data).decode("utf-8"))
             except Exception as e:
                 return False, f"Can't decode config ({e})"
@@ -100,25 +288,36 @@ class Config:
     @classmethod
     def read_file(cls):
         """
-        Reading local cfg file (json)
+        Local cfg file, cached until its inode, mtime or size changes
         """
+        path = DNAC_FULL_CONFIG_PATH
         try:
-            with open(DNAC_FULL_CONFIG_PATH, "r") as f:
+            st = os.stat(path)
+            key = (path, st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            key = (path, None)
+        return cls._cached(f"file {path}", key, lambda: cls._read_file(path))
+
+    @classmethod
+    def _read_file(cls, path):
+        """
+        Reading local cfg file (json, or base64 encoded json)
+        """
+        try:
+            with open(path, "r") as f:
                 data = f.read()
-                f.close()
-                try:
-                    """ Read base64 encoded config """
-                    data == base64.b64encode(base64.b64decode(data)).decode("utf-8")
-                    data = json.loads(base64.b64decode(data).decode("utf-8"))
-                except Exception:
-                    try:
-                        """ Read JSON config (if not base64 encoded) """
-                        data = json.loads(data)
-                    except Exception:
-                        return False, "Can't load json from config"
-                return True, data
         except Exception as e:
             return False, f"Can't read config file ({e})"
+        if not data.lstrip().startswith("{"):
+            """ Read base64 encoded config """
+            try:
+                data = base64.b64decode(data.strip(), validate=True).decode("utf-8")
+            except (binascii.Error, UnicodeDecodeError):
+                return False, "Can't load json from config"
+        try:
+            return True, json.loads(data)
+        except Exception:
+            return False, "Can't load json from config"
 
     @classmethod
     def write(cls, hostname, username, password, secure, **kwargs):
@@ -133,30 +332,38 @@ class Config:
         if os.path.exists(local_user_path) is False:
             os.makedirs("{}{}".format(Path.home(), DNAC_CONFIG_PATH))
 
+        dnac = {
+            "hostname": hostname,
+            "username": username,
+            "password": password,
+            "secure": secure,
+        }
+        profile = kwargs.get("profile")
+        existing = cls.read_file() if profile else (False, None)
+
         """
         Don't override existing cfg without {overwrite}
         """
-        if (
-            "overwrite" not in kwargs["operation"]
-            and cls._config_exist(DNAC_FULL_CONFIG_PATH) is True
-        ):
+        if profile and existing[0] is True:
+            exists = profile in existing[1].get("clusters", {})
+        else:
+            exists = cls._config_exist(DNAC_FULL_CONFIG_PATH)
+        if "overwrite" not in kwargs["operation"] and exists is True:
             return False, "Config already exist"
 
         """
-        Write json config to file
+        Write json config to file (named profile goes into "clusters")
         """
-        data = {
-            "dnac": {
-                "hostname": hostname,
-                "username": username,
-                "password": password,
-                "secure": secure,
-            }
-        }
+        if profile:
+            data = existing[1] if existing[0] is True else {}
+            data.setdefault("clusters", {})[profile] = dnac
+        else:
+            data = {"dnac": dnac}
         try:
             with open(DNAC_FULL_CONFIG_PATH, "w") as f:
                 f.write(json.dumps(data, indent=4))
             f.close()
+            cls.invalidate()
             return True, "Success"
         except Exception as e:
             return False, f"Can't update config file ({e})"
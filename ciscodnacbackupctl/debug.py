@@ -2,13 +2,20 @@ import logging
 import sys
 from http.client import HTTPConnection
 
+""" Characters of a payload logged with --debug """
+DNAC_DEBUG_PAYLOAD_MAX = 4096
+
 
 class Debug:
     """Debug to Console"""
 
+    """ Payloads are only decoded/formatted once Debug() enabled it """
+    enabled = False
+
     def __init__(self) -> None:
         """Setup"""
         self.filename = "debug.txt"
+        Debug.enabled = True
         HTTPConnection.debuglevel = 2
         logging.basicConfig(
             level=logging.DEBUG,
@@ -23,5 +30,27 @@ class Debug:
     @staticmethod
     def payload(data):
         """HTTP Payload"""
+        if not Debug.enabled:
+            return
         logger = logging.getLogger(__name__)
-        logger.debug(str(data))
+        logger.debug(Debug._cap(str(data)))
+
+    @staticmethod
+    def response(response):
+        """
+        requests response body, decoded only when enabled and capped
+        (the body itself stays cached for json())
+        """
+        if not Debug.enabled:
+            return
+        content = response.content or b""
+        text = content[:DNAC_DEBUG_PAYLOAD_MAX].decode("utf-8", errors="replace")
+        if len(content) > DNAC_DEBUG_PAYLOAD_MAX:
+            text += f"... ({len(content)} bytes)"
+        logging.getLogger(__name__).debug(text)
+
+    @staticmethod
+    def _cap(text):
+        if len(text) <= DNAC_DEBUG_PAYLOAD_MAX:
+            return text
+        return f"{text[:DNAC_DEBUG_PAYLOAD_MAX]}... ({len(text)} characters)"
@@ -0,0 +1,186 @@
+import time
+from collections import OrderedDict
+import click
+from rich.console import Console
+from ciscodnacbackupctl.config import Config
+from ciscodnacbackupctl.catalog import DNAC_CATALOG_MAX_AGE
+from ciscodnacbackupctl.format import Format
+from ciscodnacbackupctl.pipeline import Pipeline
+
+
+class Fleet:
+    """
+    Fan-out of list/history/progress/purge over many Cisco DNA Center
+    clusters (named profiles), one worker thread per cluster
+    Results are merged into one table with a CLUSTER column
+    """
+
+    def __init__(
+        self,
+        clusters=None,
+        concurrency=None,
+        debug=False,
+        cached=False,
+        max_age=DNAC_CATALOG_MAX_AGE,
+        output="table",
+    ):
+        cfg = Config.clusters()
+        if cfg[0] is False:
+            raise Exception(cfg[1])
+        available = cfg[1]
+        if clusters:
+            unknown = [name for name in clusters if name not in available]
+            if len(unknown) != 0:
+                raise Exception(
+                    "Unknown Cisco DNA Center profile ({})".format(", ".join(unknown))
+                )
+            self.clusters = list(clusters)
+        else:
+            self.clusters = list(available)
+        self.concurrency = int(concurrency or len(self.clusters) or 1)
+        self.debug = debug
+        self.cached = cached
+        self.max_age = max_age
+        self.output = output
+        self.errors = {}
+        self.elapsed = 0
+
+    def _cli(self, name):
+        """ Import here, ciscodnacbackupctl imports Fleet """
+        from ciscodnacbackupctl import Api
+
+        return Api.CLI(
+            debug=self.debug, profile=name, cached=self.cached, max_age=self.max_age
+        )
+
+    def run(self, task):
+        """
+        Run task(cli) on every cluster concurrently
+        Returns {cluster: result} for the clusters that succeeded,
+        failures end up in {self.errors}
+        """
+        start = time.perf_counter()
+        pipeline = Pipeline(
+            lambda name: (True, task(self._cli(name))), concurrency=self.concurrency
+        )
+        results = pipeline.run(self.clusters)
+        self.elapsed = time.perf_counter() - start
+        self.errors = {k: v["message"] for k, v in pipeline.errors.items()}
+        return {
+            name: results[name]["message"]
+            for name in self.clusters
+            if results[name]["ok"]
+        }
+
+    @staticmethod
+    def merge(results, sort=None, reverse=False):
+        """
+        Merge per cluster responses into one, tagging rows with the cluster
+        """
+        response = []
+        for name, data in results.items():
+            for row in data["response"]:
+                tagged = OrderedDict([("cluster", name)])
+                tagged.update(row)
+                response.append(tagged)
+        if sort is not None:
+            response = sorted(response, key=lambda k: k[sort], reverse=reverse)
+        return {"response": response}
+
+    def _report(self, data, source):
+        console = Console(stderr=self.output != "table")
+        Format.cli(style=self.output, data=data, source=source)
+        for name, message in self.errors.items():
+            console.log(f"Error: {name} - {message}", style="red")
+        return len(self.errors) == 0
+
+    def list(self, reverse=False):
+        results = self.run(
+            lambda cli: cli.fetch_backups(reverse=reverse)
+        )
+        data = self.merge(results, sort="end_timestamp", reverse=reverse)
+        return self._report(data, "list")
+
+    def history(self):
+        results = self.run(lambda cli: cli.fetch_history())
+        return self._report(self.merge(results), "history")
+
+    def progress(self):
+        results = self.run(
+            lambda cli: cli.api.get_progress(fields=Format.HISTORY_COLUMNS)
+        )
+        return self._report(self.merge(results), "progress")
+
+    def purge(self, keep, incompatible, force, concurrency=1, **policy):
+        """
+        Purge every cluster, candidates are computed concurrently and
+        confirmed once for the whole fleet
+        False when any cluster failed (planning or deleting)
+        """
+        console = Console()
+        plans = self.run(
+            lambda cli: (
+                cli,
+                cli.backups_to_delete(
+                    incompatible=incompatible, keep=keep, force=force, **policy
+                ),
+            )
+        )
+        data = self.merge({name: plan[1] for name, plan in plans.items()})
+        if len(data["response"]) == 0:
+            console.log("No backup to delete")
+            return self._report(data, "list")
+
+        Format.cli(style="standard", data=data, source="list")
+        if force is not True:
+            confirm = click.prompt(
+                click.style(
+                    "Warning: Confirm if you want to delete these backups (y/n)",
+                    fg="red",
+                ),
+                type=bool,
+            )
+            if not confirm:
+                console.log("Warning: Purge aborted", style="red")
+                return True
+
+        def task(name):
+            """
+            Confirmed, the snapshot (maybe from the catalog) is checked
+            against the cluster first, like a single cluster purge
+            """
+            cli = plans[name][0]
+            backup_id = cli.purge_plan.ids
+            if len(backup_id) == 0:
+                return True, 0
+            cli._measured(
+                cli._execute,
+                cli.purge_plan,
+                True,
+                concurrency,
+                validate=force is not True,
+            )
+            if any(not v["ok"] for v in cli.results.values()):
+                return False, "Purge incomplete"
+            return True, len(backup_id)
+
+        pipeline = Pipeline(task, concurrency=self.concurrency)
+        results = pipeline.run(list(plans))
+        for name, message in pipeline.errors.items():
+            self.errors[name] = message["message"]
+        deleted = sum(v["message"] for v in results.values() if v["ok"])
+        succeeded = sum(1 for v in results.values() if v["ok"])
+        total = len(self.clusters)
+        if len(self.errors) == 0:
+            console.log(
+                f"Success: Backups ({deleted}) deleted on {total} clusters",
+                style="green",
+            )
+            return True
+        console.log(
+            f"Error: Backups ({deleted}) deleted on {succeeded} of {total} clusters",
+            style="red",
+        )
+        for name, message in self.errors.items():
+            console.log(f"Error: {name} - {message}", style="red")
+        return False
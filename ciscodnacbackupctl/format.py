@@ -1,10 +1,51 @@
+import csv
+import json
+import sys
 import time
-import rich
+from functools import lru_cache
 from hurry.filesize import size
-from tabulate import tabulate
+from ciscodnacbackupctl.timings import Timings
+
+""" --output, "standard" is the table """
+OUTPUTS = ("table", "json", "ndjson", "csv")
+""" Tables up to this size printed on a terminal go through rich """
+DNAC_TABLE_HIGHLIGHT_ROWS = 500
+
+
+@lru_cache(maxsize=65536)
+def _timestamp(v):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(v))
+
+
+@lru_cache(maxsize=65536)
+def _size(v):
+    return str(size(v))
+
+
+def _percentage(v):
+    return "{}%".format(int(v))
 
 
 class Format:
+    """ Backup columns never displayed (list) """
+    LIST_EXCLUDED_COLUMNS = [
+        "versions",
+        "backup_services",
+        "compatible_error",
+    ]
+    """ Columns displayed for history/progress """
+    HISTORY_COLUMNS = [
+        "cluster",
+        "backup_id",
+        "start_timestamp",
+        "status",
+        "operation",
+        "id",
+        "progress_in_percentage",
+        "description",
+        "backup_size",
+    ]
+
     def __init__(self):
         pass
 
@@ -12,139 +53,149 @@ class Format:
     def cli(**kwargs):
         """
         Handle in coming CLI Output Style
+        standard/table (plain table), json, ndjson and csv (streamed, raw values)
         """
-        if "standard" in kwargs["style"]:
-            return Format._default(**kwargs)
+        style = kwargs["style"]
+        if "standard" in style or style == "table":
+            with Timings.phase("format", kwargs["source"]):
+                return Format._default(**kwargs)
+        if style in OUTPUTS:
+            with Timings.phase("format", "{} {}".format(style, kwargs["source"])):
+                return Format._machine(**kwargs)
         return "Error"
 
     @classmethod
-    def _default(cls, **kwargs):
-        table = []
-        columns = []
-        rows = []
-        if kwargs["source"] == "dict":
-            columns, rows = cls.__dict(kwargs["data"])
-            table.append(rows)
-
-        elif kwargs["source"] == "list":
-            for d in kwargs["data"]["response"]:
-                columns, rows = cls.__list(d)
-                table.append(rows)
-
-        elif kwargs["source"] == "history":
-            for d in kwargs["data"]["response"]:
-                __columns, __rows = cls.__history(d)
-                
-                """ Don't override existing table """
-                if len(__columns) != 0:
-                    columns = __columns
-                if len(__rows) != 0:
-                    rows = __rows
-                
-                table.append(rows)
-
-        elif kwargs["source"] == "progress":
-            for d in kwargs["data"]["response"]:
-                columns, rows = cls.__progress(d)
-                table.append(rows)
-
-        if len(rows) != 0:
-            console = rich.get_console()
-            console.print(
-                tabulate(
-                    table,
-                    columns,
-                    tablefmt="plain",
-                    stralign="left",
-                    disable_numparse=True,
-                ),
-                soft_wrap=True,
-            )
-            return True
-        return False
+    def _records(cls, source, data):
+        """ Rows displayed for {source}, lazily """
+        if source == "dict":
+            return [data]
+        if source == "history":
+            return (d for d in data["response"] if "PENDING" not in d["status"])
+        return data["response"]
 
     @classmethod
-    def __dict(cls, data):
-        columns = []
-        rows = []
-        for k, v in data.items():
-            if k.lower() != "token":
-                columns.append(k.upper())
-                rows.append(v)
-        return columns, rows
+    def _schema(cls, source, d):
+        """
+        Columns (key, formatter) of {source}, computed once from the first
+        row instead of for every row/cell
+        """
+        if source == "dict":
+            return [(k, None) for k in d if k.lower() != "token"]
+        if source == "list":
+            keys = [k for k in d if k not in cls.LIST_EXCLUDED_COLUMNS]
+        else:
+            keys = [k for k in d if k in cls.HISTORY_COLUMNS]
+        return [(k, cls._formatter(k, source)) for k in keys]
+
+    @staticmethod
+    def _formatter(k, source):
+        if "time" in k:
+            return _timestamp
+        if "size" in k:
+            return _size
+        if "percentage" in k:
+            return _percentage
+        if "_version" in k and source == "list":
+            return str
+        return None
+
+    @staticmethod
+    def _get(d, k):
+        try:
+            return d[k]
+        except KeyError:
+            return None
 
     @classmethod
-    def __list(cls, d):
-        excluded_columns = [
-            "versions",
-            "backup_services",
-            "compatible_error",
-        ]
-        columns = []
-        rows = []
-        for k, v in d.items():
-            if k not in excluded_columns:
-                columns.append(k.upper())
-                if "time" in k:
-                    v = str(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(v)))
-                if "size" in k:
-                    v = str(size(v))
-                if "percentage" in k:
-                    v = "{}%".format(int(v))
-                if "_version" in k:
-                    v = str(v)
-                rows.append(v)
-        return columns, rows
+    def rows(cls, source, data):
+        """ (columns, rows of formatted cells) of {source} """
+        records = iter(cls._records(source, data))
+        first = next(records, None)
+        if first is None:
+            return [], []
+        schema = cls._schema(source, first)
+        columns = [k.upper() for k, _ in schema]
+        table = []
+        for d in _chain(first, records):
+            row = []
+            for k, formatter in schema:
+                v = cls._get(d, k)
+                if formatter is not None and v is not None:
+                    v = formatter(v)
+                row.append(v)
+            table.append(row)
+        return columns, table
 
     @classmethod
-    def __history(cls, d):
-        included_columns = [
-            "backup_id",
-            "start_timestamp",
-            "status",
-            "operation",
-            "id",
-            "progress_in_percentage",
-            "description",
-            "backup_size",
-        ]
-        columns = []
-        rows = []
-        if "PENDING" not in d["status"]:
-            for k, v in d.items():
-                if k in included_columns:
-                    columns.append(k.upper())
-                    if "time" in k:
-                        v = str(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(v)))
-                    if "size" in k:
-                        v = str(size(v))
-                    if "percentage" in k:
-                        v = "{}%".format(int(v))
-                    rows.append(v)
-        return columns, rows
+    def _default(cls, **kwargs):
+        columns, table = cls.rows(kwargs["source"], kwargs["data"])
+        if len(table) == 0:
+            return False
+        out = kwargs.get("file") or sys.stdout
+        if len(table) <= DNAC_TABLE_HIGHLIGHT_ROWS and out.isatty():
+            """ Small tables on a terminal keep rich highlighting """
+            import rich
+
+            console = rich.get_console()
+            console.print("\n".join(cls.lines(table, columns)), soft_wrap=True)
+            return True
+        for line in cls.lines(table, columns):
+            out.write(line + "\n")
+        out.flush()
+        return True
+
+    @staticmethod
+    def lines(table, columns):
+        """
+        Lines of tabulate(tablefmt="plain", stralign="left") without
+        tabulate, widths computed in one pass then one line at a time
+        """
+        cells = [["" if v is None else str(v) for v in row] for row in table]
+        widths = [len(column) + 2 for column in columns]
+        for i, column in enumerate(zip(*cells)):
+            widths[i] = max(widths[i], max(map(len, column)))
+        yield "  ".join(c.ljust(w) for c, w in zip(columns, widths)).rstrip()
+        for row in cells:
+            yield "  ".join(v.ljust(w) for v, w in zip(row, widths)).rstrip()
 
     @classmethod
-    def __progress(cls, d):
-        included_columns = [
-            "backup_id",
-            "start_timestamp",
-            "status",
-            "operation",
-            "id",
-            "progress_in_percentage",
-            "description",
-            "backup_size",
-        ]
-        columns = []
-        rows = []
-        for k, v in d.items():
-            if k in included_columns:
-                columns.append(k.upper())
-                if "time" in k:
-                    v = str(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(v)))
-                if "size" in k:
-                    v = str(size(v))
-                if "percentage" in k:
-                    v = "{}%".format(int(v))
-                rows.append(v)
-        return columns, rows
+    def _machine(cls, **kwargs):
+        """
+        json/ndjson/csv written to stdout row by row as they are produced
+        (no tabulate/rich), raw values (epoch timestamps, bytes)
+        """
+        style = kwargs["style"]
+        source = kwargs["source"]
+        out = kwargs.get("file") or sys.stdout
+        records = iter(cls._records(source, kwargs["data"]))
+        first = next(records, None)
+        if first is None:
+            if style == "json":
+                out.write("{}\n" if source == "dict" else "[]\n")
+            return False
+        keys = [k for k, _ in cls._schema(source, first)]
+        encode = json.JSONEncoder(default=str).encode
+
+        if style == "csv":
+            writer = csv.writer(out, lineterminator="\n")
+            writer.writerow(keys)
+            for d in _chain(first, records):
+                writer.writerow([cls._get(d, k) for k in keys])
+        elif style == "ndjson":
+            for d in _chain(first, records):
+                out.write(encode({k: cls._get(d, k) for k in keys}) + "\n")
+        elif source == "dict":
+            out.write(encode({k: cls._get(first, k) for k in keys}) + "\n")
+        else:
+            separator = "[\n"
+            for d in _chain(first, records):
+                out.write(separator + encode({k: cls._get(d, k) for k in keys}))
+                separator = ",\n"
+            out.write("\n]\n")
+        out.flush()
+        return True
+
+
+def _chain(first, records):
+    yield first
+    yield from records
@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+import time
+import uuid
+from ciscodnacbackupctl import config
+from ciscodnacbackupctl.retry import CircuitOpen
+
+""" Entries written before the journal is fsynced, or seconds since the last """
+DNAC_JOURNAL_BATCH = 32
+DNAC_JOURNAL_INTERVAL = 1.0
+""" Failed deletes of a backup before interrupted purges stop resuming it """
+DNAC_JOURNAL_ATTEMPTS = 3
+
+
+class Journal:
+    """
+    Append-only purge journal of one cluster (~/.ciscodnac/purge.journal,
+    one JSON entry per line): a "plan" entry listing the backups to
+    delete, fsynced before the first delete, a "delete" entry per call
+    (result, duration), fsynced every {batch} entries or {interval}
+    seconds, and a "done" entry once the purge finished
+
+    A plan without "done" whose process (pid of the "plan"/"resume"
+    entry) is gone was interrupted, pending() returns what it didn't
+    delete yet so the next purge resumes it instead of listing and
+    planning again. Runs of a live process are left to it. A backup whose
+    delete failed {attempts} times (sent, not stopped by an open circuit)
+    is given up (not resumed, {given_up}). Kept as the audit log of what
+    was deleted and when
+    """
+
+    def __init__(
+        self,
+        cluster,
+        path=None,
+        batch=DNAC_JOURNAL_BATCH,
+        interval=DNAC_JOURNAL_INTERVAL,
+        attempts=DNAC_JOURNAL_ATTEMPTS,
+    ):
+        self.cluster = cluster
+        self.path = path or config.DNAC_FULL_JOURNAL_PATH
+        self.batch = max(int(batch), 1)
+        self.interval = interval
+        self.attempts = max(int(attempts), 1)
+        self.given_up = {}
+        self.run = None
+        self._file = None
+        self._unsynced = 0
+        self._synced = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def enabled(settings):
+        return settings["dnac"].get("journal", True) is not False
+
+    def _open(self):
+        if self._file is None:
+            folder = os.path.dirname(self.path)
+            if folder and os.path.exists(folder) is False:
+                os.makedirs(folder)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._file = os.fdopen(fd, "a", encoding="utf-8")
+            self._synced = time.monotonic()
+        return self._file
+
+    def write(self, event, sync=False, **entry):
+        """ Append one entry, fsynced with the batch unless {sync} """
+        entry = dict(
+            time=round(time.time(), 3),
+            event=event,
+            run=self.run,
+            cluster=self.cluster,
+            **entry,
+        )
+        with self._lock:
+            f = self._open()
+            f.write(json.dumps(entry, default=str) + "\n")
+            self._unsynced += 1
+            if (
+                sync
+                or self._unsynced >= self.batch
+                or time.monotonic() - self._synced >= self.interval
+            ):
+                self._sync()
+        return entry
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced = time.monotonic()
+        return
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+        return
+
+    def plan(self, ids, sizes=None, **kwargs):
+        """ New run deleting {ids}, on disk before any delete is sent """
+        self.run = uuid.uuid4().hex[:12]
+        sizes = sizes or {}
+        return self.write(
+            "plan",
+            sync=True,
+            ids=list(ids),
+            sizes={i: sizes.get(i, 0) for i in ids},
+            pid=os.getpid(),
+            **kwargs,
+        )
+
+    def resume(self, runs):
+        """ Interrupted {runs} continued by this process (new owner) """
+        for run in runs:
+            self.run = run
+            self.write("resume", sync=True, pid=os.getpid())
+        return
+
+    @staticmethod
+    def running(pid):
+        """ Another live process (signal 0 only checks it exists) """
+        if pid is None or pid == os.getpid() or os.name != "posix":
+            return False
+        try:
+            os.kill(pid, 0)
+        except PermissionError:
+            return True
+        except OSError:
+            return False
+        return True
+
+    def deleted(self, backup_id, result):
+        """ Pipeline result of one delete, {sent} unless the circuit was open """
+        return self.write(
+            "delete",
+            id=backup_id,
+            ok=result["ok"],
+            message=result["message"],
+            seconds=round(result["elapsed"], 3),
+            sent=not isinstance(result.get("error"), CircuitOpen),
+        )
+
+    def done(self, results, runs=None, **kwargs):
+        """ Ends the current run (and the resumed {runs}) """
+        deleted = sum(1 for v in results.values() if v["ok"])
+        for run in runs or [self.run]:
+            self.run = run
+            self.write(
+                "done",
+                deleted=deleted,
+                failed=len(results) - deleted,
+                **kwargs,
+            )
+        self.close()
+        self.run = None
+        return
+
+    def entries(self):
+        """ Entries of this cluster, a torn last line is skipped """
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("cluster") == self.cluster:
+                    yield entry
+
+    def pending(self):
+        """
+        Interrupted runs: ([run, ...] oldest first, {id: size} not deleted
+        yet), None when every run of the cluster is done or still running
+        Backups given up are left out, in {given_up} ({id: failed deletes})
+        """
+        runs = {}
+        owners = {}
+        failures = {}
+        for entry in self.entries():
+            run = entry.get("run")
+            if entry["event"] == "plan":
+                runs[run] = dict(entry.get("sizes") or dict.fromkeys(entry["ids"], 0))
+                owners[run] = entry.get("pid")
+            elif entry["event"] == "resume":
+                owners[run] = entry.get("pid")
+            elif entry["event"] == "delete" and entry["ok"] and run in runs:
+                runs[run].pop(entry["id"], None)
+            elif entry["event"] == "delete" and not entry["ok"]:
+                if entry.get("sent", True):
+                    failures[entry["id"]] = failures.get(entry["id"], 0) + 1
+            elif entry["event"] == "done":
+                runs.pop(run, None)
+        for run in [run for run in runs if self.running(owners.get(run))]:
+            runs.pop(run)
+        if len(runs) == 0:
+            return None
+        outstanding = {}
+        for sizes in runs.values():
+            outstanding.update(sizes)
+        self.given_up = {
+            i: failures[i] for i in outstanding if failures.get(i, 0) >= self.attempts
+        }
+        for i in self.given_up:
+            outstanding.pop(i)
+        return list(runs), outstanding
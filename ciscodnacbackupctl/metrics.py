@@ -0,0 +1,202 @@
+import re
+import threading
+from urllib.parse import urlparse
+
+""" Histogram buckets (seconds) for API requests and purges """
+DNAC_METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+""" Backup/task ids in URLs are replaced to keep label cardinality bounded """
+ID = re.compile(r"/[0-9a-fA-F]{8}(?:-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}")
+
+METRICS = {
+    "dnac_requests_total": ("counter", "Cisco DNA Center API requests"),
+    "dnac_request_duration_seconds": (
+        "histogram",
+        "Cisco DNA Center API request latency (until response headers)",
+    ),
+    "dnac_auth_total": ("counter", "Cisco DNA Center authentications"),
+    "dnac_throttled_total": (
+        "counter",
+        "Cisco DNA Center API requests throttled (429/503)",
+    ),
+    "dnac_retries_total": (
+        "counter",
+        "Cisco DNA Center API requests retried (transient failures)",
+    ),
+    "dnac_circuit_open_total": ("counter", "Circuit breaker openings"),
+    "dnac_circuit_open": ("gauge", "Circuit breaker open (1) or closed (0)"),
+    "dnac_concurrency_limit": (
+        "gauge",
+        "Requests in flight allowed by the rate limiter (AIMD)",
+    ),
+    "dnac_purge_duration_seconds": ("histogram", "Purge duration"),
+    "dnac_purge_failures_total": ("counter", "Purges failed or incomplete"),
+    "dnac_purge_last_success_timestamp_seconds": (
+        "gauge",
+        "Last successful purge (unix time)",
+    ),
+    "dnac_backups_deleted_total": ("counter", "Backups deleted"),
+    "dnac_backup_delete_failures_total": ("counter", "Backup deletes failed"),
+    "dnac_bytes_reclaimed_total": ("counter", "Bytes reclaimed by deleted backups"),
+    "dnac_backups": ("gauge", "Backups on Cisco DNA Center (last listing)"),
+    "dnac_backups_bytes": ("gauge", "Size of the backups (last listing)"),
+    "dnac_job_runs_total": ("counter", "Daemon job runs (backup, purge, refresh)"),
+    "dnac_job_duration_seconds": ("histogram", "Daemon job duration"),
+    "dnac_scheduler_wakeups_total": ("counter", "Daemon scheduler wakeups"),
+    "dnac_job_setup_seconds": (
+        "histogram",
+        "Daemon job setup (client, token refresh) before the work",
+    ),
+    "dnac_client_rebuilds_total": (
+        "counter",
+        "Daemon connection pool rebuilds after repeated failures",
+    ),
+}
+
+
+class Metrics:
+    """
+    Process wide metrics in the Prometheus text format (no dependency)
+    Updated by Api/CLI, served on /metrics by the daemon (serve())
+    """
+
+    _lock = threading.Lock()
+    _values = {}
+    _histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    @classmethod
+    def inc(cls, name, value=1, **labels):
+        key = cls._key(name, labels)
+        with cls._lock:
+            cls._values[key] = cls._values.get(key, 0) + value
+        return
+
+    @classmethod
+    def set(cls, name, value, **labels):
+        with cls._lock:
+            cls._values[cls._key(name, labels)] = value
+        return
+
+    @classmethod
+    def observe(cls, name, value, **labels):
+        key = cls._key(name, labels)
+        with cls._lock:
+            """ [count per bucket..., count, sum] """
+            histogram = cls._histograms.get(key)
+            if histogram is None:
+                histogram = [0] * (len(DNAC_METRICS_BUCKETS) + 1) + [0.0]
+                cls._histograms[key] = histogram
+            for i, bound in enumerate(DNAC_METRICS_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += value
+        return
+
+    @classmethod
+    def get(cls, name, **labels):
+        with cls._lock:
+            return cls._values.get(cls._key(name, labels), 0)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._values = {}
+            cls._histograms = {}
+        return
+
+    @staticmethod
+    def endpoint(url):
+        """ URL path with ids replaced ({id}) """
+        return ID.sub("/{id}", urlparse(url).path)
+
+    @classmethod
+    def response_hook(cls, response, *args, **kwargs):
+        """ requests.Session response hook, one sample per API request """
+        endpoint = cls.endpoint(response.request.url)
+        method = response.request.method
+        cls.inc(
+            "dnac_requests_total",
+            endpoint=endpoint,
+            method=method,
+            code=str(response.status_code),
+        )
+        cls.observe(
+            "dnac_request_duration_seconds",
+            response.elapsed.total_seconds(),
+            endpoint=endpoint,
+            method=method,
+        )
+        return response
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if len(labels) == 0:
+            return ""
+        escaped = (
+            '{}="{}"'.format(
+                k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+            )
+            for k, v in labels
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    @classmethod
+    def render(cls):
+        with cls._lock:
+            values = dict(cls._values)
+            histograms = {k: list(v) for k, v in cls._histograms.items()}
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (metric, labels), histogram in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(DNAC_METRICS_BUCKETS, histogram):
+                        le = cls._labels(labels, (("le", repr(float(bound))),))
+                        lines.append(f"{name}_bucket{le} {count}")
+                    le = cls._labels(labels, (("le", "+Inf"),))
+                    lines.append(f"{name}_bucket{le} {histogram[-2]}")
+                    lines.append(f"{name}_sum{cls._labels(labels)} {histogram[-1]}")
+                    lines.append(f"{name}_count{cls._labels(labels)} {histogram[-2]}")
+                continue
+            samples = [(k, v) for k, v in sorted(values.items()) if k[0] == name]
+            if len(samples) == 0 and kind == "counter":
+                samples = [((name, ()), 0)]
+            for (_, labels), value in samples:
+                lines.append(f"{name}{cls._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def serve(cls, port, address="127.0.0.1"):
+        """
+        Serve /metrics from a background thread, returns the server
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                return
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = cls.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((address, int(port)), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
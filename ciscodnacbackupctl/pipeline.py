@@ -0,0 +1,67 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class Pipeline:
+    """
+    Run one task per item with bounded parallelism (worker threads)
+    A failing item doesn't stop the others, every item gets a result
+    """
+
+    def __init__(self, task, concurrency=1, progress=None):
+        """
+        task(item) returns (bool, message) or raises
+        progress(done, total, item, result) is called as items complete
+        """
+        if int(concurrency) < 1:
+            raise ValueError(f"Invalid concurrency - {concurrency}")
+        self.task = task
+        self.concurrency = int(concurrency)
+        self.progress = progress
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def _run(self, item):
+        start = time.perf_counter()
+        error = None
+        try:
+            ok, message = self.task(item)
+        except Exception as error_msg:
+            ok, message, error = False, str(error_msg), error_msg
+        return {
+            "ok": bool(ok),
+            "message": message,
+            "elapsed": time.perf_counter() - start,
+            "error": error,
+        }
+
+    def _done(self, item, result, total):
+        with self._lock:
+            self.results[item] = result
+            done = len(self.results)
+        if self.progress is not None:
+            self.progress(done, total, item, result)
+        return
+
+    def run(self, items):
+        """
+        Returns {item: {"ok", "message", "elapsed", "error"}}, error is
+        the exception the task raised (None otherwise)
+        """
+        items = list(dict.fromkeys(items))
+        total = len(items)
+        if self.concurrency == 1 or total <= 1:
+            for item in items:
+                self._done(item, self._run(item), total)
+            return self.results
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self._run, item): item for item in items}
+            for future in as_completed(futures):
+                self._done(futures[future], future.result(), total)
+        return self.results
+
+    @property
+    def errors(self):
+        return {k: v for k, v in self.results.items() if not v["ok"]}
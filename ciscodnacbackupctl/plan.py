@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import time
+
+""" Backup fields retention and capacity policies read, all the fingerprint covers """
+PLAN_FIELDS = ["backup_id", "end_timestamp", "status", "compatible", "backup_size"]
+PLAN_VERSION = 2
+
+
+class Plan:
+    """
+    Purge plan: the backups to delete, computed from one snapshot of the
+    backups of a cluster, and a fingerprint of that snapshot. Before the
+    deletes the cluster is listed again with only {PLAN_FIELDS} and the
+    plan runs only while the fingerprint is the same (no backup added,
+    removed or changed since). Saved (purge --plan FILE) it can be
+    reviewed and run later (purge --apply FILE)
+    """
+
+    def __init__(self, hostname, fingerprint, delete, policy=None, **kwargs):
+        self.hostname = hostname
+        self.fingerprint = fingerprint
+        self.delete = list(delete)
+        self.policy = policy or {}
+        self.backups = kwargs.get("backups", 0)
+        self.created = kwargs.get("created") or time.time()
+
+    @classmethod
+    def snapshot(cls, hostname, backups, delete, policy=None):
+        """ Plan deleting {delete} out of {backups} (records) """
+        return cls(
+            hostname,
+            cls.digest(backups),
+            [dict(b.items()) for b in delete],
+            policy=policy,
+            backups=len(backups),
+        )
+
+    @staticmethod
+    def digest(backups):
+        """ Fingerprint of the backups (order independent) """
+        rows = sorted(
+            "|".join(str(b.get(name)) for name in PLAN_FIELDS) for b in backups
+        )
+        sha = hashlib.sha256("\n".join(rows).encode("utf-8"))
+        return f"sha256:{sha.hexdigest()}"
+
+    @property
+    def ids(self):
+        return [b["backup_id"] for b in self.delete]
+
+    def check(self, hostname, backups):
+        """ (True, None) while {backups} still match the snapshot """
+        if hostname != self.hostname:
+            return False, f"Purge plan is for {self.hostname}, not {hostname}"
+        if self.digest(backups) != self.fingerprint:
+            return False, (
+                "Backups changed since the purge plan ({} then, {} now), "
+                "plan again".format(self.backups, len(backups))
+            )
+        return True, None
+
+    def as_dict(self):
+        return {
+            "version": PLAN_VERSION,
+            "hostname": self.hostname,
+            "created": self.created,
+            "fingerprint": self.fingerprint,
+            "backups": self.backups,
+            "policy": self.policy,
+            "delete": self.delete,
+        }
+
+    def save(self, path):
+        """ Plan file, replaced atomically """
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "w") as f:
+            f.write(json.dumps(self.as_dict(), indent=4))
+        os.replace(tmp, path)
+        return True
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, "r") as f:
+                data = json.loads(f.read())
+        except Exception as e:
+            return False, f"Can't read purge plan ({e})"
+        if data.get("version") != PLAN_VERSION:
+            return False, f"Unsupported purge plan version ({data.get('version')})"
+        try:
+            return True, cls(
+                data["hostname"],
+                data["fingerprint"],
+                data["delete"],
+                policy=data.get("policy"),
+                backups=data.get("backups", 0),
+                created=data.get("created"),
+            )
+        except KeyError as e:
+            return False, f"Invalid purge plan (missing {e})"
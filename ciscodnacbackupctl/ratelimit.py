@@ -0,0 +1,163 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from ciscodnacbackupctl.metrics import Metrics
+
+"""
+Requests per second towards one cluster (token bucket), 0 disables it:
+a conservative ceiling, well above what a purge needs, so a burst of
+deletes never hits the controller faster than its API throttling allows
+"""
+DNAC_RATE_LIMIT = 20
+""" Requests sent back to back before the rate applies """
+DNAC_RATE_BURST = 10
+""" Responses slower than this (seconds) shrink the concurrency """
+DNAC_LATENCY_TARGET = 5.0
+""" Pause after a 429/503 without Retry-After, longest Retry-After honored """
+DNAC_RETRY_AFTER = 5
+DNAC_RETRY_AFTER_MAX = 300
+""" Throttled response codes """
+THROTTLED = (429, 503)
+
+
+class RateLimiter:
+    """
+    Client side throttling of one cluster, shared by every Api towards it
+    (like the pooled sessions): token bucket of {rate} requests/s and an
+    AIMD concurrency limit, +1 after a window of fast successful responses
+    (up to {max_concurrency}), halved on a 429/503 or a response slower
+    than {latency} (once per window: responses to requests sent before
+    the last decrease don't count). Retry-After pauses every request of
+    the cluster
+    """
+
+    _limiters = {}
+    _limiters_lock = threading.Lock()
+
+    def __init__(
+        self,
+        rate=DNAC_RATE_LIMIT,
+        burst=DNAC_RATE_BURST,
+        max_concurrency=10,
+        latency=DNAC_LATENCY_TARGET,
+    ):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.latency = latency
+        self.limit = self.max_concurrency
+        self.inflight = 0
+        self.tokens = self.burst
+        self.successes = 0
+        self.throttled = 0
+        self.paused_until = 0.0
+        self.decreased = 0.0
+        self.clock = time.monotonic
+        self._cond = threading.Condition()
+        self._updated = self.clock()
+
+    @classmethod
+    def get(cls, key, **kwargs):
+        """ Limiter of cluster {key}, created on first use """
+        with cls._limiters_lock:
+            if key not in cls._limiters:
+                cls._limiters[key] = cls(**kwargs)
+            return cls._limiters[key]
+
+    @classmethod
+    def reset(cls):
+        with cls._limiters_lock:
+            cls._limiters.clear()
+        return
+
+    def _refill(self, now):
+        if self.rate > 0:
+            elapsed = max(now - self._updated, 0)
+            self.tokens = min(self.tokens + elapsed * self.rate, self.burst)
+        self._updated = now
+        return
+
+    def delay(self):
+        """
+        Seconds before a request may be sent, None while the concurrency
+        limit is reached (until a release), 0 now
+        """
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.inflight >= self.limit:
+            return None
+        if self.rate <= 0:
+            return 0
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """ Wait for a token and a free slot, returns the send time """
+        with self._cond:
+            while True:
+                delay = self.delay()
+                if delay == 0:
+                    break
+                self._cond.wait(delay)
+            if self.rate > 0:
+                self.tokens -= 1
+            self.inflight += 1
+            return self.clock()
+
+    def release(self, status=None, latency=None, retry_after=None, sent=None):
+        """
+        Record the response of a request acquired at {sent} ({status} None
+        when it failed without one), returns the pause (seconds) it caused
+        """
+        sent = self.clock() if sent is None else sent
+        with self._cond:
+            self.inflight = max(self.inflight - 1, 0)
+            pause = 0
+            if status in THROTTLED:
+                self.throttled += 1
+                pause = self.retry_after(retry_after)
+                self.paused_until = max(self.paused_until, self.clock() + pause)
+                self.tokens = 0
+                self._decrease(sent)
+            elif latency is not None and latency > self.latency:
+                self._decrease(sent)
+            elif status is not None and status < 500:
+                self.successes += 1
+                if self.successes >= self.limit:
+                    """ One window (limit responses) without trouble """
+                    self.limit = min(self.limit + 1, self.max_concurrency)
+                    self.successes = 0
+            Metrics.set("dnac_concurrency_limit", self.limit)
+            self._cond.notify_all()
+        return pause
+
+    def _decrease(self, sent):
+        """ Halve the limit, unless already done after {sent} """
+        if sent < self.decreased:
+            return
+        self.limit = max(self.limit // 2, 1)
+        self.successes = 0
+        self.decreased = self.clock()
+        return
+
+    @staticmethod
+    def retry_after(value, now=None):
+        """ Retry-After (seconds or HTTP date) in seconds, capped """
+        if value is None:
+            return DNAC_RETRY_AFTER
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                date = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return DNAC_RETRY_AFTER
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=timezone.utc)
+            now = now or datetime.now(timezone.utc)
+            seconds = (date - now).total_seconds()
+        return min(max(seconds, 0), DNAC_RETRY_AFTER_MAX)
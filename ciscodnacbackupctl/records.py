@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime, timezone
+
+""" Columns dropped from every Cisco DNA Center response """
+REMOVED_COLUMNS = ("tenantId", "_id", "_version")
+
+_MISSING = object()
+
+
+class Record(Mapping):
+    """
+    Compact (slotted) row of a Cisco DNA Center response
+    Known fields are typed attributes, anything else ends up in {extra}.
+    The Mapping interface (record["key"], .items(), ...) is a read-only
+    dict view with the original values and sorted keys, as before.
+    """
+
+    """ (name, converter) of the known fields, set by subclasses """
+    FIELDS = ()
+    _names = frozenset()
+    _converters = {}
+    __slots__ = ("extra",)
+
+    def __init__(self, **kwargs):
+        self.extra = None
+        for name, convert in self.FIELDS:
+            value = kwargs.pop(name, _MISSING)
+            if value is not _MISSING and value is not None:
+                value = convert(value)
+            setattr(self, name, value)
+        if kwargs:
+            self.extra = kwargs
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Single pass over the row, no intermediate dict """
+        record = cls.__new__(cls)
+        record.extra = None
+        converters = cls._converters
+        for name in converters:
+            setattr(record, name, _MISSING)
+        for k, v in data.items():
+            convert = converters.get(k)
+            if convert is not None:
+                if v is not None and type(v) is not convert[0]:
+                    v = convert[1](v)
+                setattr(record, k, v)
+            elif k not in REMOVED_COLUMNS:
+                if record.extra is None:
+                    record.extra = {}
+                record.extra[k] = v
+        return record
+
+    def _raw(self, name, value):
+        return value
+
+    def __getitem__(self, key):
+        value = getattr(self, key, _MISSING) if key in self._names else _MISSING
+        if value is _MISSING:
+            if self.extra is not None and key in self.extra:
+                return self.extra[key]
+            raise KeyError(key)
+        return self._raw(key, value)
+
+    def __iter__(self):
+        keys = [n for n in self._names if getattr(self, n) is not _MISSING]
+        if self.extra is not None:
+            keys.extend(self.extra)
+        return iter(sorted(keys))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def as_dict(self):
+        return OrderedDict(self.items())
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, dict(self.items()))
+
+    @staticmethod
+    def _datetime(ts):
+        if ts is _MISSING or ts is None:
+            return None
+        return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+    @property
+    def start(self):
+        return self._datetime(self.start_timestamp)
+
+    @property
+    def end(self):
+        return self._datetime(self.end_timestamp)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._names = frozenset(name for name, _ in cls.FIELDS)
+        cls._converters = {
+            name: (bool if convert is _bool else convert, convert)
+            for name, convert in cls.FIELDS
+        }
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).upper() == "TRUE"
+
+
+class BackupRecord(Record):
+    """ Backup (/api/system/v1/maglev/backup) """
+
+    FIELDS = (
+        ("backup_id", str),
+        ("backup_size", int),
+        ("compatible", _bool),
+        ("description", str),
+        ("start_timestamp", float),
+        ("end_timestamp", float),
+        ("status", str),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+    backup_id: str
+    backup_size: int
+    compatible: bool
+    description: str
+    start_timestamp: float
+    end_timestamp: float
+    status: str
+
+    def _raw(self, name, value):
+        """ compatible is the string "TRUE"/"FALSE" in the API """
+        if name == "compatible" and isinstance(value, bool):
+            return "TRUE" if value else "FALSE"
+        return value
+
+
+class HistoryRecord(Record):
+    """ Backup task (/api/system/v1/maglev/backup/history) """
+
+    FIELDS = (
+        ("backup_id", str),
+        ("id", str),
+        ("backup_size", int),
+        ("description", str),
+        ("operation", str),
+        ("status", str),
+        ("start_timestamp", float),
+        ("end_timestamp", float),
+        ("progress_in_percentage", float),
+        ("progress_completed_counts", int),
+        ("progress_total_counts", int),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS)
+
+    backup_id: str
+    id: str
+    backup_size: int
+    description: str
+    operation: str
+    status: str
+    start_timestamp: float
+    end_timestamp: float
+    progress_in_percentage: float
+    progress_completed_counts: int
+    progress_total_counts: int
+
+
+class ProgressRecord(HistoryRecord):
+    """ Backup in progress (/api/system/v1/maglev/backup/progress) """
+
+    __slots__ = ()
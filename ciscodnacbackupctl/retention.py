@@ -0,0 +1,190 @@
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+""" Backup status counted by the daily/weekly/monthly policies """
+RETENTION_STATUS = "SUCCESS"
+""" Size units of the capacity policies (powers of 1024, as displayed) """
+SIZE_UNITS = {"": 0, "B": 0, "K": 1, "M": 2, "G": 3, "T": 4, "P": 5}
+SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGTP]?)(?:I?B)?\s*$", re.IGNORECASE)
+
+
+def parse_size(value):
+    """ "500GB", "1.5T", "200GiB" or bytes (int) in bytes """
+    if value is None or isinstance(value, int):
+        return value
+    match = SIZE.match(str(value))
+    if match is None:
+        raise ValueError(f"Invalid size - {value}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** SIZE_UNITS[unit.upper()])
+
+
+class Retention:
+    """
+    Retention policy for Cisco DNA Center backups (purge)
+
+    Policies are combined, a backup is kept if any policy keeps it:
+    keep      newest N backups (int) or backups of the last N days ("Nd")
+    daily     newest backup of each of the last X days with a backup
+    weekly    newest backup of each of the last Y (ISO) weeks with a backup
+    monthly   newest backup of each of the last Z months with a backup
+    min_keep  floor, newest backups are kept until at least min_keep are
+    incompatible  incompatible backups are never kept, without
+              daily/weekly/monthly every compatible backup is kept (as before)
+
+    Capacity policies turn the above into the backups protected: only as
+    many of the other backups as needed are deleted, oldest incompatible
+    ones first then the oldest ones, the rest is kept ("capacity")
+    max_total_size  backups use at most this many bytes afterwards
+    free_at_least   at least this many bytes are reclaimed
+
+    Days/weeks/months are UTC calendar buckets that have a backup (not a
+    window from now), so a cluster that stopped taking backups keeps them.
+    """
+
+    def __init__(
+        self,
+        keep=3,
+        incompatible=False,
+        daily=0,
+        weekly=0,
+        monthly=0,
+        min_keep=0,
+        max_total_size=None,
+        free_at_least=None,
+        now=None,
+    ):
+        self.last = 0
+        self.days = None
+        if keep is not None and "d" in str(keep):
+            self.days = int(str(keep)[:-1])
+        elif keep is not None:
+            self.last = int(keep)
+        self.incompatible = incompatible
+        self.daily = int(daily or 0)
+        self.weekly = int(weekly or 0)
+        self.monthly = int(monthly or 0)
+        self.min_keep = int(min_keep or 0)
+        self.max_total_size = parse_size(max_total_size)
+        self.free_at_least = parse_size(free_at_least)
+        for name in (
+            "last",
+            "days",
+            "daily",
+            "weekly",
+            "monthly",
+            "min_keep",
+            "max_total_size",
+            "free_at_least",
+        ):
+            if (getattr(self, name) or 0) < 0:
+                raise ValueError(f"Invalid retention - {name} can't be negative")
+        self.now = now or datetime.now(tz=timezone.utc)
+        """ Capacity report of the last apply() (bytes) """
+        self.total = 0
+        self.needed = 0
+        self.reclaimed = 0
+
+    @property
+    def capacity(self):
+        return self.max_total_size is not None or self.free_at_least is not None
+
+    @property
+    def gfs(self):
+        return self.daily != 0 or self.weekly != 0 or self.monthly != 0
+
+    @staticmethod
+    def _buckets(ts):
+        """ (day, week, month) UTC buckets of a timestamp """
+        dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+        return dt.date(), dt.isocalendar()[:2], (dt.year, dt.month)
+
+    def apply(self, backups):
+        """
+        One pass over {backups}, returns (keep, delete)
+        keep is {backup_id: [reasons]}, delete is the list of backups not
+        kept, in the order of {backups}
+        """
+        ordered = sorted(backups, key=lambda b: b.end_timestamp or 0, reverse=True)
+        since = None
+        if self.days is not None:
+            since = datetime.timestamp(self.now - timedelta(self.days))
+        policies = (
+            ("daily", self.daily),
+            ("weekly", self.weekly),
+            ("monthly", self.monthly),
+        )
+        seen = {name: set() for name, _ in policies}
+
+        keep = OrderedDict()
+        candidates = 0
+        for backup in ordered:
+            reasons = []
+            if self.incompatible and not backup.compatible:
+                continue
+            if self.incompatible and not self.gfs:
+                reasons.append("compatible")
+            else:
+                if candidates < self.last:
+                    reasons.append(f"last {self.last}")
+                if since is not None and (backup.end_timestamp or 0) >= since:
+                    reasons.append(f"last {self.days}d")
+                if self.gfs and str(backup.status).upper() == RETENTION_STATUS:
+                    for (name, count), bucket in zip(
+                        policies, self._buckets(backup.end_timestamp)
+                    ):
+                        if bucket not in seen[name] and len(seen[name]) < count:
+                            seen[name].add(bucket)
+                            reasons.append(name)
+            candidates += 1
+            if len(reasons) != 0:
+                keep[backup.backup_id] = reasons
+
+        """
+        Minimum keep floor (newest eligible backups first)
+        """
+        if len(keep) < self.min_keep:
+            for backup in ordered:
+                if len(keep) >= self.min_keep:
+                    break
+                if self.incompatible and not backup.compatible:
+                    continue
+                if backup.backup_id not in keep:
+                    keep[backup.backup_id] = [f"min {self.min_keep}"]
+
+        if self.capacity:
+            return self._budget(backups, ordered, keep)
+        delete = [b for b in backups if b.backup_id not in keep]
+        return keep, delete
+
+    def _budget(self, backups, ordered, keep):
+        """
+        Capacity policies over the backups not kept yet, {ordered} newest
+        first: a single pass, oldest incompatible backups first, until the
+        reclaimed bytes meet the budget. Backups without a size don't help
+        and are kept
+        """
+        self.total = sum(b.get("backup_size") or 0 for b in ordered)
+        self.needed = 0
+        if self.max_total_size is not None:
+            self.needed = self.total - self.max_total_size
+        if self.free_at_least is not None:
+            self.needed = max(self.needed, self.free_at_least)
+        self.reclaimed = 0
+
+        incompatible, compatible = [], []
+        for backup in reversed(ordered):
+            if backup.backup_id not in keep:
+                (compatible if backup.compatible else incompatible).append(backup)
+        deleted = set()
+        for backup in incompatible + compatible:
+            size = backup.get("backup_size") or 0
+            if self.reclaimed >= self.needed or size == 0:
+                keep[backup.backup_id] = ["capacity"]
+                continue
+            deleted.add(backup.backup_id)
+            self.reclaimed += size
+
+        delete = [b for b in backups if b.backup_id in deleted]
+        return keep, delete
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from ciscodnacbackupctl.metrics import Metrics
+
+""" Retries of an idempotent request (GET, DELETE) after a transient failure """
+DNAC_RETRIES = 3
+""" Backoff of the first retry and the longest one (seconds) """
+DNAC_RETRY_BASE = 1.0
+DNAC_RETRY_CAP = 30.0
+""" Transient failures in a row opening the circuit of a cluster """
+DNAC_CIRCUIT_FAILURES = 5
+""" Circuit open time (seconds), doubled while the trial request fails """
+DNAC_CIRCUIT_COOLDOWN = 30.0
+DNAC_CIRCUIT_COOLDOWN_MAX = 300.0
+""" Response codes retried (503 is throttling, see RateLimiter) """
+TRANSIENT = (500, 502, 504)
+""" Methods safe to send again """
+IDEMPOTENT = ("GET", "DELETE")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpen(Exception):
+    """ Cluster known down, {retry_after} seconds until the next trial """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Retry:
+    """
+    Retry policy: {retries} retries, exponential backoff from {base} up to
+    {cap} seconds with full jitter (random 0-backoff, clients don't retry
+    in lockstep)
+    """
+
+    def __init__(self, retries=DNAC_RETRIES, base=DNAC_RETRY_BASE, cap=DNAC_RETRY_CAP):
+        self.retries = int(retries)
+        self.base = base
+        self.cap = cap
+        self.sleep = time.sleep
+
+    def delay(self, attempt):
+        """ Backoff before retry {attempt} (1, 2, ...) """
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Per cluster circuit breaker, shared by every Api towards it:
+    {failures} transient failures in a row open it, requests then fail
+    fast (CircuitOpen) for {cooldown} seconds, then one trial request is
+    let through (half-open): success closes it, failure (or any error)
+    opens it again for twice as long (up to {max_cooldown})
+    """
+
+    _breakers = {}
+    _breakers_lock = threading.Lock()
+
+    def __init__(
+        self,
+        failures=DNAC_CIRCUIT_FAILURES,
+        cooldown=DNAC_CIRCUIT_COOLDOWN,
+        max_cooldown=DNAC_CIRCUIT_COOLDOWN_MAX,
+        name="",
+    ):
+        self.threshold = int(failures)
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = cooldown
+        self.opened = 0.0
+        self.trial = False
+        self.clock = time.monotonic
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, key, **kwargs):
+        """ Breaker of cluster {key}, created on first use """
+        with cls._breakers_lock:
+            if key not in cls._breakers:
+                cls._breakers[key] = cls(name=key, **kwargs)
+            return cls._breakers[key]
+
+    @classmethod
+    def reset(cls):
+        with cls._breakers_lock:
+            cls._breakers.clear()
+        return
+
+    def check(self):
+        """ Raises CircuitOpen unless a request may be sent now """
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_after = self.opened + self.cooldown - self.clock()
+            if self.state == OPEN and retry_after <= 0:
+                self.state = HALF_OPEN
+                self.trial = False
+            if self.state == HALF_OPEN and not self.trial:
+                self.trial = True
+                return
+            raise CircuitOpen(
+                "Cisco DNA Center {} unavailable (circuit {}, retry in {:.0f}s)".format(
+                    self.name, self.state, max(retry_after, 0)
+                ),
+                max(retry_after, 0),
+            )
+
+    def success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                self.state = CLOSED
+                self.cooldown = self.base_cooldown
+                Metrics.set("dnac_circuit_open", 0, cluster=self.name)
+            self.failures = 0
+        return
+
+    def throttled(self):
+        """
+        Throttled (429/503) trial: the cluster answered but didn't decide
+        the trial, the next request is the trial again
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.trial = False
+        return
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            elif self.state == OPEN or self.failures < self.threshold:
+                return
+            self.state = OPEN
+            self.opened = self.clock()
+            self.trial = False
+            Metrics.inc("dnac_circuit_open_total", cluster=self.name)
+            Metrics.set("dnac_circuit_open", 1, cluster=self.name)
+        return
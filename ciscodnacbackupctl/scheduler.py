@@ -0,0 +1,294 @@
+import random
+import select
+import signal
+import socket
+import time
+from datetime import datetime, timedelta
+from rich.console import Console
+from ciscodnacbackupctl.metrics import Metrics
+
+""" Longest sleep (seconds), wall clock changes (DST, NTP) are picked up after it """
+DNAC_SCHEDULER_MAX_SLEEP = 3600
+""" Failed job retried after this (seconds), doubled per failure up to the max """
+DNAC_JOB_RETRY = 60
+DNAC_JOB_RETRY_MAX = 3600
+
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MONTHS = {
+    name: i + 1
+    for i, name in enumerate(
+        "jan feb mar apr may jun jul aug sep oct nov dec".split()
+    )
+}
+WEEKDAYS = {
+    name: i for i, name in enumerate("sun mon tue wed thu fri sat".split())
+}
+
+
+class Cron:
+    """
+    Cron expression (minute hour day-of-month month day-of-week) in local
+    time: lists, ranges, steps, names (jan, mon) and @daily style macros.
+    Like cron, a day matches either field when both days are restricted
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise Exception(
+                f"Invalid cron expression '{expression}' (minute hour day month weekday)"
+            )
+        try:
+            self.minutes = self._field(fields[0], 0, 59)
+            self.hours = self._field(fields[1], 0, 23)
+            self.days = self._field(fields[2], 1, 31)
+            self.months = self._field(fields[3], 1, 12, MONTHS)
+            """ 0 and 7 are Sunday """
+            self.weekdays = frozenset(
+                d % 7 for d in self._field(fields[4], 0, 7, WEEKDAYS)
+            )
+        except ValueError as error:
+            raise Exception(f"Invalid cron expression '{expression}' ({error})")
+        self.any_day = fields[2] in ("*", "?")
+        self.any_weekday = fields[4] in ("*", "?")
+
+    def __repr__(self):
+        return f"Cron({self.expression!r})"
+
+    @staticmethod
+    def _field(text, low, high, names=None):
+        def value(name):
+            if names is not None and name in names:
+                return names[name]
+            return int(name)
+
+        values = set()
+        for item in text.lower().split(","):
+            step = None
+            if "/" in item:
+                item, step = item.split("/", 1)
+                step = int(step)
+            if item in ("*", "?"):
+                start, end = low, high
+            elif "-" in item:
+                start, end = (value(v) for v in item.split("-", 1))
+            else:
+                start = value(item)
+                end = high if step is not None else start
+            if start < low or end > high or start > end or (step or 1) < 1:
+                raise ValueError(f"'{text}' out of {low}-{high}")
+            values.update(range(start, end + 1, step or 1))
+        return frozenset(values)
+
+    @classmethod
+    def interval(cls, interval, day="monday", time="23:00"):
+        """ Cron of the schedule_purge --interval daily/weekly --day --hour """
+        hour, minute = (int(v) for v in time.split(":"))
+        if interval.lower() == "daily":
+            return cls(f"{minute} {hour} * * *")
+        if interval.lower() == "weekly":
+            return cls(f"{minute} {hour} * * {day.lower()[:3]}")
+        raise Exception(f"Invalid interval '{interval}' (daily, weekly)")
+
+    def _day(self, t):
+        weekday = (t.weekday() + 1) % 7
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday in self.weekdays
+        if self.any_weekday:
+            return t.day in self.days
+        return t.day in self.days or weekday in self.weekdays
+
+    def next(self, after):
+        """ First matching minute after {after} (naive local datetime) """
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        """ Feb 29 only matches every 4 years, 30 Feb never """
+        limit = t + timedelta(days=5 * 366)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1) + timedelta(days=32)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self._day(t):
+                t = (t + timedelta(days=1)).replace(hour=0, minute=0)
+            elif t.hour not in self.hours:
+                t = (t + timedelta(hours=1)).replace(minute=0)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise Exception(f"Cron expression '{self.expression}' never matches")
+
+
+class Job:
+    """
+    Scheduled function, runs at its cron times delayed by up to {jitter}s
+    A failed run is retried early (backoff, or once the circuit of the
+    cluster closes) instead of waiting for the next cron time
+    """
+
+    def __init__(self, name, cron, func, jitter=0):
+        self.name = name
+        self.cron = cron if isinstance(cron, Cron) else Cron(cron)
+        self.func = func
+        self.jitter = jitter
+        self.next_run = None
+        self.runs = 0
+        self.failures = 0
+
+    def plan(self, now, error=None):
+        self.next_run = self.cron.next(now) + timedelta(
+            seconds=random.uniform(0, self.jitter)
+        )
+        if error is None:
+            self.failures = 0
+            return self.next_run
+        self.failures += 1
+        delay = min(DNAC_JOB_RETRY * 2 ** (self.failures - 1), DNAC_JOB_RETRY_MAX)
+        """ CircuitOpen: not before the trial request is let through """
+        delay = max(delay, getattr(error, "retry_after", 0))
+        self.next_run = min(self.next_run, now + timedelta(seconds=delay))
+        return self.next_run
+
+
+class Scheduler:
+    """
+    Runs jobs at their cron times, sleeping until the next one is due
+    instead of polling. Signals wake it immediately: SIGTERM/SIGINT stop
+    (after the running job), SIGHUP re-plans every job (clock changes),
+    SIGUSR1 runs every job now
+
+    Handlers only set flags and write a byte to a socket pair the wait
+    selects on (self-pipe): no lock is taken in a signal handler
+    """
+
+    def __init__(self):
+        self.jobs = []
+        self.stopped = False
+        self.pending = set()
+        self.wakeups = 0
+        self._wakeup, self._notify = socket.socketpair()
+        self._wakeup.setblocking(False)
+        self._notify.setblocking(False)
+        self.now = datetime.now
+
+    def add(self, name, cron, func, jitter=0):
+        job = Job(name, cron, func, jitter=jitter)
+        job.plan(self.now())
+        self.jobs.append(job)
+        return job
+
+    def handle(self, signum, frame=None):
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            self.stopped = True
+        elif signum == getattr(signal, "SIGHUP", None):
+            self.pending.add("plan")
+        elif signum == getattr(signal, "SIGUSR1", None):
+            self.pending.add("run")
+        self.notify()
+        return
+
+    def notify(self):
+        """ Wake the wait up (signal handlers, other threads) """
+        try:
+            self._notify.send(b"\0")
+        except OSError:
+            """ Buffer full, a wakeup is pending already """
+            pass
+        return
+
+    def wait(self, delay):
+        """ Sleep {delay} seconds or until notified """
+        select.select([self._wakeup], [], [], delay)
+        return
+
+    def _drain(self):
+        try:
+            while self._wakeup.recv(4096):
+                pass
+        except OSError:
+            pass
+        return
+
+    def signals(self):
+        """ Install the handlers (main thread of the daemon process) """
+        for name in ("SIGTERM", "SIGINT", "SIGHUP", "SIGUSR1"):
+            if hasattr(signal, name):
+                signal.signal(getattr(signal, name), self.handle)
+        return
+
+    def stop(self):
+        self.stopped = True
+        self.notify()
+        return
+
+    def run_job(self, job):
+        console = Console()
+        start = time.monotonic()
+        error = None
+        try:
+            job.func()
+            result = "success"
+        except Exception as error_msg:
+            console.log(f"Job {job.name} failed - {error_msg}", style="red")
+            result = "failure"
+            error = error_msg
+        job.runs += 1
+        Metrics.inc("dnac_job_runs_total", job=job.name, result=result)
+        Metrics.observe(
+            "dnac_job_duration_seconds", time.monotonic() - start, job=job.name
+        )
+        job.plan(self.now(), error=error)
+        if error is not None:
+            console.log(
+                f"Job {job.name} retry {job.failures} at {job.next_run:%Y-%m-%d %H:%M:%S}"
+            )
+            return
+        console.log(f"Job {job.name} next run {job.next_run:%Y-%m-%d %H:%M:%S}")
+        return
+
+    def run(self):
+        console = Console()
+        for job in self.jobs:
+            console.log(
+                f"Job {job.name} ({job.cron.expression}) next run "
+                f"{job.next_run:%Y-%m-%d %H:%M:%S}"
+            )
+        while not self.stopped:
+            """ Drained before looking, a signal from now on cuts the wait short """
+            self._drain()
+            if "plan" in self.pending:
+                self.pending.discard("plan")
+                for job in self.jobs:
+                    job.plan(self.now())
+            if "run" in self.pending:
+                self.pending.discard("run")
+                for job in self.jobs:
+                    if not self.stopped:
+                        self.run_job(job)
+                continue
+            now = self.now()
+            due = [job for job in self.jobs if job.next_run <= now]
+            for job in sorted(due, key=lambda j: j.next_run):
+                if not self.stopped:
+                    self.run_job(job)
+            if len(due) != 0:
+                continue
+            delay = DNAC_SCHEDULER_MAX_SLEEP
+            if len(self.jobs) != 0:
+                next_run = min(job.next_run for job in self.jobs)
+                delay = min(max((next_run - now).total_seconds(), 0), delay)
+            self.wait(delay)
+            self.wakeups += 1
+            Metrics.inc("dnac_scheduler_wakeups_total")
+        return
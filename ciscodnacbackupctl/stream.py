@@ -0,0 +1,249 @@
+import re
+import sys
+import json
+import codecs
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+SCALAR = re.compile(r"[^,\]} \t\n\r]+")
+""" String and the separators after it, or an unterminated one at the end """
+_STRING = r'"[^"\\]*+(?:\\.[^"\\]*+)*+(?:"[^"\[\]{}]*+|\\?\Z)'
+""" Nesting levels of a container skipped by one regex match """
+SKIP_DEPTH = 32
+
+
+def _container(depth):
+    """
+    Array/object nested up to {depth} levels (brackets and strings only,
+    the values aren't checked), or its start up to the end of the buffer
+    """
+    inner = r'(?:%s|[^"\[\]{}]++)*+' % _STRING
+    for _ in range(depth - 1):
+        inner = r'(?:%s|[^"\[\]{}]++|[\[{]%s(?:[\]}]|\Z))*+' % (_STRING, inner)
+    return re.compile(r"[\[{]%s(?:[\]}]|\Z)" % inner)
+
+
+""" Possessive quantifiers (no backtracking) need Python 3.11 """
+CONTAINER = _container(SKIP_DEPTH) if sys.version_info >= (3, 11) else None
+""" Anything up to the next bracket, strings included (their brackets too) """
+BRACKETS = re.compile(r'(?:[^"\[\]{}]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+""" Bytes read per chunk from the HTTP response """
+CHUNK_SIZE = 65536
+
+
+class _Incomplete(Exception):
+    """More data needed"""
+
+
+class StreamParser:
+    """
+    Incremental JSON parser for Cisco DNA Center responses
+    {"version": ..., "response": [{...}, {...}]}
+
+    Each item in {key} is projected while parsing: only {fields} are kept
+    (or everything except {exclude}), the other values are skipped and
+    never kept, so memory is bounded by one item instead of the response.
+    Top-level scalars (version) are kept, other top-level values skipped.
+    """
+
+    def __init__(self, fields=None, exclude=None, key="response"):
+        self.fields = set(fields) if fields is not None else None
+        self.exclude = set(exclude or [])
+        self.key = key
+        self.data = {}
+        self.buf = ""
+        self.pos = 0
+        self.state = "start"
+        self._decoder = json.JSONDecoder()
+        self._final = False
+        self._pending = []
+        self._pending_size = 0
+        self._need = 0
+
+    def _wanted(self, k):
+        if self.fields is not None:
+            return k in self.fields
+        return k not in self.exclude
+
+    def _ws(self, pos):
+        pos = WHITESPACE.match(self.buf, pos).end()
+        if pos >= len(self.buf):
+            raise _Incomplete
+        return pos
+
+    def _string(self, pos):
+        m = STRING.match(self.buf, pos)
+        if m is None:
+            if self.buf[pos] != '"':
+                raise ValueError(f"Expecting string at {pos}")
+            raise _Incomplete
+        return json.loads(m.group()), m.end()
+
+    def _value(self, pos):
+        """ Decode a complete value (numbers/literals need their delimiter) """
+        if self.buf[pos] not in '"[{':
+            m = SCALAR.match(self.buf, pos)
+            if m is None or (m.end() >= len(self.buf) and not self._final):
+                raise _Incomplete
+            return json.loads(m.group()), m.end()
+        try:
+            value, end = self._decoder.raw_decode(self.buf, pos)
+        except json.JSONDecodeError:
+            if self._final:
+                raise
+            raise _Incomplete
+        if end >= len(self.buf) and not self._final:
+            raise _Incomplete
+        return value, end
+
+    def _skip(self, pos):
+        """
+        Skip a value without building it: strings and scalars are only
+        scanned, containers matched by CONTAINER (deeper ones bracket by
+        bracket), nothing is allocated for what is skipped
+        """
+        c = self.buf[pos]
+        if c == '"':
+            return self._string_end(pos)
+        if c not in "[{":
+            m = SCALAR.match(self.buf, pos)
+            if m is None or (m.end() >= len(self.buf) and not self._final):
+                raise _Incomplete
+            return m.end()
+        m = CONTAINER.match(self.buf, pos) if CONTAINER is not None else None
+        if m is None:
+            return self._container_end(pos)
+        if m.end() >= len(self.buf) and not self._final:
+            raise _Incomplete
+        return m.end()
+
+    def _container_end(self, pos):
+        """ End of the array/object at {pos}, one regex match between brackets """
+        buf = self.buf
+        depth = 0
+        while True:
+            if buf[pos] in "[{":
+                depth += 1
+            elif buf[pos] in "]}":
+                depth -= 1
+                if depth == 0:
+                    return pos + 1
+            elif self._final:
+                raise ValueError(f"Unterminated string at {pos}")
+            else:
+                raise _Incomplete
+            pos = BRACKETS.match(buf, pos + 1).end()
+            if pos >= len(buf):
+                raise _Incomplete
+
+    def _string_end(self, pos):
+        m = STRING.match(self.buf, pos)
+        if m is None:
+            raise _Incomplete
+        return m.end()
+
+    def _item(self, pos):
+        """ One projected item of the {key} array """
+        if self.buf[pos] != "{":
+            return self._value(pos)
+        item = {}
+        pos = self._ws(pos + 1)
+        if self.buf[pos] == "}":
+            return item, pos + 1
+        while True:
+            k, pos = self._string(self._ws(pos))
+            pos = self._ws(pos)
+            if self.buf[pos] != ":":
+                raise ValueError(f"Expecting ':' at {pos}")
+            pos = self._ws(pos + 1)
+            if self._wanted(k):
+                item[k], pos = self._value(pos)
+            else:
+                pos = self._skip(pos)
+            pos = self._ws(pos)
+            if self.buf[pos] == "}":
+                return item, pos + 1
+            if self.buf[pos] != ",":
+                raise ValueError(f"Expecting ',' at {pos}")
+            pos += 1
+
+    def _step(self):
+        """ Parse one unit from the committed position """
+        pos = self._ws(self.pos)
+        c = self.buf[pos]
+        if self.state == "start":
+            if c != "{":
+                raise ValueError("Expecting JSON object")
+            self.state = "key"
+            return pos + 1
+        if self.state == "key":
+            if c == "}":
+                self.state = "done"
+                return pos + 1
+            if c == ",":
+                pos = self._ws(pos + 1)
+            k, pos = self._string(pos)
+            pos = self._ws(pos)
+            if self.buf[pos] != ":":
+                raise ValueError(f"Expecting ':' at {pos}")
+            pos = self._ws(pos + 1)
+            if k == self.key and self.buf[pos] == "[":
+                self.data[k] = []
+                self.state = "array"
+                return pos + 1
+            if k == self.key or self.buf[pos] not in "[{":
+                self.data[k], pos = self._value(pos)
+            else:
+                pos = self._skip(pos)
+            return pos
+        if self.state == "array":
+            if c == "]":
+                self.state = "key"
+                return pos + 1
+            if c == ",":
+                pos = self._ws(pos + 1)
+            item, pos = self._item(pos)
+            self.data[self.key].append(item)
+            return pos
+        raise ValueError("Extra data after JSON object")
+
+    def feed(self, text):
+        """
+        Buffered until the unparsed data doubled since the last incomplete
+        attempt, so large items are re-scanned O(log n) times, not per chunk
+        """
+        self._pending.append(text)
+        self._pending_size += len(text)
+        unparsed = len(self.buf) - self.pos + self._pending_size
+        if unparsed < self._need and not self._final:
+            return
+        self.buf = self.buf[self.pos :] + "".join(self._pending)
+        self.pos = 0
+        self._pending = []
+        self._pending_size = 0
+        while self.state != "done":
+            try:
+                self.pos = self._step()
+            except _Incomplete:
+                self._need = 2 * (len(self.buf) - self.pos)
+                break
+        return
+
+    def close(self):
+        self._final = True
+        self.feed("")
+        if self.state != "done":
+            raise ValueError("Incomplete JSON response")
+        return self.data
+
+    @classmethod
+    def parse(cls, chunks, **kwargs):
+        """
+        Parse an iterable of bytes chunks (utf-8)
+        """
+        parser = cls(**kwargs)
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for chunk in chunks:
+            parser.feed(decoder.decode(chunk))
+        parser.feed(decoder.decode(b"", final=True))
+        return parser.close()
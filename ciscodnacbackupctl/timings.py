@@ -0,0 +1,166 @@
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from ciscodnacbackupctl.metrics import Metrics
+
+""" Phases spent on the network, the rest of the wall time is client side """
+NETWORK_PHASES = ("dns", "connect", "tls", "ttfb", "body")
+
+
+class Timings:
+    """
+    Per-phase timings of a command (--timings)
+    config, auth, every HTTP call (dns, connect, tls, ttfb, body), json
+    decode/stream parse, records, sort, retention and Format rendering
+    """
+
+    enabled = False
+    _lock = threading.Lock()
+    _phases = []
+    _local = threading.local()
+    _start = None
+    _instrumented = False
+
+    @classmethod
+    def enable(cls):
+        cls.enabled = True
+        cls._phases = []
+        cls._start = time.perf_counter()
+        cls._instrument()
+        return
+
+    @classmethod
+    def add(cls, name, seconds, detail=""):
+        with cls._lock:
+            cls._phases.append((name, detail, seconds))
+        return
+
+    @classmethod
+    @contextmanager
+    def phase(cls, name, detail=""):
+        if not cls.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.add(name, time.perf_counter() - start, detail)
+
+    @staticmethod
+    def request(method, url):
+        """ Detail of HTTP phases, ids collapsed so calls aggregate """
+        return "{} {}".format(method, Metrics.endpoint(url))
+
+    @classmethod
+    def _setup(cls, seconds=None):
+        """
+        Connection setup (dns/connect/tls) of this thread since the last
+        response, requests counts it in response.elapsed
+        """
+        total = getattr(cls._local, "setup", 0.0)
+        if seconds is None:
+            cls._local.setup = 0.0
+            return total
+        cls._local.setup = total + seconds
+        return total
+
+    @classmethod
+    def response_hook(cls, response, *args, **kwargs):
+        """ requests.Session response hook: time to first byte """
+        if cls.enabled:
+            detail = cls.request(response.request.method, response.request.url)
+            ttfb = response.elapsed.total_seconds() - cls._setup()
+            cls.add("ttfb", max(ttfb, 0.0), detail)
+        return response
+
+    @classmethod
+    def _instrument(cls):
+        """
+        Wrap urllib3/socket connection setup (only once --timings is on)
+        """
+        if cls._instrumented:
+            return
+        import urllib3.connection
+        import urllib3.util.connection
+
+        def timed(name, func):
+            def wrapper(*args, **kwargs):
+                if not cls.enabled:
+                    return func(*args, **kwargs)
+                before = cls._setup(0.0)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    """ Nested setup (dns in connect) isn't counted twice """
+                    nested = cls._setup(0.0) - before
+                    cls.add(name, elapsed - nested)
+                    cls._setup(elapsed - nested)
+
+            return wrapper
+
+        socket.getaddrinfo = timed("dns", socket.getaddrinfo)
+        urllib3.util.connection.create_connection = timed(
+            "connect", urllib3.util.connection.create_connection
+        )
+        for name in ("_ssl_wrap_socket_and_match_hostname", "ssl_wrap_socket"):
+            if hasattr(urllib3.connection, name):
+                setattr(
+                    urllib3.connection,
+                    name,
+                    timed("tls", getattr(urllib3.connection, name)),
+                )
+                break
+        cls._instrumented = True
+        return
+
+    @classmethod
+    def summary(cls):
+        """
+        [(phase, detail, calls, total, max)] in first seen order
+        and (wall, network) seconds
+        """
+        with cls._lock:
+            phases = list(cls._phases)
+        rows = OrderedDict()
+        for name, detail, seconds in phases:
+            row = rows.setdefault((name, detail), [0, 0.0, 0.0])
+            row[0] += 1
+            row[1] += seconds
+            row[2] = max(row[2], seconds)
+        wall = time.perf_counter() - (cls._start or time.perf_counter())
+        network = sum(s for name, _, s in phases if name in NETWORK_PHASES)
+        return [(k[0], k[1], *v) for k, v in rows.items()], (wall, network)
+
+    @classmethod
+    def report(cls, file=None):
+        from tabulate import tabulate
+
+        rows, (wall, network) = cls.summary()
+        table = [
+            [name, detail, calls, "{:.1f}".format(total * 1e3), "{:.1f}".format(top * 1e3)]
+            for name, detail, calls, total, top in rows
+        ]
+        file = file or sys.stderr
+        print(
+            tabulate(
+                table,
+                ["PHASE", "DETAIL", "CALLS", "TOTAL MS", "MAX MS"],
+                tablefmt="plain",
+                disable_numparse=True,
+            ),
+            file=file,
+        )
+        print(
+            "Wall {:.1f} ms, network {:.1f} ms (dns/connect/tls/ttfb/body, "
+            "summed over threads), streamed bodies are in 'stream parse'".format(
+                wall * 1000, network * 1000
+            ),
+            file=file,
+        )
+        return
@@ -0,0 +1,139 @@
+import os
+import json
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from ciscodnacbackupctl import config
+
+try:
+    import fcntl
+except ImportError:
+    """ Windows, the cache is only locked between threads """
+    fcntl = None
+
+""" Cisco DNA Center tokens are valid for 60 minutes """
+DNAC_TOKEN_TTL = 3600
+""" Re-authenticate when the cached token has less than this left (seconds) """
+DNAC_TOKEN_MARGIN = 300
+
+
+class TokenCache:
+    """
+    On-disk cache of Cisco DNA Center auth tokens (~/.ciscodnac/token.json)
+    One entry per hostname/username, readable only by the current user
+    Updates (read, modify, replace) are serialized between threads and
+    processes (flock on token.json.lock)
+    """
+
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enabled(settings):
+        return settings["dnac"].get("token_cache", True) is not False
+
+    @staticmethod
+    def _key(settings):
+        return "{}|{}".format(settings["dnac"]["hostname"], settings["dnac"]["username"])
+
+    @classmethod
+    def _load(cls):
+        try:
+            with open(config.DNAC_FULL_TOKEN_CACHE_PATH, "r") as f:
+                data = json.loads(f.read())
+            if isinstance(data, dict):
+                return data
+        except Exception:
+            pass
+        return {}
+
+    @staticmethod
+    def _folder():
+        folder = os.path.dirname(config.DNAC_FULL_TOKEN_CACHE_PATH)
+        if os.path.exists(folder) is False:
+            os.makedirs(folder, mode=0o700, exist_ok=True)
+        return folder
+
+    @classmethod
+    @contextmanager
+    def _locked(cls):
+        """ One update of the cache at a time (threads, then processes) """
+        with cls._lock:
+            if fcntl is None:
+                yield
+                return
+            cls._folder()
+            path = config.DNAC_FULL_TOKEN_CACHE_PATH + ".lock"
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    @classmethod
+    def _save(cls, data):
+        """
+        Write cache atomically with 0600 permissions (mkstemp creates it so)
+        """
+        path = config.DNAC_FULL_TOKEN_CACHE_PATH
+        fd, tmp = tempfile.mkstemp(
+            dir=cls._folder(), prefix=os.path.basename(path) + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json.dumps(data, indent=4))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return
+
+    @classmethod
+    def read(cls, settings, margin=DNAC_TOKEN_MARGIN):
+        """
+        Cached token, as long as it isn't close to expiring
+        """
+        if not cls.enabled(settings):
+            return False, "Token cache disabled"
+        entry = cls._load().get(cls._key(settings))
+        if entry is None:
+            return False, "No cached token"
+        expires = entry.get("issued", 0) + entry.get("ttl", DNAC_TOKEN_TTL)
+        if time.time() >= expires - margin:
+            return False, "Cached token expired"
+        return True, entry["token"]
+
+    @classmethod
+    def expires(cls, settings):
+        """ Expiry (unix time) of the cached token, 0 if none """
+        entry = cls._load().get(cls._key(settings))
+        if entry is None:
+            return 0
+        return entry.get("issued", 0) + entry.get("ttl", DNAC_TOKEN_TTL)
+
+    @classmethod
+    def write(cls, settings, token, ttl=DNAC_TOKEN_TTL):
+        if not cls.enabled(settings):
+            return False, "Token cache disabled"
+        entry = {"token": token, "issued": time.time(), "ttl": ttl}
+        try:
+            with cls._locked():
+                data = cls._load()
+                data[cls._key(settings)] = entry
+                cls._save(data)
+        except Exception as e:
+            return False, f"Can't update token cache ({e})"
+        return True, "Success"
+
+    @classmethod
+    def clear(cls, settings):
+        try:
+            with cls._locked():
+                data = cls._load()
+                if data.pop(cls._key(settings), None) is None:
+                    return False, "No cached token"
+                cls._save(data)
+        except Exception as e:
+            return False, f"Can't update token cache ({e})"
+        return True, "Success"
@@ -0,0 +1,121 @@
+import json
+import re
+import threading
+import time
+
+""" Body bytes kept per request/response in the trace """
+DNAC_TRACE_BODY_MAX = 64 * 1024
+""" Trace file size before it is rotated, rotated files kept """
+DNAC_TRACE_MAX_BYTES = 10 * 1024 * 1024
+DNAC_TRACE_BACKUPS = 3
+""" Headers and body values never written """
+REDACTED_HEADERS = ("x-auth-token", "authorization", "cookie", "set-cookie")
+REDACTED_BODY = re.compile(r'("(?:Token|password)"\s*:\s*)"[^"]*"', re.IGNORECASE)
+REDACTED = "<redacted>"
+
+
+class Trace:
+    """
+    Structured HTTP trace (--trace FILE): one JSON line per response with
+    timing, status, headers (credentials redacted) and bodies capped to
+    {max_body} bytes, written to a rotating file instead of stdout.
+    Costs one attribute check per response while disabled
+    """
+
+    enabled = False
+    max_body = DNAC_TRACE_BODY_MAX
+    _logger = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def enable(
+        cls,
+        path,
+        max_body=DNAC_TRACE_BODY_MAX,
+        max_bytes=DNAC_TRACE_MAX_BYTES,
+        backups=DNAC_TRACE_BACKUPS,
+    ):
+        import logging
+        from logging.handlers import RotatingFileHandler
+
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger = logging.getLogger(__name__)
+        for previous in list(logger.handlers):
+            logger.removeHandler(previous)
+            previous.close()
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        cls._logger = logger
+        cls.max_body = max_body
+        cls.enabled = True
+        return
+
+    @classmethod
+    def disable(cls):
+        cls.enabled = False
+        if cls._logger is not None:
+            for handler in list(cls._logger.handlers):
+                cls._logger.removeHandler(handler)
+                handler.close()
+        return
+
+    @staticmethod
+    def headers(headers):
+        return {
+            k: REDACTED if k.lower() in REDACTED_HEADERS else v
+            for k, v in headers.items()
+        }
+
+    @classmethod
+    def body(cls, data, size=None):
+        """ (text capped to max_body, size in bytes) """
+        if data is None:
+            return None, 0
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        size = len(data) if size is None else size
+        text = data[: cls.max_body].decode("utf-8", errors="replace")
+        return REDACTED_BODY.sub(r'\1"{}"'.format(REDACTED), text), size
+
+    @classmethod
+    def record(cls, response, stream=False):
+        request = response.request
+        elapsed = response.elapsed.total_seconds()
+        request_body, request_size = cls.body(request.body)
+        entry = {
+            "time": round(time.time() - elapsed, 3),
+            "method": request.method,
+            "url": request.url,
+            "status": response.status_code,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "request": {
+                "headers": cls.headers(request.headers),
+                "body": request_body,
+                "size": request_size,
+            },
+            "response": {"headers": cls.headers(response.headers)},
+        }
+        if stream:
+            """ Body left to the streaming parser """
+            entry["response"]["body"] = None
+            entry["response"]["streamed"] = True
+        else:
+            body, size = cls.body(response.content)
+            entry["response"]["body"] = body
+            entry["response"]["size"] = size
+            entry["response"]["truncated"] = size > cls.max_body
+        return entry
+
+    @classmethod
+    def response_hook(cls, response, *args, **kwargs):
+        """ requests.Session response hook """
+        if not cls.enabled:
+            return response
+        entry = cls.record(response, stream=kwargs.get("stream", False))
+        with cls._lock:
+            cls._logger.info(json.dumps(entry, default=str))
+        return response
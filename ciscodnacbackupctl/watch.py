@@ -0,0 +1,269 @@
+import shutil
+import sys
+import time
+from datetime import timedelta
+from hurry.filesize import size
+from rich.console import Console
+from ciscodnacbackupctl.format import Format
+
+""" Backup task statuses still running """
+RUNNING = ("IN_PROGRESS", "PENDING")
+""" Exit codes of --watch """
+WATCH_SUCCESS = 0
+WATCH_FAILURE = 1
+WATCH_TIMEOUT = 2
+
+
+class Watch:
+    """
+    progress/history --watch
+    One Api (pooled session, single auth) polled every {interval} seconds
+    while a backup runs, backing off (x2) up to {max_interval} when idle.
+    On a terminal the view is redrawn in place (only changed rows), piped
+    or with ndjson output only the changed rows are printed.
+    Returns when the tracked backup ({backup_id}, by default the backups
+    running when first seen) finishes: 0 SUCCESS, 1 FAILURE, 2 timeout
+    """
+
+    def __init__(
+        self,
+        cli,
+        source="progress",
+        backup_id=None,
+        interval=2,
+        max_interval=60,
+        timeout=None,
+        output="table",
+        file=None,
+    ):
+        self.cli = cli
+        self.source = source
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.timeout = timeout
+        self.output = output
+        self.file = file or sys.stdout
+        self.tracked = None if backup_id is None else {backup_id}
+        self.finished = {}
+        self.rows = {}
+        self.lines = []
+        self.polls = 0
+        self.sleep = time.sleep
+        self.clock = time.monotonic
+
+    def fetch(self, source=None):
+        if (source or self.source) == "history":
+            return self.cli.api.get_history(fields=Format.HISTORY_COLUMNS)
+        return self.cli.api.get_progress(fields=Format.HISTORY_COLUMNS)
+
+    @staticmethod
+    def key(row):
+        return row.get("id") or row.get("backup_id")
+
+    def update(self, response):
+        """ Keys of the new/changed and removed rows since the last poll """
+        rows = {self.key(row): dict(row.items()) for row in response}
+        changed = [k for k, row in rows.items() if self.rows.get(k) != row]
+        removed = [k for k in self.rows if k not in rows]
+        self.rows = rows
+        return changed, removed
+
+    def _status(self, backup_id):
+        """ Status of a tracked backup, None while running/unknown """
+        for row in self.rows.values():
+            if backup_id in (row.get("id"), row.get("backup_id")):
+                status = row.get("status")
+                return None if status in RUNNING else status
+        if self.source == "progress":
+            """ Finished tasks leave /progress, the result is in /history """
+            for row in self.fetch("history")["response"]:
+                if backup_id in (row.get("id"), row.get("backup_id")):
+                    status = row.get("status")
+                    return None if status in RUNNING else status
+        return None
+
+    def done(self):
+        """ Exit code once every tracked backup finished, otherwise None """
+        if not self.tracked:
+            return None
+        for backup_id in self.tracked - set(self.finished):
+            status = self._status(backup_id)
+            if status is not None:
+                self.finished[backup_id] = status
+        if len(self.finished) < len(self.tracked):
+            return None
+        if all(status == "SUCCESS" for status in self.finished.values()):
+            return WATCH_SUCCESS
+        return WATCH_FAILURE
+
+    def run(self):
+        start = self.clock()
+        interval = None
+        while True:
+            data = self.fetch()
+            self.polls += 1
+            changed, removed = self.update(data["response"])
+            running = [k for k, r in self.rows.items() if r.get("status") in RUNNING]
+            if self.tracked is None and len(running) != 0:
+                self.tracked = set(running)
+            code = self.done()
+            interval = self.next_interval(
+                interval, len(changed) + len(removed) + len(running) != 0
+            )
+            self.draw(data, changed, interval)
+            if code is not None:
+                return self.report(code)
+            elapsed = self.clock() - start
+            if self.timeout is not None and elapsed + interval > self.timeout:
+                self.sleep(max(self.timeout - elapsed, 0))
+                return self.report(WATCH_TIMEOUT)
+            self.sleep(interval)
+
+    def next_interval(self, interval, active):
+        """ {interval} while active, doubling up to {max_interval} when idle """
+        if active:
+            return self.interval
+        return min((interval or self.interval) * 2, self.max_interval)
+
+    def draw(self, data, changed, interval):
+        if self.output != "table":
+            """ Changed rows only (ndjson) """
+            rows = [r for r in data["response"] if self.key(r) in changed]
+            Format.cli(
+                style=self.output,
+                data={"response": rows},
+                source=self.source,
+                file=self.file,
+            )
+            return
+        columns, table = Format.rows(self.source, data)
+        lines = list(Format.lines(table, columns)) if len(table) != 0 else []
+        if not self.file.isatty():
+            previous = set(self.lines)
+            for line in lines:
+                if line not in previous:
+                    self.file.write(line + "\n")
+            self.lines = lines
+            self.file.flush()
+            return
+        status = "{}  poll {}, next in {:g}s, {} running".format(
+            time.strftime("%H:%M:%S"),
+            self.polls,
+            interval,
+            sum(1 for r in self.rows.values() if r.get("status") in RUNNING),
+        )
+        self.redraw(lines + [status])
+        return
+
+    def redraw(self, lines):
+        """ Rewrite the changed lines of the previous draw in place (ANSI) """
+        out = self.file
+        width = shutil.get_terminal_size().columns - 1
+        lines = [line[:width] for line in lines]
+        previous = self.lines
+        if len(previous) != 0:
+            out.write("\x1b[{}F".format(len(previous)))
+        for i, line in enumerate(lines):
+            if i < len(previous) and previous[i] == line:
+                out.write("\x1b[1E")
+            else:
+                out.write("\x1b[2K" + line + "\n")
+        extra = len(previous) - len(lines)
+        if extra > 0:
+            out.write("\x1b[2K\n" * extra)
+            out.write("\x1b[{}F".format(extra))
+        out.flush()
+        self.lines = lines
+        return
+
+    def report(self, code):
+        console = Console(stderr=self.output != "table")
+        if code == WATCH_TIMEOUT:
+            console.log(
+                "Timeout after {}s, still running: {}".format(
+                    self.timeout,
+                    ", ".join(sorted((self.tracked or set()) - set(self.finished)))
+                    or "-",
+                ),
+                style="red",
+            )
+            return code
+        for backup_id, status in self.finished.items():
+            console.log(
+                f"Backup {backup_id} {status}",
+                style="green" if status == "SUCCESS" else "red",
+            )
+        return code
+
+
+class Wait(Watch):
+    """
+    create --wait: follows one backup through progress then history,
+    polling with exponential backoff ({interval} x2 up to {max_interval},
+    never much past the ETA) and logging percent, throughput and ETA
+    """
+
+    def __init__(self, cli, backup_id, **kwargs):
+        super().__init__(cli, source="progress", backup_id=backup_id, **kwargs)
+        self.backup_id = backup_id
+        self.samples = []
+        self.estimated = None
+        self.eta = None
+
+    def next_interval(self, interval, active):
+        interval = self.interval if interval is None else interval * 2
+        interval = min(interval, self.max_interval)
+        if self.eta is not None:
+            interval = min(interval, max(self.eta, self.interval))
+        return interval
+
+    def update(self, response):
+        changed, removed = super().update(response)
+        row = self.row()
+        self.estimated = None if row is None else self.estimate(row)
+        self.eta = None if row is None else self.estimated[2]
+        return changed, removed
+
+    def row(self):
+        for row in self.rows.values():
+            if self.backup_id in (row.get("id"), row.get("backup_id")):
+                return row
+        return None
+
+    def estimate(self, row):
+        """
+        (percent, bytes/s, ETA seconds) from the progress samples, the
+        first sample is measured from the task start_timestamp
+        """
+        percent = float(row.get("progress_in_percentage") or 0)
+        self.samples.append((self.clock(), time.time(), percent))
+        first, last = self.samples[0], self.samples[-1]
+        rate = None
+        if last[2] > first[2] and last[0] > first[0]:
+            rate = (last[2] - first[2]) / (last[0] - first[0])
+        elif row.get("start_timestamp") and percent > 0:
+            elapsed = last[1] - float(row.get("start_timestamp"))
+            rate = percent / elapsed if elapsed > 0 else None
+        if rate is None:
+            return percent, None, None
+        throughput = None
+        if row.get("backup_size"):
+            throughput = rate / 100 * float(row.get("backup_size"))
+        return percent, throughput, max(100 - percent, 0) / rate
+
+    def draw(self, data, changed, interval):
+        console = Console(stderr=self.output != "table")
+        if self.backup_id in self.finished:
+            return
+        row = self.row()
+        if row is None:
+            console.log(f"Backup {self.backup_id} waiting to start")
+            return
+        percent, throughput, eta = self.estimated
+        message = f"Backup {self.backup_id} {row.get('status')} {percent:.0f}%"
+        if throughput is not None:
+            message += f", {size(int(throughput))}/s"
+        if eta is not None:
+            message += f", ETA {timedelta(seconds=int(eta))}"
+        console.log(message)
+        return
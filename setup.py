@@ -22,6 +22,7 @@ setup(
     packages=find_packages(),
     py_modules=["ciscodnacbackupctl"],
     install_requires=requirements,
+    extras_require={"async": ["aiohttp"]},
     entry_points="""
         [console_scripts]
         ciscodnacbackupctl=ciscodnacbackupctl.cli:entry
@@ -1,11 +1,15 @@
 import os
 import sys
 import json
-from unittest.mock import patch
+import signal
+from unittest.mock import patch, AsyncMock
 import unittest
+import tempfile
+import asyncio
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 import ciscodnacbackupctl
+from ciscodnacbackupctl import aio
 
 
 class TestBackend(unittest.TestCase):
@@ -16,6 +20,7 @@ class TestBackend(unittest.TestCase):
     os.environ["DNA_CENTER_USERNAME"] = "mockup-user"
     os.environ["DNA_CENTER_PASSWORD"] = "mockup-pass"
     os.environ["DNA_CENTER_VERIFY"] = "False"
+    os.environ["DNA_CENTER_JOURNAL"] = "False"
 
     @staticmethod
     def mockup_response(data):
@@ -23,6 +28,24 @@ class TestBackend(unittest.TestCase):
             data = json.loads(f.read())
         return data
 
+    @staticmethod
+    def mockup_http(code, data=None):
+        """ requests.Response stand-in for Api.session mocks """
+        from datetime import timedelta
+        from unittest.mock import Mock
+
+        return Mock(
+            status_code=code,
+            ok=code < 400,
+            elapsed=timedelta(seconds=0.1),
+            headers={"Retry-After": "0"},
+            request=Mock(method="GET"),
+            url="https://mockup-dnac/api/system/v1/test",
+            text="{}",
+            content=b"{}",
+            json=lambda: data or {"response": []},
+        )
+
     """Test mockup user with whoami"""
 
     @patch("ciscodnacbackupctl.Api._auth")
@@ -44,7 +67,41 @@ class TestBackend(unittest.TestCase):
             res = cli.list(True)
             self.assertEqual(res, True)
             return
-    
+
+    """ Test list backups as json, ndjson, csv and table """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_list_output(self, auth):
+        import io
+        import csv
+        from contextlib import redirect_stdout
+
+        backups = self.mockup_response("list")["response"]
+        outputs = {}
+        for output in ("json", "ndjson", "csv", "table"):
+            with patch("ciscodnacbackupctl.Api._request") as api:
+                api.return_value = self.mockup_response("list")
+                cli = ciscodnacbackupctl.Api.CLI(output=output)
+                stdout = io.StringIO()
+                with redirect_stdout(stdout):
+                    self.assertEqual(cli.list(True), True)
+                outputs[output] = stdout.getvalue()
+
+        data = json.loads(outputs["json"])
+        self.assertEqual(len(data), len(backups))
+        self.assertNotIn("versions", data[0])
+        self.assertIsInstance(data[0]["end_timestamp"], (int, float))
+        self.assertGreaterEqual(data[0]["end_timestamp"], data[-1]["end_timestamp"])
+        lines = outputs["ndjson"].splitlines()
+        self.assertEqual([json.loads(line) for line in lines], data)
+        rows = list(csv.DictReader(io.StringIO(outputs["csv"])))
+        self.assertEqual([r["backup_id"] for r in rows], [d["backup_id"] for d in data])
+        table = outputs["table"].splitlines()
+        self.assertEqual(len(table), len(backups) + 1)
+        self.assertTrue(table[0].startswith("BACKUP_ID"))
+        self.assertIn(data[0]["backup_id"], table[1])
+        return
+
     """ Test list backups with Debug enabled """
 
     @patch("ciscodnacbackupctl.Api._auth")
@@ -93,6 +150,46 @@ class TestBackend(unittest.TestCase):
             self.assertEqual(res, True)
             return
 
+    """ Test create --wait follows the backup with backoff until it succeeds """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_create_wait(self, auth):
+        from ciscodnacbackupctl.watch import Wait, WATCH_SUCCESS
+
+        backup_id = self.mockup_response("create")["response"]
+        task = dict(self.mockup_response("progress")["response"][0])
+        task.update(status="IN_PROGRESS", start_timestamp=None, backup_size=1000)
+        progress = [dict(task, progress_in_percentage=p) for p in (10.0, 30.0, 50.0)]
+        progress = [{"response": [row]} for row in progress] + [{"response": []}]
+        history = self.mockup_response("history")
+        history["response"][0].update(id=backup_id, backup_id=backup_id)
+        history["response"][0]["status"] = "SUCCESS"
+
+        def request(**kwargs):
+            if kwargs["type"] == "post":
+                return self.mockup_response("create")
+            if kwargs["url"].endswith("/progress"):
+                return progress.pop(0)
+            return json.loads(json.dumps(history))
+
+        clock = [0]
+        with patch("ciscodnacbackupctl.Api._request", side_effect=request):
+            cli = ciscodnacbackupctl.Api.CLI()
+            self.assertEqual(cli.create(name="mockup"), True)
+            self.assertEqual(cli.created, backup_id)
+            wait = Wait(cli, cli.created, interval=2, max_interval=60)
+            wait.sleep = lambda seconds: clock.append(clock[-1] + seconds)
+            wait.clock = lambda: clock[-1]
+            estimates = []
+            draw = wait.draw
+            wait.draw = lambda *args: (estimates.append(wait.estimated), draw(*args))
+            self.assertEqual(wait.run(), WATCH_SUCCESS)
+        """ Backoff 2, 4 (ETA 7s) then 8 capped by the ETA (7.5s) """
+        self.assertEqual(clock[1:], [2, 6, 13.5])
+        self.assertEqual(estimates[1], (30.0, 100.0, 7.0))
+        self.assertEqual(wait.finished, {backup_id: "SUCCESS"})
+        return
+
     """ Test delete one backup """
 
     @patch("ciscodnacbackupctl.Api._auth")
@@ -214,6 +311,1413 @@ class TestBackend(unittest.TestCase):
             delete = delete_patcher.stop()
             return
 
+    """ Test parallel delete keeps going when one delete fails """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_delete_concurrent_partial_failure(self, auth):
+        print("")
+        ok = self.mockup_response("delete")
+        ids = [f"54d7930a-057c-4c41-b35c-30494133234{i}" for i in range(8)]
+
+        def request(**kwargs):
+            if kwargs["url"].endswith(ids[3]):
+                raise Exception("Error: Not found")
+            return ok
+
+        with patch("ciscodnacbackupctl.Api._request") as api:
+            api.side_effect = request
+            cli = ciscodnacbackupctl.Api.CLI()
+            res = cli.delete(ids, concurrency=4)
+            self.assertEqual(res, False)
+            self.assertEqual(api.call_count, 8)
+            self.assertEqual(len(cli.results), 8)
+            self.assertFalse(cli.results[ids[3]]["ok"])
+
+            """ Failed deletes exit 1 (delete, interactive purge) """
+            from click.testing import CliRunner
+            from ciscodnacbackupctl.cli import cli as command
+
+            result = CliRunner().invoke(
+                command, ["delete", "--backup_id", ids[3], ids[0]], obj={}
+            )
+            self.assertEqual(result.exit_code, 1)
+            result = CliRunner().invoke(
+                command, ["delete", "--backup_id", ids[0]], obj={}
+            )
+            self.assertEqual(result.exit_code, 0)
+
+            backups = self.mockup_response("purge")
+            failed = backups["response"][0]["backup_id"]
+
+            def purge(**kwargs):
+                if kwargs["type"] == "get":
+                    return json.loads(json.dumps(backups))
+                if kwargs["url"].endswith(failed):
+                    raise Exception("Error: (Backup is in use)")
+                return ok
+
+            api.side_effect = purge
+            with patch("click.prompt", return_value=True):
+                result = CliRunner().invoke(
+                    command, ["purge", "--keep", "0"], obj={}
+                )
+            self.assertEqual(result.exit_code, 1)
+            return
+
+    """ Test streamed projection of the backup list response """
+
+    def test_stream_parser(self):
+        print("")
+        with open("mockup_data/list.json", "rb") as f:
+            raw = f.read()
+        expected = json.loads(raw)
+        excluded = ciscodnacbackupctl.Api.LIST_EXCLUDED
+        for size in [7, 1024, 65536]:
+            chunks = [raw[i : i + size] for i in range(0, len(raw), size)]
+            data = ciscodnacbackupctl.StreamParser.parse(chunks, exclude=excluded)
+            self.assertEqual(data["version"], expected["version"])
+            for backup, full in zip(data["response"], expected["response"]):
+                self.assertNotIn("backup_services", backup)
+                self.assertEqual(
+                    backup, {k: v for k, v in full.items() if k not in excluded}
+                )
+        data = ciscodnacbackupctl.StreamParser.parse([raw], fields=["backup_id"])
+        self.assertEqual(list(data["response"][0]), ["backup_id"])
+        self.assertRaises(
+            ValueError, ciscodnacbackupctl.StreamParser.parse, [raw[:-10]]
+        )
+
+        """ Skipped values are only scanned, never decoded """
+        parser = ciscodnacbackupctl.StreamParser
+        decoded = []
+        value = parser._value
+
+        def spy(self, pos):
+            decoded.append(self.buf[pos])
+            return value(self, pos)
+
+        with patch.object(parser, "_value", autospec=True, side_effect=spy):
+            data = parser.parse([raw], fields=["backup_id"])
+        self.assertEqual(len(decoded), 1 + len(data["response"]))
+        self.assertNotIn("[", decoded)
+
+        """ Brackets in strings, nesting deeper than one CONTAINER match """
+        from ciscodnacbackupctl import stream
+
+        doc = {
+            "response": [
+                {"id": i, "skip": {"s": '}]"[{\\', "l": [[{}], "]"]}, "deep": []}
+                for i in range(3)
+            ]
+        }
+        doc["response"][1]["deep"] = json.loads("[" * 40 + "1" + "]" * 40)
+        raw = json.dumps(doc).encode("utf-8")
+        for container in [stream.CONTAINER, None]:
+            with patch("ciscodnacbackupctl.stream.CONTAINER", container):
+                for size in [1, 5, 1024]:
+                    chunks = [raw[i : i + size] for i in range(0, len(raw), size)]
+                    data = parser.parse(chunks, exclude=["skip", "deep"])
+                    self.assertEqual(data["response"], [{"id": i} for i in range(3)])
+        self.assertRaises(ValueError, parser.parse, [raw[:-4]], exclude=["skip"])
+        return
+
+    """ Test typed backup records keep a dict view """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_backup_records(self, auth):
+        print("")
+        with patch("ciscodnacbackupctl.Api._request") as api:
+            api.return_value = self.mockup_response("list")
+            data = ciscodnacbackupctl.Api().get(reverse=True)
+        raw = self.mockup_response("list")["response"]
+        backup = data["response"][0]
+        self.assertIsInstance(backup, ciscodnacbackupctl.BackupRecord)
+        self.assertFalse(hasattr(backup, "__dict__"))
+        self.assertEqual(backup.compatible, True)
+        self.assertEqual(backup["compatible"], "TRUE")
+        self.assertAlmostEqual(backup.end.timestamp(), backup.end_timestamp, 5)
+        expected = max(raw, key=lambda k: k["end_timestamp"])
+        self.assertEqual(dict(backup), expected)
+        self.assertEqual(list(backup), sorted(expected))
+        return
+
+    """ Test GFS retention keeps one backup per day/week/month bucket """
+
+    def test_retention_gfs(self):
+        print("")
+        from datetime import datetime, timedelta, timezone
+        from ciscodnacbackupctl.retention import Retention
+
+        now = datetime(2021, 6, 30, 23, 0, tzinfo=timezone.utc)
+        backups = [
+            ciscodnacbackupctl.BackupRecord(
+                backup_id=f"{i:036d}",
+                compatible="TRUE",
+                status="SUCCESS",
+                end_timestamp=(now - timedelta(days=i)).timestamp(),
+            )
+            for i in range(120)
+        ]
+        keep, delete = Retention(
+            keep=2, daily=7, weekly=4, monthly=3, now=now
+        ).apply(backups)
+        self.assertEqual(len(keep) + len(delete), len(backups))
+        self.assertEqual(keep[f"{0:036d}"], ["last 2", "daily", "weekly", "monthly"])
+        self.assertEqual(keep[f"{1:036d}"], ["last 2", "daily"])
+        """ 7 days + 2 older weeks (Jun 20, 13) + 2 older months (May 31, Apr 30) """
+        self.assertEqual(len(keep), 11)
+        self.assertEqual(keep[f"{30:036d}"], ["monthly"])
+
+        keep, delete = Retention(keep=0, min_keep=5, now=now).apply(backups)
+        self.assertEqual(list(keep.values()), [["min 5"]] * 5)
+
+        backups[0] = ciscodnacbackupctl.BackupRecord(
+            backup_id=f"{0:036d}", compatible="FALSE", status="SUCCESS", end_timestamp=0
+        )
+        keep, delete = Retention(incompatible=True, now=now).apply(backups)
+        self.assertEqual([b.backup_id for b in delete], [f"{0:036d}"])
+        return
+
+    """ Test capacity retention deletes the oldest backups down to a budget """
+
+    def test_retention_capacity(self):
+        print("")
+        from ciscodnacbackupctl.retention import Retention, parse_size
+
+        gb = 1024 ** 3
+        self.assertEqual(parse_size("500GB"), 500 * gb)
+        self.assertEqual(parse_size("1.5T"), 1536 * gb)
+        self.assertRaises(ValueError, parse_size, "lots")
+        backups = [
+            ciscodnacbackupctl.BackupRecord(
+                backup_id=f"{i:036d}",
+                compatible="FALSE" if i == 4 else "TRUE",
+                status="SUCCESS",
+                end_timestamp=1600000000 - i * 86400,
+                backup_size=100 * gb,
+            )
+            for i in range(10)
+        ]
+        ids = [b.backup_id for b in backups]
+
+        """ 1000GB used: the incompatible backup goes first, then the oldest """
+        retention = Retention(keep=3, max_total_size="500GB")
+        keep, delete = retention.apply(backups)
+        self.assertEqual([b.backup_id for b in delete], [ids[4]] + ids[6:])
+        self.assertEqual(keep[ids[5]], ["capacity"])
+        self.assertEqual(keep[ids[0]], ["last 3"])
+        self.assertEqual(retention.reclaimed, 500 * gb)
+
+        keep, delete = Retention(keep=3, free_at_least="250GB").apply(backups)
+        self.assertEqual([b.backup_id for b in delete], [ids[4]] + ids[8:])
+        keep, delete = Retention(keep=3, max_total_size="2TB").apply(backups)
+        self.assertEqual(delete, [])
+
+        """ The floor wins over the budget """
+        retention = Retention(keep=0, min_keep=8, max_total_size=0)
+        keep, delete = retention.apply(backups)
+        self.assertEqual(len(delete), 2)
+        self.assertEqual(retention.needed - retention.reclaimed, 800 * gb)
+        return
+
+    """ Test purge explains the kept backups """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_purge_explain(self, auth):
+        print("")
+        with patch("ciscodnacbackupctl.Api._request") as api:
+            api.return_value = self.mockup_response("purge")
+            with patch("ciscodnacbackupctl.Api.CLI.delete") as delete:
+                delete.return_value = None
+                cli = ciscodnacbackupctl.Api().CLI()
+                res = cli.purge(
+                    keep=3, incompatible=False, force=True, explain=True, weekly=2
+                )
+                self.assertEqual(res, True)
+                deleted = delete.call_args[0][0]
+        self.assertEqual(len(cli.kept["response"]) + len(deleted), 15)
+        self.assertNotIn(cli.kept["response"][0]["backup_id"], deleted)
+        return
+
+    """ Test purge plans: one snapshot, saved, applied while unchanged """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_purge_plan(self, auth):
+        print("")
+        from ciscodnacbackupctl.plan import PLAN_FIELDS
+
+        backups = self.mockup_response("purge")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "plan.json")
+            with patch("ciscodnacbackupctl.Api._request") as api:
+                api.side_effect = lambda **kwargs: json.loads(json.dumps(backups))
+                with patch("ciscodnacbackupctl.Api.CLI.delete") as delete:
+                    cli = ciscodnacbackupctl.Api.CLI()
+                    res = cli.purge(keep=3, incompatible=False, force=False, plan=path)
+                    self.assertEqual(res, True)
+                    self.assertEqual(delete.call_count, 0)
+                    planned = cli.purge_plan.ids
+                    self.assertEqual(len(planned), 12)
+
+                    """ Confirmed: validated by a projected list, not a full one """
+                    api.reset_mock()
+                    with patch("click.prompt", return_value=True):
+                        res = cli.purge(keep=3, incompatible=False, force=False)
+                    self.assertEqual(res, True)
+                    self.assertEqual(api.call_count, 2)
+                    self.assertEqual(api.call_args.kwargs["fields"], PLAN_FIELDS)
+                    self.assertEqual(delete.call_args[0][0], planned)
+
+                    """ Saved plan applied on the same backups """
+                    api.reset_mock()
+                    delete.reset_mock()
+                    cli = ciscodnacbackupctl.Api.CLI()
+                    self.assertEqual(cli.apply(path, force=True), True)
+                    self.assertEqual(api.call_count, 1)
+                    self.assertEqual(delete.call_args[0][0], planned)
+
+                    """ A backup size changed since (capacity plans read it) """
+                    delete.reset_mock()
+                    backups["response"][0]["backup_size"] += 1
+                    with self.assertRaises(Exception) as error:
+                        cli.apply(path, force=True)
+                    self.assertIn("changed since the purge plan", str(error.exception))
+                    self.assertEqual(delete.call_count, 0)
+                    backups["response"][0]["backup_size"] -= 1
+
+                    """ A backup was added since, nothing deleted """
+                    new = dict(backups["response"][0], backup_id="new", id="new")
+                    backups["response"].append(new)
+                    with self.assertRaises(Exception) as error:
+                        cli.apply(path, force=True)
+                    self.assertIn("changed since the purge plan", str(error.exception))
+                    self.assertEqual(delete.call_count, 0)
+        return
+
+    """ Test an interrupted purge is resumed from the journal """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_purge_journal(self, auth):
+        print("")
+        from ciscodnacbackupctl.journal import Journal
+
+        ok = self.mockup_response("delete")
+        calls = {"get": 0, "delete": []}
+
+        def interrupted(**kwargs):
+            if kwargs["type"] == "get":
+                calls["get"] += 1
+                return self.mockup_response("purge")
+            calls["delete"].append(kwargs["url"].split("/")[-1])
+            if len(calls["delete"]) == 6:
+                raise KeyboardInterrupt()
+            return ok
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "purge.journal")
+            with patch("ciscodnacbackupctl.Api._request", side_effect=interrupted):
+                cli = ciscodnacbackupctl.Api.CLI()
+                cli.journal = Journal("mockup-dnac", path=path, batch=2)
+                with self.assertRaises(KeyboardInterrupt):
+                    cli.purge(keep=3, incompatible=False, force=True)
+            planned = cli.purge_plan.ids
+            runs, outstanding = Journal("mockup-dnac", path=path).pending()
+            self.assertEqual(len(runs), 1)
+            self.assertEqual(list(outstanding), planned[5:])
+            self.assertIsNone(Journal("other-dnac", path=path).pending())
+
+            """
+            Resumed before listing, a backup already gone counts as deleted,
+            then planned again (nothing left to delete)
+            """
+
+            def resumed(**kwargs):
+                if kwargs["type"] == "get":
+                    calls["get"] += 1
+                    backups = self.mockup_response("purge")
+                    backups["response"] = [
+                        b for b in backups["response"] if b["backup_id"] not in planned
+                    ]
+                    return backups
+                if kwargs["url"].endswith(planned[5]):
+                    raise Exception("Error: Not found (backup)")
+                return ok
+
+            calls["get"] = 0
+            with patch("ciscodnacbackupctl.Api._request", side_effect=resumed):
+                cli = ciscodnacbackupctl.Api.CLI()
+                cli.journal = Journal("mockup-dnac", path=path)
+                res = cli.purge(keep=3, incompatible=False, force=True)
+                self.assertEqual(res, True)
+            self.assertEqual(calls["get"], 1)
+            self.assertEqual(sorted(cli.results), sorted(planned[5:]))
+            self.assertTrue(all(v["ok"] for v in cli.results.values()))
+
+            entries = list(Journal("mockup-dnac", path=path).entries())
+            self.assertEqual([e["event"] for e in entries[:1]], ["plan"])
+            self.assertEqual(entries[-1]["event"], "done")
+            deletes = [e for e in entries if e["event"] == "delete" and e["ok"]]
+            self.assertEqual(sorted(e["id"] for e in deletes), sorted(planned))
+            self.assertIn("seconds", deletes[0])
+            self.assertEqual({e["run"] for e in entries}, set(runs))
+            self.assertIsNone(Journal("mockup-dnac", path=path).pending())
+
+            """ A run of another live process is not interrupted """
+            journal = Journal("mockup-dnac", path=path)
+            journal.plan(planned[:2])
+            journal.close()
+            with patch("os.getpid", return_value=os.getpid() + 1):
+                self.assertIsNone(Journal("mockup-dnac", path=path).pending())
+            journal.resume([journal.run])
+            self.assertEqual(list(journal.pending()[1]), planned[:2])
+            with patch("ciscodnacbackupctl.journal.Journal.running") as running:
+                running.return_value = True
+                self.assertIsNone(journal.pending())
+        return
+
+    """ Test a forced purge with failed deletes fails and stays resumable """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_purge_incomplete(self, auth):
+        print("")
+        from ciscodnacbackupctl.journal import Journal
+        from ciscodnacbackupctl.retry import CircuitOpen
+
+        deletes = []
+
+        def request(**kwargs):
+            if kwargs["type"] == "get":
+                return self.mockup_response("purge")
+            deletes.append(kwargs["url"])
+            if len(deletes) > 4:
+                raise CircuitOpen("Cisco DNA Center unavailable", 30)
+            return self.mockup_response("delete")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "purge.journal")
+            with patch("ciscodnacbackupctl.Api._request", side_effect=request):
+                cli = ciscodnacbackupctl.Api.CLI()
+                cli.journal = Journal("mockup-dnac", path=path)
+                with self.assertRaises(CircuitOpen) as error:
+                    cli.purge(keep=3, incompatible=False, force=True)
+            self.assertEqual(error.exception.retry_after, 30)
+            self.assertIn("8 of 12 backups not deleted", str(error.exception))
+            journal = Journal("mockup-dnac", path=path)
+            runs, outstanding = journal.pending()
+            self.assertEqual(list(outstanding), cli.purge_plan.ids[4:])
+            """ Deletes stopped by the circuit were never sent, not given up """
+            self.assertEqual(journal.given_up, {})
+        return
+
+    """ Test a backup that can't be deleted doesn't stop retention """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_purge_given_up(self, auth):
+        print("")
+        from ciscodnacbackupctl.journal import Journal
+
+        backups = self.mockup_response("purge")
+        stuck = sorted(backups["response"], key=lambda b: b["end_timestamp"])[0]
+        stuck = stuck["backup_id"]
+        deleted = []
+        attempts = []
+
+        def request(**kwargs):
+            if kwargs["type"] == "get":
+                data = json.loads(json.dumps(backups))
+                data["response"] = [
+                    b for b in data["response"] if b["backup_id"] not in deleted
+                ]
+                return data
+            backup_id = kwargs["url"].split("/")[-1]
+            if backup_id == stuck:
+                attempts.append(backup_id)
+                raise Exception("Error: (Backup is in use)")
+            deleted.append(backup_id)
+            return self.mockup_response("delete")
+
+        def purge():
+            cli = ciscodnacbackupctl.Api.CLI()
+            cli.journal = Journal("mockup-dnac", path=path, attempts=3)
+            with self.assertRaises(Exception) as error:
+                cli.purge(keep=3, incompatible=False, force=True)
+            return cli, str(error.exception)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "purge.journal")
+            with patch("ciscodnacbackupctl.Api._request", side_effect=request):
+                cli, error = purge()
+                self.assertIn("1 of 12 backups not deleted", error)
+                self.assertEqual(len(deleted), 11)
+
+                """ Resumed, then planned again: a new backup is purged """
+                new = dict(backups["response"][0], backup_id="f" * 36, id="f" * 36)
+                new["end_timestamp"] = max(
+                    b["end_timestamp"] for b in backups["response"]
+                ) + 1
+                backups["response"].append(new)
+                cli, error = purge()
+                self.assertIn("1 of 2 backups not deleted", error)
+                self.assertEqual(len(deleted), 12)
+                self.assertEqual(len(attempts), 3)
+
+                """ Given up: no longer resumed, retention goes on """
+                cli, error = purge()
+                self.assertIn("1 of 1 backups not deleted", error)
+                self.assertEqual(len(attempts), 4)
+            journal = Journal("mockup-dnac", path=path, attempts=3)
+            self.assertEqual(journal.pending()[1], {})
+            self.assertEqual(journal.given_up, {stuck: 4})
+        return
+
+    """ Test purge metrics and the /metrics endpoint """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_metrics(self, auth):
+        print("")
+        import urllib.request
+        from ciscodnacbackupctl.metrics import Metrics
+
+        def request(**kwargs):
+            if kwargs["type"] == "delete":
+                return self.mockup_response("delete")
+            return self.mockup_response("purge")
+
+        Metrics.reset()
+        with patch("ciscodnacbackupctl.Api._request", side_effect=request):
+            cli = ciscodnacbackupctl.Api().CLI()
+            cli.purge(keep=3, incompatible=False, force=True, concurrency=2)
+        backups = self.mockup_response("purge")["response"]
+        newest = sorted(backups, key=lambda b: b["end_timestamp"])[-3:]
+        reclaimed = sum(b["backup_size"] for b in backups) - sum(
+            b["backup_size"] for b in newest
+        )
+        self.assertEqual(Metrics.get("dnac_backups_deleted_total"), 12)
+        self.assertEqual(Metrics.get("dnac_bytes_reclaimed_total"), reclaimed)
+        self.assertEqual(Metrics.get("dnac_backups"), 3)
+        self.assertEqual(Metrics.get("dnac_purge_failures_total"), 0)
+        self.assertNotEqual(
+            Metrics.get("dnac_purge_last_success_timestamp_seconds"), 0
+        )
+        self.assertEqual(
+            Metrics.endpoint(
+                "https://dnac/api/system/v1/maglev/backup/54d7930a-057c-4c41-b35c-30494133234a"
+            ),
+            "/api/system/v1/maglev/backup/{id}",
+        )
+
+        server = Metrics.serve(0)
+        try:
+            url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+            body = urllib.request.urlopen(url).read().decode("utf-8")
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertIn("# TYPE dnac_purge_duration_seconds histogram", body)
+        self.assertIn('dnac_purge_duration_seconds_bucket{le="+Inf"} 1', body)
+        self.assertIn("dnac_backups_deleted_total 12", body)
+        return
+
+    """ Test --timings phase breakdown """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_timings(self, auth):
+        print("")
+        import io
+        from ciscodnacbackupctl.timings import Timings
+
+        Timings.enable()
+        try:
+            with patch("ciscodnacbackupctl.Api._request") as api:
+                api.return_value = self.mockup_response("purge")
+                with patch("ciscodnacbackupctl.Api.CLI.delete") as delete:
+                    delete.return_value = True
+                    cli = ciscodnacbackupctl.Api.CLI()
+                    cli.purge(keep=3, incompatible=False, force=True)
+            rows, (wall, network) = Timings.summary()
+            out = io.StringIO()
+            Timings.report(file=out)
+        finally:
+            Timings.enabled = False
+        phases = [row[0] for row in rows]
+        for phase in ("config", "records", "sort", "retention", "format"):
+            self.assertIn(phase, phases)
+        self.assertIn("15 BackupRecord", out.getvalue())
+        self.assertEqual(network, 0)
+        return
+
+    """ Test pooled session is shared between clients """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_session_shared(self, auth):
+        print("")
+        first = ciscodnacbackupctl.Api()
+        second = ciscodnacbackupctl.Api.CLI().api
+        self.assertIs(first.session, second.session)
+        return
+
+    """ Test cached token is reused instead of authenticating """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_token_cache(self, auth):
+        print("")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "token.json")
+            with patch("ciscodnacbackupctl.config.DNAC_FULL_TOKEN_CACHE_PATH", path):
+                api = ciscodnacbackupctl.Api()
+                self.assertEqual(auth.call_count, 1)
+                ciscodnacbackupctl.TokenCache.write(api.settings, "mockup-token")
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+                api = ciscodnacbackupctl.Api()
+                self.assertEqual(auth.call_count, 1)
+                self.assertEqual(api.settings["dnac"]["token"], "mockup-token")
+
+                """ Concurrent updates (fleet threads) keep every entry """
+                from concurrent.futures import ThreadPoolExecutor
+
+                def write(i):
+                    settings = {"dnac": dict(api.settings["dnac"], hostname=f"dnac{i}")}
+                    return ciscodnacbackupctl.TokenCache.write(settings, f"token{i}")
+
+                with ThreadPoolExecutor(20) as pool:
+                    results = list(pool.map(write, range(20)))
+                self.assertTrue(all(result[0] for result in results))
+                with open(path) as f:
+                    self.assertEqual(len(json.loads(f.read())), 21)
+                self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+                self.assertEqual(
+                    [f for f in os.listdir(tmp) if f.endswith(".tmp")], []
+                )
+        return
+
+    """ Test the daemon client is reused, refreshed and rebuilt between runs """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_daemon_client(self, auth):
+        print("")
+        from ciscodnacbackupctl.client import Client, STATUS_COLUMNS
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "token.json")
+            status = os.path.join(tmp, "status.json")
+            with patch("ciscodnacbackupctl.config.DNAC_FULL_TOKEN_CACHE_PATH", path):
+                client = Client(status=status, max_failures=2)
+                apis = []
+                for _ in range(3):
+                    client.run("purge", lambda cli: apis.append(cli.api))
+                self.assertEqual(len(set(map(id, apis))), 1)
+                """ Mocked auth sets no expiry, the next runs refresh the token """
+                self.assertEqual(auth.call_count, 3)
+                client.api.token_expires = float("inf")
+                client.run("purge", lambda cli: None)
+                self.assertEqual(auth.call_count, 3)
+
+                session = client.api.session
+
+                def fail(cli):
+                    raise Exception("Boom")
+
+                for _ in range(2):
+                    with self.assertRaises(Exception):
+                        client.run("backup", fail)
+                self.assertIs(client.api.session, session)
+                client.run("backup", lambda cli: None)
+                self.assertIsNot(client.api.session, session)
+                self.assertEqual((client.failures, client.rebuilds), (0, 1))
+
+                res = Client.read(status)
+                self.assertEqual(res[0], True)
+                jobs = {job["job"]: job for job in res[1]["jobs"]}
+                self.assertEqual(jobs["purge"]["runs"], 4)
+                self.assertEqual(jobs["backup"]["runs"], 3)
+                self.assertEqual(jobs["backup"]["result"], "success")
+                self.assertEqual(tuple(jobs["backup"]), STATUS_COLUMNS)
+                self.assertIn("generation", res[1]["config"])
+
+                """ Changed config, new client on the next run """
+                api = client.api
+                client.run("purge", lambda cli: None)
+                self.assertIs(client.api, api)
+                api.config_generation -= 1
+                client.run("purge", lambda cli: None)
+                self.assertIsNot(client.api, api)
+        return
+
+    """ Test the rate limiter: token bucket, AIMD concurrency and Retry-After """
+
+    def test_rate_limiter(self):
+        print("")
+        from datetime import datetime, timezone
+        from ciscodnacbackupctl.ratelimit import RateLimiter, DNAC_RETRY_AFTER
+
+        """ The token bucket is on by default """
+        self.assertEqual(RateLimiter().rate, 20)
+
+        clock = [0.0]
+        limiter = RateLimiter(rate=2, burst=2, max_concurrency=4, latency=5)
+        limiter.clock = lambda: clock[0]
+        limiter._updated = 0.0
+        sent = limiter.acquire()
+        limiter.acquire()
+        self.assertEqual(limiter.delay(), 0.5)
+        clock[0] = 0.5
+        self.assertEqual(limiter.delay(), 0)
+        limiter.acquire()
+        clock[0] = 10.0
+        limiter.acquire()
+        self.assertEqual((limiter.inflight, limiter.limit), (4, 4))
+        """ Concurrency limit reached, tokens left """
+        self.assertIsNone(limiter.delay())
+
+        """ 429: paused for Retry-After, limit halved once per window """
+        self.assertEqual(limiter.release(429, 0.1, "3", sent=sent), 3)
+        self.assertEqual(limiter.release(429, 0.1, None, sent=sent), DNAC_RETRY_AFTER)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.delay(), DNAC_RETRY_AFTER)
+        limiter.release(200, 0.1, sent=sent)
+        clock[0] = 20.0
+        self.assertEqual(limiter.delay(), 0)
+        """ Grows by one per window of fast responses, shrinks when slow """
+        for _ in range(2):
+            limiter.acquire()
+            clock[0] += 1
+            limiter.release(200, 0.1)
+        self.assertEqual(limiter.limit, 3)
+        sent = limiter.acquire()
+        limiter.release(200, 6.0, sent=sent)
+        self.assertEqual(limiter.limit, 1)
+
+        now = datetime(2021, 6, 30, 23, 0, tzinfo=timezone.utc)
+        date = "Wed, 30 Jun 2021 23:00:42 GMT"
+        self.assertEqual(RateLimiter.retry_after(date, now=now), 42)
+        self.assertEqual(RateLimiter.retry_after("bogus"), DNAC_RETRY_AFTER)
+        self.assertEqual(RateLimiter.retry_after("86400"), 300)
+        return
+
+    """ Test throttled requests are sent again """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_throttled_request(self, auth):
+        print("")
+        from unittest.mock import Mock
+        from ciscodnacbackupctl.ratelimit import RateLimiter
+
+        response = self.mockup_http
+        api = ciscodnacbackupctl.Api()
+        api.settings["dnac"]["token"] = "mockup-token"
+        api.limiter = RateLimiter(rate=0, max_concurrency=2)
+        api.session = Mock()
+        api.session.request.side_effect = [response(429), response(503), response(200)]
+        data = api._request(type="get", url="https://mockup-dnac/api/system/v1/test")
+        self.assertEqual(data, {"response": []})
+        self.assertEqual(api.session.request.call_count, 3)
+        self.assertEqual((api.limiter.throttled, api.limiter.inflight), (2, 0))
+
+        api.session.request.side_effect = [response(429)] * 4
+        with self.assertRaises(Exception):
+            api._request(type="auth", url="https://mockup-dnac/auth")
+        return
+
+    """ Test parallel requests rejected with the same token re-authenticate once """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_unauthorized_parallel(self, auth):
+        print("")
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest.mock import Mock
+        from ciscodnacbackupctl.ratelimit import RateLimiter
+
+        workers = 4
+        rejected = threading.Barrier(workers, timeout=5)
+        sent = []
+        api = ciscodnacbackupctl.Api()
+        api.settings["dnac"]["token"] = "expired-token"
+        api.limiter = RateLimiter(rate=0, max_concurrency=workers)
+        api.session = Mock()
+        auth.reset_mock()
+        auth.side_effect = lambda: api.settings["dnac"].update(token="new-token")
+
+        def request(method, url, **kwargs):
+            token = kwargs["headers"]["X-Auth-Token"]
+            sent.append(token)
+            if token == "expired-token":
+                """ Every worker is rejected before any re-authenticates """
+                rejected.wait()
+                return self.mockup_http(401)
+            return self.mockup_http(200, self.mockup_response("delete"))
+
+        api.session.request.side_effect = request
+        url = "https://mockup-dnac/api/system/v1/maglev/backup/{}"
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(
+                pool.map(
+                    lambda i: api._request(type="delete", url=url.format(i)),
+                    range(workers),
+                )
+            )
+        self.assertEqual(auth.call_count, 1)
+        self.assertEqual(sent.count("new-token"), workers)
+        self.assertTrue(all("response" in data for data in results))
+
+        """ Re-authentication of another cluster isn't blocked by this one """
+        other = ciscodnacbackupctl.Api()
+        other.settings["dnac"].update(hostname="other-dnac", token="expired-token")
+        with ciscodnacbackupctl.Api._auth_locks["mockup-dnac"]:
+            thread = threading.Thread(
+                target=other._unauthorized,
+                args=(self.mockup_http(401), {}, "expired-token"),
+            )
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+        return
+
+    """ Test transient failures are retried and the circuit breaker fails fast """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_retry_circuit(self, auth):
+        print("")
+        import requests
+        from unittest.mock import Mock
+        from ciscodnacbackupctl.ratelimit import RateLimiter
+        from ciscodnacbackupctl.retry import Retry, CircuitBreaker, CircuitOpen
+
+        response = self.mockup_http
+        url = "https://mockup-dnac/api/system/v1/maglev/backup/" + "0" * 36
+        clock = [0.0]
+        delays = []
+        api = ciscodnacbackupctl.Api()
+        api.settings["dnac"]["token"] = "mockup-token"
+        api.limiter = RateLimiter(rate=0)
+        api.breaker = CircuitBreaker(failures=3, cooldown=30)
+        api.breaker.clock = lambda: clock[0]
+        api.retry = Retry(retries=2)
+        api.retry.sleep = delays.append
+        api.session = Mock()
+
+        api.session.request.side_effect = [
+            requests.ConnectionError("reset"),
+            response(502),
+            response(200),
+        ]
+        self.assertEqual(api._request(type="get", url=url), {"response": []})
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0 <= delays[1] <= 2)
+        self.assertEqual(api.breaker.failures, 0)
+
+        """ DELETE sent again, 404: the first attempt deleted it """
+        api.session.request.side_effect = [requests.Timeout("read"), response(404)]
+        data = api._request(type="delete", url=url)
+        self.assertEqual(data["response"]["status"], "ok")
+
+        """ POST isn't retried """
+        api.session.request.side_effect = [response(502, {"response": {}})]
+        with self.assertRaises(Exception):
+            api._request(type="post", url=url, payload="{}")
+        self.assertEqual(api.session.request.call_count, 6)
+
+        """ 3rd failure in a row opens the circuit, fails fast until the trial """
+        api.retry.retries = 0
+        api.session.request.side_effect = requests.ConnectionError("down")
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                api._request(type="get", url=url)
+        with self.assertRaises(CircuitOpen) as error:
+            api._request(type="get", url=url)
+        self.assertEqual(error.exception.retry_after, 30)
+        self.assertEqual(api.session.request.call_count, 8)
+        clock[0] = 30.0
+        with self.assertRaises(requests.ConnectionError):
+            api._request(type="get", url=url)
+        """ Trial failed, open twice as long """
+        clock[0] = 60.0
+        with self.assertRaises(CircuitOpen):
+            api._request(type="get", url=url)
+        clock[0] = 90.0
+        api.session.request.side_effect = [response(200)]
+        api._request(type="get", url=url)
+        self.assertEqual(api.breaker.state, "closed")
+        return
+
+    """ Test every trial request of a half-open circuit decides the trial """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_circuit_trial(self, auth):
+        print("")
+        from unittest.mock import Mock
+        from ciscodnacbackupctl.ratelimit import RateLimiter
+        from ciscodnacbackupctl.retry import Retry, CircuitBreaker, CircuitOpen
+
+        response = self.mockup_http
+        url = "https://mockup-dnac/api/system/v1/maglev/backup"
+        clock = [0.0]
+        api = ciscodnacbackupctl.Api()
+        api.settings["dnac"]["token"] = "mockup-token"
+        api.limiter = RateLimiter(rate=0)
+        api.limiter.sleep = lambda seconds: None
+        api.breaker = CircuitBreaker(failures=1, cooldown=30)
+        api.breaker.clock = lambda: clock[0]
+        api.retry = Retry(retries=0)
+        api.session = Mock()
+
+        """ Throttled trial: sent again as the trial, success closes """
+        api.breaker.failure()
+        clock[0] = 30.0
+        api.session.request.side_effect = [response(429), response(200)]
+        self.assertEqual(api._request(type="get", url=url), {"response": []})
+        self.assertEqual(api.breaker.state, "closed")
+
+        """ Throttled until the retries run out: the next request is the trial """
+        api.breaker.failure()
+        clock[0] = 60.0
+        throttled = [response(429, {"response": {}}) for _ in range(4)]
+        api.session.request.side_effect = throttled + [response(200)]
+        api._request(type="get", url=url)
+        self.assertEqual(api.breaker.state, "half-open")
+        self.assertEqual(api.breaker.trial, False)
+        api._request(type="get", url=url)
+        self.assertEqual(api.breaker.state, "closed")
+
+        """ Trial raising another error opens the circuit again """
+        api.breaker.failure()
+        clock[0] = 90.0
+        api.session.request.side_effect = ValueError("unexpected")
+        with self.assertRaises(ValueError):
+            api._request(type="get", url=url)
+        self.assertEqual(api.breaker.state, "open")
+        with self.assertRaises(CircuitOpen):
+            api._request(type="get", url=url)
+        clock[0] = 150.0
+        api.session.request.side_effect = [response(200)]
+        api._request(type="get", url=url)
+        self.assertEqual(api.breaker.state, "closed")
+        return
+
+    """ Test the HTTP trace redacts and caps, payloads aren't decoded without debug """
+
+    def test_trace(self):
+        print("")
+        from unittest.mock import Mock
+        from ciscodnacbackupctl.debug import Debug
+        from ciscodnacbackupctl.trace import Trace, REDACTED
+
+        response = self.mockup_http(200)
+        response.request = Mock(
+            method="POST",
+            url="https://mockup-dnac/dna/system/api/v1/auth/token",
+            headers={"Authorization": "Basic bW9ja3VwOnBhc3M=", "Accept": "*/*"},
+            body=None,
+        )
+        response.headers = {"Content-Type": "application/json"}
+        response.content = b'{"Token": "secret-token"}' + b" " * 100
+
+        class Unread:
+            @property
+            def content(self):
+                raise AssertionError("body decoded")
+
+        with patch.object(Debug, "enabled", False):
+            Debug.response(Unread())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.ndjson")
+            Trace.enable(path, max_body=40, max_bytes=2000, backups=1)
+            try:
+                for _ in range(10):
+                    Trace.response_hook(response, stream=False)
+                Trace.response_hook(response, stream=True)
+            finally:
+                Trace.disable()
+            entries = []
+            for name in (path + ".1", path):
+                with open(name) as f:
+                    entries += [json.loads(line) for line in f]
+            self.assertNotIn("secret", json.dumps(entries))
+            entry = entries[-2]
+            self.assertEqual(entry["request"]["headers"]["Authorization"], REDACTED)
+            body = '{"Token": "<redacted>"}' + " " * 15
+            self.assertEqual(entry["response"]["body"], body)
+            self.assertEqual(entry["response"]["size"], 125)
+            self.assertTrue(entry["response"]["truncated"])
+            self.assertTrue(entries[-1]["response"]["streamed"])
+        return
+
+    """ Test progress --watch follows a backup until it ends, polling adaptively """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_progress_watch(self, auth):
+        import io
+        from ciscodnacbackupctl.watch import Watch, WATCH_FAILURE, WATCH_TIMEOUT
+
+        task = self.mockup_response("progress")["response"][0]
+        history = self.mockup_response("history")
+        backup_id = history["response"][0]["id"]
+        polls = []
+        for percentage in (10.0, 10.0, 60.0):
+            polls.append(dict(task, id=backup_id, backup_id=backup_id))
+            polls[-1].update(status="IN_PROGRESS", progress_in_percentage=percentage)
+        responses = [{"response": [row]} for row in polls] + [{"response": []}]
+
+        def request(**kwargs):
+            if kwargs["url"].endswith("/progress"):
+                return responses.pop(0)
+            return self.mockup_response("history")
+
+        with patch("ciscodnacbackupctl.Api._request", side_effect=request) as api:
+            cli = ciscodnacbackupctl.Api.CLI(output="ndjson")
+            out = io.StringIO()
+            watch = Watch(cli, interval=2, max_interval=8, output="ndjson", file=out)
+            sleeps = []
+            watch.sleep = sleeps.append
+            code = watch.run()
+        """ history.json has the backup as FAILURE """
+        self.assertEqual(code, WATCH_FAILURE)
+        self.assertEqual(watch.finished, {backup_id: "FAILURE"})
+        self.assertEqual(sleeps, [2, 2, 2])
+        """ Unchanged second poll isn't printed again """
+        changes = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([c["progress_in_percentage"] for c in changes], [10.0, 60.0])
+        self.assertEqual(auth.call_count, 1)
+
+        """ Idle: backs off up to max_interval, then times out """
+        with patch("ciscodnacbackupctl.Api._request") as api:
+            api.return_value = {"response": []}
+            clock = [0]
+            watch = Watch(cli, interval=2, max_interval=8, timeout=30, file=out)
+            watch.sleep = lambda seconds: clock.append(clock[-1] + seconds)
+            watch.clock = lambda: clock[-1]
+            self.assertEqual(watch.run(), WATCH_TIMEOUT)
+        self.assertEqual(clock[1:5], [4, 12, 20, 28])
+        return
+
+    """ Test --cached reads answer from the local catalog """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_catalog_cached(self, auth):
+        print("")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "catalog.db")
+            with patch("ciscodnacbackupctl.config.DNAC_FULL_CATALOG_PATH", path):
+                with patch("ciscodnacbackupctl.Api._request") as api:
+                    api.return_value = self.mockup_response("list")
+                    cli = ciscodnacbackupctl.Api.CLI(cached=True)
+                    fresh = cli.fetch_backups(reverse=True)
+                    self.assertEqual(api.call_count, 1)
+                    cached = cli.fetch_backups(reverse=True)
+                    self.assertEqual(api.call_count, 1)
+                    self.assertEqual(
+                        [dict(b) for b in cached["response"]],
+                        [dict(b) for b in fresh["response"]],
+                    )
+                    self.assertEqual(cached["response"][0].compatible, True)
+                    self.assertEqual(cli.list(True), True)
+                    self.assertEqual(api.call_count, 1)
+
+                    """ Incremental sync only writes what changed """
+                    rows = [dict(b) for b in fresh["response"]]
+                    self.assertEqual(cli.catalog.sync("backup", rows), (0, 0))
+                    rows[0]["status"] = "FAILED"
+                    self.assertEqual(cli.catalog.sync("backup", rows[:2]), (1, 1))
+                    """ Sizes too (capacity retention reads them) """
+                    rows[1]["backup_size"] += 1
+                    self.assertEqual(cli.catalog.sync("backup", rows[:2]), (1, 0))
+
+                    cli = ciscodnacbackupctl.Api.CLI(cached=True, max_age=0)
+                    cli.catalog.db.execute("UPDATE syncs SET synced = 0")
+                    cli.fetch_backups()
+                    self.assertEqual(api.call_count, 2)
+                    cli.catalog.close()
+        return
+
+    """ Test a cached fleet purge plans and deletes in different threads """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_fleet_purge_cached(self, auth):
+        print("")
+        from ciscodnacbackupctl.journal import Journal
+
+        dnac = {"username": "u", "password": "p", "secure": False}
+        names = ["a", "b", "c"]
+        clusters = {name: {"dnac": dict(dnac, hostname=name)} for name in names}
+        ok = self.mockup_response("delete")
+
+        def request(**kwargs):
+            if kwargs["type"] == "get":
+                return self.mockup_response("purge")
+            return ok
+
+        with tempfile.TemporaryDirectory() as tmp:
+            catalog = os.path.join(tmp, "catalog.db")
+            journal = os.path.join(tmp, "purge.journal")
+            with patch("ciscodnacbackupctl.config.DNAC_FULL_CATALOG_PATH", catalog):
+                with patch("ciscodnacbackupctl.config.DNAC_FULL_JOURNAL_PATH", journal):
+                    with patch("ciscodnacbackupctl.Config.clusters") as cfg:
+                        cfg.return_value = (True, clusters)
+                        with patch("ciscodnacbackupctl.Api._request") as api:
+                            api.side_effect = request
+                            fleet = ciscodnacbackupctl.Fleet(cached=True)
+                            res = fleet.purge(keep=3, incompatible=False, force=True)
+            self.assertEqual(fleet.errors, {})
+            self.assertEqual(res, True)
+            for name in names:
+                self.assertIsNone(Journal(name, path=journal).pending())
+        return
+
+    """ Test a confirmed fleet purge checks the cached snapshot first """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_fleet_purge_stale(self, auth):
+        print("")
+        dnac = {"username": "u", "password": "p", "secure": False, "journal": False}
+        clusters = {name: {"dnac": dict(dnac, hostname=name)} for name in ["a", "b"]}
+        backups = self.mockup_response("purge")
+        deletes = []
+
+        def request(**kwargs):
+            if kwargs["type"] == "get":
+                return json.loads(json.dumps(backups))
+            deletes.append(kwargs["url"])
+            return self.mockup_response("delete")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            catalog = os.path.join(tmp, "catalog.db")
+            with patch("ciscodnacbackupctl.config.DNAC_FULL_CATALOG_PATH", catalog):
+                with patch("ciscodnacbackupctl.Config.clusters") as cfg:
+                    cfg.return_value = (True, clusters)
+                    with patch("ciscodnacbackupctl.Api._request", side_effect=request):
+                        self.assertTrue(ciscodnacbackupctl.Fleet(cached=True).list())
+                        """ A backup was added since the catalog sync """
+                        new = dict(backups["response"][0], backup_id="new", id="new")
+                        backups["response"].append(new)
+                        fleet = ciscodnacbackupctl.Fleet(cached=True)
+                        with patch("click.prompt", return_value=True):
+                            res = fleet.purge(keep=3, incompatible=False, force=False)
+        self.assertEqual(res, False)
+        self.assertEqual(deletes, [])
+        self.assertEqual(sorted(fleet.errors), ["a", "b"])
+        self.assertIn("changed since the purge plan", fleet.errors["a"])
+        return
+
+    """ Test a fleet purge failing on one cluster fails (exit code 1) """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_fleet_purge_partial(self, auth):
+        print("")
+        from click.testing import CliRunner
+        from ciscodnacbackupctl.cli import cli
+
+        dnac = {"username": "u", "password": "p", "secure": False, "journal": False}
+        clusters = {name: {"dnac": dict(dnac, hostname=name)} for name in ["a", "b"]}
+        ok = self.mockup_response("delete")
+
+        def request(**kwargs):
+            if kwargs["type"] == "get":
+                return self.mockup_response("purge")
+            if kwargs["url"].startswith("https://b/"):
+                raise Exception("Error: (Boom)")
+            return ok
+
+        with patch("ciscodnacbackupctl.Config.clusters") as cfg:
+            cfg.return_value = (True, clusters)
+            with patch("ciscodnacbackupctl.Api._request", side_effect=request):
+                fleet = ciscodnacbackupctl.Fleet()
+                res = fleet.purge(keep=3, incompatible=False, force=True)
+                self.assertEqual(res, False)
+                self.assertEqual(list(fleet.errors), ["b"])
+                result = CliRunner().invoke(
+                    cli, ["fleet", "purge", "--force"], obj={}
+                )
+                self.assertEqual(result.exit_code, 1)
+                result = CliRunner().invoke(cli, ["fleet", "list"], obj={})
+                self.assertEqual(result.exit_code, 0)
+        return
+
+    """ Test named profiles from a multi cluster config file """
+
+    def test_config_profiles(self):
+        print("")
+        cfg = {
+            "clusters": {
+                "lab": {"hostname": "lab-dnac", "username": "u", "password": "p"},
+                "prod": {"hostname": "prod-dnac", "username": "u", "password": "p"},
+            }
+        }
+        env = {k: v for k, v in os.environ.items() if not k.startswith("DNA_CENTER")}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.json")
+            with open(path, "w") as f:
+                f.write(json.dumps(cfg))
+            with patch("ciscodnacbackupctl.config.DNAC_FULL_CONFIG_PATH", path):
+                with patch.dict(os.environ, env, clear=True):
+                    config = ciscodnacbackupctl.Config(profile="prod").config
+                    self.assertEqual(config[1]["dnac"]["hostname"], "prod-dnac")
+                    self.assertFalse(ciscodnacbackupctl.Config().config[0])
+                    self.assertEqual(
+                        sorted(ciscodnacbackupctl.Config.clusters()[1]), ["lab", "prod"]
+                    )
+                """ Environment cfg (default) merged with the file profiles """
+                config = ciscodnacbackupctl.Config(profile="prod")
+                self.assertEqual(config.config[1]["dnac"]["hostname"], "prod-dnac")
+                self.assertEqual(config.source, "file")
+                clusters = ciscodnacbackupctl.Config.clusters()[1]
+                self.assertEqual(sorted(clusters), ["default", "lab", "prod"])
+                self.assertEqual(clusters["default"]["dnac"]["hostname"], "mockup-dnac")
+                config = ciscodnacbackupctl.Config(profile="default")
+                self.assertEqual(config.source, "environment")
+        return
+
+    """ Test cfg parsed once, reloaded when the file or environment changes """
+
+    def test_config_cache(self):
+        print("")
+        Config = ciscodnacbackupctl.Config
+        dnac = {"hostname": "dnac", "username": "u", "password": "p"}
+        env = {k: v for k, v in os.environ.items() if not k.startswith("DNA")}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.json")
+            with open(path, "w") as f:
+                f.write(json.dumps({"dnac": dnac}))
+            with patch("ciscodnacbackupctl.config.DNAC_FULL_CONFIG_PATH", path):
+                with patch.dict(os.environ, env, clear=True):
+                    Config.invalidate()
+                    config = Config()
+                    self.assertEqual(config.source, "file")
+                    hits, generation = Config.stats["hits"], Config.generation
+                    config.config[1]["dnac"]["token"] = "abc"
+                    self.assertNotIn("token", Config().config[1]["dnac"])
+                    self.assertGreater(Config.stats["hits"], hits)
+                    self.assertEqual(Config.generation, generation)
+                    """ Edited file (other size) is reloaded """
+                    with open(path, "w") as f:
+                        f.write(json.dumps({"dnac": dict(dnac, hostname="dnac2")}))
+                    self.assertEqual(Config().config[1]["dnac"]["hostname"], "dnac2")
+                    self.assertEqual(Config.generation, generation + 1)
+                    """ Environment takes over once set """
+                    os.environ["DNA_CENTER_BASE_URL"] = "dnac3"
+                    os.environ["DNA_CENTER_USERNAME"] = "u"
+                    os.environ["DNA_CENTER_PASSWORD"] = "p"
+                    config = Config()
+                    self.assertEqual(config.source, "environment")
+                    self.assertEqual(config.config[1]["dnac"]["hostname"], "dnac3")
+                    described = Config.describe()
+                    self.assertTrue(described["sources"]["environment"]["ok"])
+        Config.invalidate()
+        return
+
+    """ Test fleet list merges all clusters """
+
+    @patch("ciscodnacbackupctl.Api._auth")
+    def test_fleet_list(self, auth):
+        print("")
+        dnac = {"username": "u", "password": "p", "secure": False}
+        clusters = {
+            name: {"dnac": dict(dnac, hostname=name)} for name in ["lab", "prod"]
+        }
+        with patch("ciscodnacbackupctl.Config.clusters") as cfg:
+            cfg.return_value = (True, clusters)
+            with patch("ciscodnacbackupctl.Api._request") as api:
+                api.side_effect = lambda **kwargs: self.mockup_response("list")
+                fleet = ciscodnacbackupctl.Fleet()
+                res = fleet.list(True)
+                self.assertEqual(res, True)
+                self.assertEqual(api.call_count, 2)
+                results = fleet.run(lambda cli: cli.api.get())
+                data = fleet.merge(results)
+                self.assertEqual(
+                    len(data["response"]),
+                    2 * len(self.mockup_response("list")["response"]),
+                )
+                self.assertEqual(list(data["response"][0])[0], "cluster")
+                return
+
+    """ Test cron expressions """
+
+    def test_cron(self):
+        print("")
+        from datetime import datetime
+        from ciscodnacbackupctl.scheduler import Cron
+
+        now = datetime(2021, 6, 30, 23, 30)
+        self.assertEqual(Cron("0 23 * * *").next(now), datetime(2021, 7, 1, 23, 0))
+        self.assertEqual(Cron("@hourly").next(now), datetime(2021, 7, 1, 0, 0))
+        self.assertEqual(Cron("*/20 * * * *").next(now), datetime(2021, 6, 30, 23, 40))
+        self.assertEqual(
+            Cron("0 3 * * mon-fri").next(now), datetime(2021, 7, 1, 3, 0)
+        )
+        """ Day of month or day of week """
+        self.assertEqual(Cron("0 0 15 * sat").next(now), datetime(2021, 7, 3, 0, 0))
+        self.assertEqual(Cron("0 0 29 feb *").next(now), datetime(2024, 2, 29, 0, 0))
+        self.assertEqual(
+            Cron.interval("weekly", "Sunday", "22:15").next(now),
+            datetime(2021, 7, 4, 22, 15),
+        )
+        for expression in ("0 23 * *", "61 * * * *", "0 0 30 feb *", "x * * * *"):
+            with self.assertRaises(Exception):
+                Cron(expression).next(now)
+
+        """ schedule_purge needs --interval or --cron """
+        from click.testing import CliRunner
+        from ciscodnacbackupctl.cli import cli
+
+        result = CliRunner().invoke(cli, ["schedule_purge"], obj={})
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("--interval", result.output)
+        return
+
+    """ Test the scheduler only wakes up for due jobs, retries failed ones early """
+
+    def test_scheduler(self):
+        print("")
+        import signal
+        from datetime import datetime, timedelta
+        from ciscodnacbackupctl.scheduler import Scheduler
+        from ciscodnacbackupctl.retry import CircuitOpen
+
+        clock = [datetime(2021, 6, 30, 22, 0)]
+        runs = []
+        scheduler = Scheduler()
+        scheduler.now = lambda: clock[0]
+
+        def wait(delay):
+            clock[0] += timedelta(seconds=delay)
+            if len(runs) == 3:
+                scheduler.handle(signal.SIGUSR1)
+            if len(runs) == 5:
+                scheduler.stop()
+
+        def fail():
+            runs.append("backup")
+            raise Exception("Boom")
+
+        scheduler.wait = wait
+        scheduler.add("purge", "0 23 * * *", lambda: runs.append("purge"))
+        scheduler.add("backup", "30 23 * * *", fail)
+        scheduler.run()
+        """ Failed backup retried after 1 then 2 minutes, USR1 during the wait """
+        self.assertEqual(runs, ["purge", "backup", "backup", "purge", "backup"])
+        self.assertEqual(scheduler.wakeups, 5)
+        self.assertEqual(clock[0], datetime(2021, 6, 30, 23, 37))
+        self.assertEqual(
+            [job.next_run for job in scheduler.jobs],
+            [datetime(2021, 7, 1, 23, 0), datetime(2021, 6, 30, 23, 37)],
+        )
+        self.assertEqual([job.failures for job in scheduler.jobs], [0, 3])
+        """ Retries never go past the next cron time, nor before the circuit trial """
+        job = scheduler.jobs[1]
+        job.failures = 10
+        self.assertEqual(
+            job.plan(datetime(2021, 7, 1, 23, 0), error=Exception()),
+            datetime(2021, 7, 1, 23, 30),
+        )
+        job.failures = 0
+        error = CircuitOpen("Down", 600)
+        self.assertEqual(
+            job.plan(datetime(2021, 7, 1, 12, 0), error=error),
+            datetime(2021, 7, 1, 12, 10),
+        )
+        job.plan(datetime(2021, 7, 1, 12, 0))
+        self.assertEqual(job.failures, 0)
+        return
+
+    """ Test signals wake the scheduler up (self-pipe, no lock in the handler) """
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "POSIX signals")
+    def test_scheduler_signals(self):
+        print("")
+        import threading
+        import time
+        from ciscodnacbackupctl.scheduler import Scheduler
+
+        runs = []
+        scheduler = Scheduler()
+        scheduler.add("yearly", "0 0 1 1 *", lambda: runs.append("yearly"))
+        names = [signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1]
+        previous = {signum: signal.getsignal(signum) for signum in names}
+        scheduler.signals()
+        try:
+            pid = os.getpid()
+            threading.Timer(0.2, os.kill, (pid, signal.SIGUSR1)).start()
+            threading.Timer(0.6, os.kill, (pid, signal.SIGTERM)).start()
+            start = time.monotonic()
+            scheduler.run()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.assertEqual(runs, ["yearly"])
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(scheduler.stopped, True)
+        return
+
+    """ Test the CLI entry point doesn't import the heavy modules """
+
+    def test_lazy_imports(self):
+        import subprocess
+
+        code = (
+            "import sys, ciscodnacbackupctl.cli; "
+            "print(','.join(m for m in ('requests', 'rich', 'tabulate', "
+            "'daemonocle', 'sqlite3') if m in sys.modules))"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        process = subprocess.run(
+            [sys.executable, "-c", code], cwd=root, capture_output=True, text=True
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.strip(), "")
+        self.assertIs(ciscodnacbackupctl.Api, ciscodnacbackupctl.api.Api)
+        self.assertIn("Fleet", dir(ciscodnacbackupctl))
+        return
+
+
+@unittest.skipIf(aio.aiohttp is None, "aiohttp not installed")
+class TestAsync(unittest.IsolatedAsyncioTestCase):
+
+    """Mockup settings for async client"""
+
+    settings = {
+        "dnac": {
+            "hostname": "mockup-dnac",
+            "username": "mockup-user",
+            "password": "mockup-pass",
+            "secure": False,
+            "token_cache": False,
+        }
+    }
+
+    """ Test async list, history and progress concurrently """
+
+    @patch("ciscodnacbackupctl.aio.AsyncApi._auth", new_callable=AsyncMock)
+    async def test_get_concurrent(self, auth):
+        async with aio.AsyncApi(settings=self.settings) as api:
+            with patch.object(api, "_request", new_callable=AsyncMock) as request:
+                request.side_effect = lambda **kwargs: TestBackend.mockup_response(
+                    kwargs["url"].rsplit("/", 1)[-1].replace("backup", "list")
+                )
+                data, history, progress = await asyncio.gather(
+                    api.get(reverse=True), api.get_history(), api.get_progress()
+                )
+        self.assertEqual(request.call_count, 3)
+        self.assertNotIn("tenantId", data["response"][0])
+        self.assertGreaterEqual(
+            data["response"][0]["end_timestamp"], data["response"][-1]["end_timestamp"]
+        )
+        return
+
+    """ Test async delete of multiple backups """
+
+    @patch("ciscodnacbackupctl.aio.AsyncApi._auth", new_callable=AsyncMock)
+    async def test_delete_multi(self, auth):
+        ids = [f"54d7930a-057c-4c41-b35c-30494133234{i}" for i in range(3)]
+        async with aio.AsyncApi(settings=self.settings) as api:
+            with patch.object(api, "_request", new_callable=AsyncMock) as request:
+                request.return_value = TestBackend.mockup_response("delete")
+                res = await api.delete(ids)
+            with self.assertRaises(TypeError):
+                await api.delete({"id": "dict"})
+        self.assertEqual(sorted(res), ids)
+        return
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=3)